@@ -2,29 +2,79 @@
 Main Flask application for AdvancedExpenseTrackerPro
 """
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file
+import zlib
+import atexit
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, stream_with_context, session, g
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from dotenv import load_dotenv
 from datetime import datetime
 import json
+from functools import wraps
 
 from models.user import User
-from services.data_store import DataStore
-from services.auto_detect import AutoDetector
-from services.forecaster import Forecaster
-from services.offers import OffersManager
-from services.reconciliation import Reconciler
-from services.link_tracker import LinkTracker
+from models.money import Money
+from services.registry import ServiceRegistry
+from services.backup import BackupError
+from services.auth_executor import AuthBusyError
+from services.rate_limit import RateLimitedError
+from services.fanout import FanOutTimeout
+from services.db import DatabaseBusyError
+from services import data_version
 
 load_dotenv()
 
 login_manager = LoginManager()
 
+def gzip_stream(chunks):
+    """Gzip-compress an iterable of text chunks on the fly"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
 def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-me')
     app.config['DATABASE_PATH'] = os.getenv('DATABASE_PATH', 'data/expense_tracker.db')
     app.config['USER_DATA_PATH'] = os.getenv('USER_DATA_PATH', 'data/users')
+    app.config['CLICK_RETENTION_DAYS'] = int(os.getenv('CLICK_RETENTION_DAYS', 90))
+    app.config['LOG_DURABILITY'] = os.getenv('LOG_DURABILITY', 'flush')
+    app.config['LOG_MAX_OPEN_FILES'] = int(os.getenv('LOG_MAX_OPEN_FILES', 64))
+    app.config['LOG_FLUSH_INTERVAL'] = float(os.getenv('LOG_FLUSH_INTERVAL', 1.0))
+    app.config['BACKUP_KDF'] = os.getenv('BACKUP_KDF', 'scrypt')
+    app.config['BACKUP_KDF_N'] = int(os.getenv('BACKUP_KDF_N', 2 ** 15))
+    app.config['BACKUP_KDF_ITERATIONS'] = int(os.getenv('BACKUP_KDF_ITERATIONS', 600000))
+    app.config['BACKUP_KEY_CACHE_TTL'] = int(os.getenv('BACKUP_KEY_CACHE_TTL', 300))
+    app.config['LEDGER_CACHE_MB'] = int(os.getenv('LEDGER_CACHE_MB', 64))
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 60))
+    app.config['AUTH_WORKERS'] = int(os.getenv('AUTH_WORKERS', 2))
+    app.config['AUTH_QUEUE_DEPTH'] = int(os.getenv('AUTH_QUEUE_DEPTH', 16))
+    app.config['BCRYPT_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', 12))
+    app.config['LOGIN_IP_BURST'] = int(os.getenv('LOGIN_IP_BURST', 20))
+    app.config['LOGIN_IP_PER_MINUTE'] = float(os.getenv('LOGIN_IP_PER_MINUTE', 10))
+    app.config['LOGIN_EMAIL_BURST'] = int(os.getenv('LOGIN_EMAIL_BURST', 5))
+    app.config['LOGIN_EMAIL_PER_MINUTE'] = float(os.getenv('LOGIN_EMAIL_PER_MINUTE', 2))
+    app.config['LOGIN_IP_PER_HOUR'] = int(os.getenv('LOGIN_IP_PER_HOUR', 200))
+    app.config['LOGIN_EMAIL_PER_HOUR'] = int(os.getenv('LOGIN_EMAIL_PER_HOUR', 30))
+    app.config['LOGIN_RATE_MAX_KEYS'] = int(os.getenv('LOGIN_RATE_MAX_KEYS', 100000))
+    app.config['LOGIN_RATE_PERSIST'] = os.getenv('LOGIN_RATE_PERSIST', 'false').lower() == 'true'
+    app.config['LOGIN_RATE_SHARED'] = os.getenv('LOGIN_RATE_SHARED', 'true').lower() == 'true'
+    app.config['FANOUT_WORKERS'] = int(os.getenv('FANOUT_WORKERS', 8))
+    app.config['FANOUT_TIMEOUT'] = float(os.getenv('FANOUT_TIMEOUT', 2.0))
+    app.config['FANOUT_QUEUE_DEPTH'] = int(os.getenv('FANOUT_QUEUE_DEPTH', 16))
+    # Timed-out panels still running that make the pool shed new work (default: half the workers)
+    app.config['FANOUT_MAX_ABANDONED'] = int(os.getenv('FANOUT_MAX_ABANDONED')) if os.getenv('FANOUT_MAX_ABANDONED') else None
+    app.config['SQLITE_WAL'] = os.getenv('SQLITE_WAL', 'true').lower() == 'true'
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_WRITE_RETRIES'] = int(os.getenv('SQLITE_WRITE_RETRIES', 3))
+    app.config['SQLITE_RETRY_BACKOFF_MS'] = int(os.getenv('SQLITE_RETRY_BACKOFF_MS', 50))
+    app.config['FRAGMENT_CACHE_ENTRIES'] = int(os.getenv('FRAGMENT_CACHE_ENTRIES', 256))
+    # Bump to invalidate cached pages and client ETags after template changes
+    app.config['CACHE_VERSION'] = os.getenv('CACHE_VERSION', '1')
+    app.config['USER_SESSION_SNAPSHOT'] = os.getenv('USER_SESSION_SNAPSHOT', 'false').lower() == 'true'
     
     # Initialize Flask-Login
     login_manager.init_app(app)
@@ -34,47 +84,197 @@ def create_app():
     os.makedirs('data', exist_ok=True)
     os.makedirs(app.config['USER_DATA_PATH'], exist_ok=True)
     
-    data_store =  DataStore(app.config['DATABASE_PATH'], app.config['USER_DATA_PATH'])
-    data_store.init_db()
-    
-    # Initialize link tracker
-    link_tracker = LinkTracker(app.config['DATABASE_PATH'])
+    # Build every service once; handlers share these instances
+    services = ServiceRegistry(app.config)
+    services.warmup()
+    app.extensions['services'] = services
+    atexit.register(services.shutdown)
+    
+    data_store = services.data_store
+    link_tracker = services.link_tracker
+    login_limiter = services.login_limiter
+    fragments = services.fragments
+    
+    @app.cli.command('restore-backup')
+    @click.argument('user_id', type=int)
+    @click.argument('backup_path', type=click.Path(exists=True, dir_okay=False))
+    @click.password_option('--passphrase', confirmation_prompt=False)
+    def restore_backup(user_id, backup_path, passphrase):
+        """Stream-restore an encrypted backup file into a user's account"""
+        with open(backup_path, 'rb') as f:
+            counts = data_store.restore_encrypted_backup(user_id, passphrase, f)
+        print(f'Restored {counts}')
+    
+    @app.cli.command('convert-logs')
+    def convert_logs():
+        """Convert legacy .txt user logs to the structured JSON Lines format"""
+        converted = data_store.convert_legacy_logs()
+        print(f'Converted {converted} user logs')
+    
+    @app.cli.command('compact-clicks')
+    def compact_clicks():
+        """Compact raw link clicks older than CLICK_RETENTION_DAYS into rollups"""
+        removed = link_tracker.compact_clicks(app.config['CLICK_RETENTION_DAYS'])
+        print(f'Compacted {removed} click rows')
+    
+    @app.cli.command('service-stats')
+    def service_stats():
+        """Print cache, auth pool and login limiter counters"""
+        print(json.dumps(services.stats(), indent=2))
+    
+    def request_fan_out():
+        """The current request's FanOut (identical fetches within a request run once)"""
+        if 'fan_out' not in g:
+            g.fan_out = services.fan_out()
+        return g.fan_out
+    
+    def dashboard_data(user_id):
+        """Everything the dashboard shows, fetched concurrently"""
+        fan = request_fan_out()
+        fan.submit(('dashboard', user_id), data_store.get_dashboard, user_id, limit=10)
+        fan.submit(('forecast', user_id, 30), services.forecaster.forecast_balance, user_id, days=30)
+        # Potential savings from the user's active offers (scanned from the ledger, not re-queried)
+        fan.submit(('savings', user_id), lambda: services.offers.get_savings_report(
+            user_id, data_store.get_ledger(user_id).rows()))
+        
+        data = fan.result(('dashboard', user_id))
+        data['overspent_envelopes'] = [env for env in data['envelopes']
+                                       if env['spent_cents'] > env['allocated_cents']]
+        # Optional panels are left out if they miss their deadline
+        data['forecast'] = fan.result(('forecast', user_id, 30), None)
+        data['savings'] = fan.result(('savings', user_id), None)
+        return data
+    
+    def versioned(view, renders_flashes=True):
+        """
+        Serve a GET view with a strong ETag derived from the user's data version
+        Matching If-None-Match gets a 304 without running the view; otherwise the
+        rendered body is reused from the fragment cache while the version holds.
+        """
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            # This response will render (and consume) pending flashes: never cache or 304 it
+            if renders_flashes and session.get('_flashes'):
+                return view(*args, **kwargs)
+            
+            version, updated_at = data_store.get_data_version(current_user.id)
+            key = data_version.response_key(request.endpoint, request.full_path, current_user.id, version,
+                                            app.config['CACHE_VERSION'])
+            etag = data_version.etag(key)
+            
+            if etag in request.if_none_match:
+                response = app.response_class(status=304)
+            else:
+                cached = fragments.get(key)
+                if cached is None:
+                    response = app.make_response(view(*args, **kwargs))
+                    # Never cache or tag a page rendered with panels missing
+                    if response.status_code != 200 or response.is_streamed or ('fan_out' in g and g.fan_out.partial):
+                        return response
+                    fragments.put(key, (response.get_data(), response.mimetype))
+                else:
+                    response = app.response_class(cached[0], mimetype=cached[1])
+            
+            response.set_etag(etag)
+            response.last_modified = data_version.last_modified(updated_at)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapped
+    
+    def api_view(view):
+        """JSON API view: versioned like pages, 401 instead of a login redirect"""
+        view = versioned(view, renders_flashes=False)
+        
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return jsonify({'error': 'authentication required'}), 401
+            return view(*args, **kwargs)
+        return wrapped
+    
+    def rows_json(rows):
+        return [row.to_dict() for row in rows]
+    
+    @app.errorhandler(FanOutTimeout)
+    def fan_out_timeout(e):
+        return 'This page is taking too long to load, please try again', 503
+    
+    @app.errorhandler(DatabaseBusyError)
+    def database_busy(e):
+        return str(e), 503, {'Retry-After': '1'}
     
     @login_manager.user_loader
     def load_user(user_id):
-        return data_store.get_user_by_id(int(user_id))
+        user_id = int(user_id)
+        if app.config['USER_SESSION_SNAPSHOT']:
+            # Signed cookie copy of the user; trusted until USER_CACHE_TTL elapses
+            user = User.from_snapshot(session.get('_user_snapshot'), user_id, app.config['USER_CACHE_TTL'])
+            if user is not None:
+                return user
+        user = data_store.get_user_by_id(user_id)
+        if user is not None and app.config['USER_SESSION_SNAPSHOT']:
+            session['_user_snapshot'] = user.to_snapshot()
+        return user
     
     # Routes
     @app.route('/')
     @login_required
+    @versioned
     def index():
         """Dashboard home page"""
-        transactions = data_store.get_transactions(current_user.id, limit=10)
-        envelopes = data_store.get_envelopes(current_user.id)
-        goals = data_store.get_goals(current_user.id)
-        
-        # Calculate balance (income - expenses)
-        all_transactions = data_store.get_transactions(current_user.id)
-        income = sum(t['amount'] for t in all_transactions if t['amount'] > 0)
-        expenses = sum(abs(t['amount']) for t in all_transactions if t['amount'] < 0)
-        balance = income - expenses
-        
-        # Check for overspending envelopes
-        overspent_envelopes = [env for env in envelopes if env['spent'] > env['allocated']]
-        
-        # Get forecast
-        forecaster = Forecaster(data_store)
-        forecast_data = forecaster.forecast_balance(current_user.id, days=30)
+        data = dashboard_data(current_user.id)
+        summary = data['summary']
         
         return render_template('index.html', 
-                             balance=balance,
-                             income=income,
-                             expenses=expenses,
-                             transactions=transactions,
-                             envelopes=envelopes,
-                             goals=goals,
-                             forecast=forecast_data,
-                             overspent_envelopes=overspent_envelopes)
+                             balance=summary['balance'],
+                             income=summary['income'],
+                             expenses=summary['expenses'],
+                             transactions=data['transactions'],
+                             envelopes=data['envelopes'],
+                             goals=data['goals'],
+                             forecast=data['forecast'],
+                             savings=data['savings'],
+                             overspent_envelopes=data['overspent_envelopes'])
+    
+    # JSON API (v1)
+    @app.route('/api/dashboard')
+    @app.route('/api/v1/dashboard')
+    @api_view
+    def api_dashboard():
+        """All dashboard data in one response"""
+        data = dashboard_data(current_user.id)
+        for key in ('transactions', 'envelopes', 'goals', 'overspent_envelopes'):
+            data[key] = rows_json(data[key])
+        return jsonify(data)
+    
+    @app.route('/api/v1/transactions')
+    @api_view
+    def api_transactions():
+        """Transactions, newest first (?limit=N)"""
+        limit = request.args.get('limit', type=int)
+        return jsonify({'transactions': rows_json(data_store.get_transactions(current_user.id, limit=limit))})
+    
+    @app.route('/api/v1/envelopes')
+    @api_view
+    def api_envelopes():
+        return jsonify({'envelopes': rows_json(data_store.get_envelopes(current_user.id))})
+    
+    @app.route('/api/v1/goals')
+    @api_view
+    def api_goals():
+        return jsonify({'goals': rows_json(data_store.get_goals(current_user.id))})
+    
+    @app.route('/api/v1/forecast')
+    @api_view
+    def api_forecast():
+        """Balance forecast (?days=N, up to 365)"""
+        days = max(1, min(request.args.get('days', 30, type=int), 365))
+        return jsonify(services.forecaster.forecast_balance(current_user.id, days=days))
+    
+    @app.route('/api/v1/trends')
+    @api_view
+    def api_trends():
+        return jsonify(services.forecaster.analyze_spending_trends(current_user.id))
     
     @app.route('/login', methods=['GET', 'POST'])
     def login():
@@ -86,7 +286,18 @@ def create_app():
             email = request.form.get('email')
             password = request.form.get('password')
             
-            user = data_store.authenticate_user(email, password)
+            try:
+                login_limiter.acquire(request.remote_addr, email)
+            except RateLimitedError as e:
+                flash(str(e), 'error')
+                return render_template('login.html'), 429, {'Retry-After': str(e.retry_after)}
+            
+            try:
+                user = data_store.authenticate_user(email, password)
+            except AuthBusyError as e:
+                flash(str(e), 'error')
+                return render_template('login.html'), 503
+            
             if user:
                 login_user(user)
                 return redirect(url_for('index'))
@@ -112,7 +323,12 @@ def create_app():
                 flash('Passwords do not match', 'error')
                 return render_template('signup.html')
             
-            user = data_store.create_user(username, email, password, auto_detect)
+            try:
+                user = data_store.create_user(username, email, password, auto_detect)
+            except AuthBusyError as e:
+                flash(str(e), 'error')
+                return render_template('signup.html'), 503
+            
             if user:
                 login_user(user)
                 flash('Account created successfully!', 'success')
@@ -127,13 +343,14 @@ def create_app():
     def logout():
         """User logout"""
         logout_user()
+        session.pop('_user_snapshot', None)
         return redirect(url_for('login'))
     
     @app.route('/transactions')
     @login_required
     def transactions():
         """Transactions page"""
-        all_transactions = data_store.get_transactions(current_user.id)
+        all_transactions = data_store.get_transaction_models(current_user.id)
         categories = data_store.get_categories()
         envelopes = data_store.get_envelopes(current_user.id)
         return render_template('transactions.html', 
@@ -146,15 +363,19 @@ def create_app():
     def add_transaction():
         """Add new transaction"""
         data = request.form
-        transaction_id = data_store.add_transaction(
-            user_id=current_user.id,
-            amount=float(data.get('amount')),
-            merchant=data.get('merchant'),
-            category=data.get('category'),
-            date=data.get('date'),
-            envelope_id=data.get('envelope_id') or None,
-            notes=data.get('notes', '')
-        )
+        try:
+            transaction_id = data_store.add_transaction(
+                user_id=current_user.id,
+                amount=float(data.get('amount', '')),
+                merchant=data.get('merchant'),
+                category=data.get('category'),
+                date=data.get('date'),
+                envelope_id=data.get('envelope_id') or None,
+                notes=data.get('notes', '')
+            )
+        except ValueError as e:
+            flash(f'Transaction not added: {e}', 'error')
+            return redirect(url_for('transactions'))
         flash('Transaction added successfully', 'success')
         return redirect(url_for('transactions'))
     
@@ -179,11 +400,14 @@ def create_app():
             flash('No file selected', 'error')
             return redirect(url_for('transactions'))
         
-        detector = AutoDetector(data_store)
-        detected = detector.import_file(file, current_user.id)
-        
-        # Store detected transactions in session for review
-        data_store.store_detected_transactions(current_user.id, detected)
+        try:
+            detected = services.detector.import_file(file, current_user.id)
+            
+            # Store detected transactions in session for review
+            data_store.store_detected_transactions(current_user.id, detected)
+        except ValueError as e:
+            flash(f'Import failed: {e}', 'error')
+            return redirect(url_for('transactions'))
         
         flash(f'{len(detected)} transactions detected', 'success')
         return redirect(url_for('detected_transactions'))
@@ -217,15 +441,13 @@ def create_app():
     
     @app.route('/envelopes')
     @login_required
+    @versioned
     def envelopes():
         """Envelopes page"""
         user_envelopes = data_store.get_envelopes(current_user.id)
         
         # Calculate available balance
-        all_transactions = data_store.get_transactions(current_user.id)
-        income = sum(t['amount'] for t in all_transactions if t['amount'] > 0)
-        expenses = sum(abs(t['amount']) for t in all_transactions if t['amount'] < 0)
-        balance = income - expenses
+        balance = data_store.get_balance_summary(current_user.id)['balance']
         
         return render_template('envelopes.html', envelopes=user_envelopes, balance=balance)
     
@@ -246,15 +468,13 @@ def create_app():
     def allocate_from_balance():
         """Allocate funds from balance to envelope"""
         to_id = int(request.form.get('to_envelope'))
-        amount = float(request.form.get('amount'))
+        amount = Money.from_major(request.form.get('amount'))
         
         # Check if user has sufficient balance
-        all_transactions = data_store.get_transactions(current_user.id)
-        income = sum(t['amount'] for t in all_transactions if t['amount'] > 0)
-        expenses = sum(abs(t['amount']) for t in all_transactions if t['amount'] < 0)
-        balance = income - expenses
+        summary = data_store.get_balance_summary(current_user.id)
+        balance = summary['balance']
         
-        if amount > balance:
+        if amount.cents > summary['balance_cents']:
             flash(f'Insufficient balance. Available: ₹{balance:.2f}', 'error')
             return redirect(url_for('envelopes'))
         
@@ -281,6 +501,7 @@ def create_app():
     
     @app.route('/goals')
     @login_required
+    @versioned
     def goals():
         """Goals tracking page"""
         user_goals = data_store.get_goals(current_user.id)
@@ -301,11 +522,11 @@ def create_app():
     
     @app.route('/forecast')
     @login_required
+    @versioned
     def forecast():
         """Forecast page"""
-        forecaster = Forecaster(data_store)
-        forecast_data = forecaster.forecast_balance(current_user.id, days=90)
-        spending_trends = forecaster.analyze_spending_trends(current_user.id)
+        forecast_data = services.forecaster.forecast_balance(current_user.id, days=90)
+        spending_trends = services.forecaster.analyze_spending_trends(current_user.id)
         
         return render_template('forecast.html', 
                              forecast=forecast_data,
@@ -313,6 +534,7 @@ def create_app():
     
     @app.route('/online-sales')
     @login_required
+    @versioned
     def online_sales():
         """Online sales transactions page"""
         sales = data_store.get_online_sales(current_user.id)
@@ -322,9 +544,8 @@ def create_app():
     @login_required
     def offers():
         """Offers management page"""
-        offers_mgr = OffersManager()
-        all_offers = offers_mgr.get_offers(current_user.id)
-        live_offers_data = offers_mgr.get_live_offers()
+        all_offers = services.offers.get_offers(current_user.id)
+        live_offers_data = services.offers.get_live_offers()
         
         # Create tracking links for live offers
         live_offers_with_tracking = {}
@@ -359,8 +580,7 @@ def create_app():
     @login_required
     def add_offer():
         """Add new offer"""
-        offers_mgr = OffersManager()
-        offers_mgr.add_offer(
+        services.offers.add_offer(
             user_id=current_user.id,
             merchant=request.form.get('merchant'),
             discount=float(request.form.get('discount')),
@@ -372,10 +592,10 @@ def create_app():
     
     @app.route('/recurring')
     @login_required
+    @versioned
     def recurring():
         """Recurring transactions page"""
-        detector = AutoDetector(data_store)
-        recurring_items = detector.detect_recurring(current_user.id)
+        recurring_items = services.detector.detect_recurring(current_user.id)
         return render_template('recurring.html', recurring=recurring_items)
     
     @app.route('/reconcile')
@@ -393,8 +613,11 @@ def create_app():
             return redirect(url_for('reconcile'))
         
         file = request.files['file']
-        reconciler = Reconciler(data_store)
-        results = reconciler.reconcile_statement(file, current_user.id)
+        try:
+            results = services.reconciler.reconcile_statement(file, current_user.id)
+        except ValueError as e:
+            flash(f'Could not read statement: {e}', 'error')
+            return redirect(url_for('reconcile'))
         
         return render_template('reconcile_results.html', results=results)
     
@@ -412,24 +635,86 @@ def create_app():
         auto_detect = request.form.get('auto_detect') == 'on'
         
         data_store.update_user_settings(current_user.id, username, auto_detect)
+        session.pop('_user_snapshot', None)
         flash('Settings updated', 'success')
         return redirect(url_for('settings'))
     
     @app.route('/export/csv')
     @login_required
     def export_csv():
-        """Export transactions to CSV"""
-        csv_path = data_store.export_to_csv(current_user.id)
-        return send_file(csv_path, as_attachment=True)
+        """Stream transactions as CSV (?start=&end=&columns=a,b&gzip=1)"""
+        columns = [c for c in request.args.get('columns', '').split(',') if c] or None
+        try:
+            chunks = data_store.iter_transactions_csv(current_user.id,
+                                                      start_date=request.args.get('start') or None,
+                                                      end_date=request.args.get('end') or None,
+                                                      columns=columns)
+            first_chunk = next(chunks)
+        except ValueError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('settings'))
+        
+        def generate():
+            yield first_chunk
+            yield from chunks
+        
+        filename = f'export_{current_user.id}_{datetime.now().strftime("%Y%m%d")}.csv'
+        body = generate()
+        mimetype = 'text/csv'
+        if request.args.get('gzip') == '1':
+            body = gzip_stream(body)
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        
+        return app.response_class(stream_with_context(body), mimetype=mimetype,
+                                  headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    @app.route('/export/columnar')
+    @login_required
+    def export_columnar():
+        """Stream transactions in the compact columnar analytics format"""
+        filename = f'export_{current_user.id}_{datetime.now().strftime("%Y%m%d")}.aetc'
+        blocks = data_store.iter_columnar_export(current_user.id)
+        return app.response_class(stream_with_context(blocks), mimetype='application/octet-stream',
+                                  headers={'Content-Disposition': f'attachment; filename={filename}'})
+    
+    @app.route('/export/log')
+    @login_required
+    def export_log():
+        """Download transaction log records, optionally since a date (?since=YYYY-MM-DD)"""
+        since = request.args.get('since') or None
+        records = data_store.get_log_records(current_user.id, since)
+        body = ''.join(json.dumps(record) + '\n' for record in records)
+        return app.response_class(body, mimetype='application/x-ndjson',
+                                  headers={'Content-Disposition': 'attachment; filename=transactions.jsonl'})
     
     @app.route('/export/backup', methods=['POST'])
     @login_required
     def export_backup():
         """Create encrypted backup"""
         passphrase = request.form.get('passphrase')
-        backup_path = data_store.create_encrypted_backup(current_user.id, passphrase)
+        incremental = request.form.get('incremental') == 'on'
+        backup_path = data_store.create_encrypted_backup(current_user.id, passphrase, incremental)
         return send_file(backup_path, as_attachment=True)
     
+    @app.route('/import/backup', methods=['POST'])
+    @login_required
+    def import_backup():
+        """Restore data from an encrypted backup"""
+        if 'file' not in request.files or request.files['file'].filename == '':
+            flash('No file uploaded', 'error')
+            return redirect(url_for('settings'))
+        
+        try:
+            counts = data_store.restore_encrypted_backup(current_user.id, request.form.get('passphrase', ''),
+                                                         request.files['file'].stream)
+        except BackupError as e:
+            flash(f'Restore failed: {e}', 'error')
+            return redirect(url_for('settings'))
+        
+        flash(f"Backup restored ({counts.get('transactions', 0)} transactions)", 'success')
+        return redirect(url_for('settings'))
+    
     # Link Tracking Routes
     @app.route('/track/<tracking_id>')
     def track(tracking_id):
@@ -486,18 +771,19 @@ def create_app():
         """View shopping cart and click history"""
         recent_clicks = link_tracker.get_user_clicks(current_user.id, limit=20)
         click_stats = link_tracker.get_click_stats(current_user.id)
+        click_stats['last_24h'] = link_tracker.get_recent_click_stats(current_user.id, hours=24)
         
         # Get recent transactions from tracking
         recent_tracked_transactions = []
-        for click in recent_clicks:
-            if click['accepted_flag'] == 1:
+        for recent_click in recent_clicks:
+            if recent_click['accepted_flag'] == 1:
                 # Find the corresponding transaction
                 transactions = data_store.get_transactions(current_user.id)
                 for t in transactions:
-                    if click['tracking_id'] in str(t.get('notes', '')):
+                    if recent_click['tracking_id'] in str(t.get('notes', '')):
                         recent_tracked_transactions.append({
                             'transaction': t,
-                            'click': click
+                            'click': recent_click
                         })
                         break
         
@@ -506,10 +792,10 @@ def create_app():
                              tracked_transactions=recent_tracked_transactions,
                              stats=click_stats)
     
-
+    
     
     return app
-
+    
     # Link Tracking Route - Simplified
     @app.route('/track/<tracking_id>')
     def track_purchase(tracking_id):
@@ -564,15 +850,15 @@ def create_app():
         
         # Get recent transactions from tracking
         recent_tracked_transactions = []
-        for click in recent_clicks:
-            if click['accepted_flag'] == 1:
+        for recent_click in recent_clicks:
+            if recent_click['accepted_flag'] == 1:
                 # Find the corresponding transaction
                 transactions = data_store.get_transactions(current_user.id)
                 for t in transactions:
-                    if click['tracking_id'] in str(t.get('notes', '')):
+                    if recent_click['tracking_id'] in str(t.get('notes', '')):
                         recent_tracked_transactions.append({
                             'transaction': t,
-                            'click': click
+                            'click': recent_click
                         })
                         break
         
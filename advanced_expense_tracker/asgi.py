@@ -0,0 +1,112 @@
+"""
+ASGI entry point (uvicorn asgi:app)
+The read-heavy JSON endpoints are answered natively with non-blocking aiosqlite
+queries; every other request is handed to the Flask app through asgiref's
+WSGI adapter. Both paths share the session cookie, the Flask-Login user loader
+and the data-version ETags. Lifespan events are answered here.
+"""
+import asyncio
+import json
+import sqlite3
+from urllib.parse import parse_qs
+
+import aiosqlite
+from asgiref.wsgi import WsgiToAsgi
+from dotenv import load_dotenv
+from flask_login import current_user
+from werkzeug.http import http_date, parse_etags
+
+load_dotenv()
+
+from app import create_app
+from services import data_version
+from services.data_store import DataStore
+
+flask_app = create_app()
+wsgi = WsgiToAsgi(flask_app)
+
+DB_PATH = flask_app.config['DATABASE_PATH']
+
+def _transactions_query(params):
+    query = f'SELECT {DataStore.TRANSACTION_FIELDS} FROM {DataStore.TRANSACTIONS_FROM} WHERE t.user_id = ? ORDER BY t.date DESC'
+    try:
+        limit = int(params.get('limit', [''])[0])
+    except ValueError:
+        limit = None
+    if limit:
+        return query + ' LIMIT ?', (limit,)
+    return query, ()
+
+# path -> (Flask endpoint name, payload key, query builder)
+ROUTES = {
+    '/api/v1/transactions': ('api_transactions', 'transactions', _transactions_query),
+    '/api/v1/envelopes': ('api_envelopes', 'envelopes',
+                          lambda params: (f'SELECT {DataStore.ENVELOPE_FIELDS} FROM envelopes WHERE user_id = ?', ())),
+    '/api/v1/goals': ('api_goals', 'goals',
+                      lambda params: (f'SELECT {DataStore.GOAL_FIELDS} FROM goals WHERE user_id = ?', ())),
+}
+
+def session_user_id(scope):
+    """Id of the user Flask-Login authenticates for this request (same loader and checks as the views), or None"""
+    headers = [(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']]
+    client = scope.get('client') or ('', 0)
+    with flask_app.test_request_context(scope['path'], headers=headers, environ_base={'REMOTE_ADDR': client[0]}):
+        if current_user.is_authenticated and current_user.is_active:
+            return current_user.id
+    return None
+
+async def send_response(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def api_read(scope, send, user_id):
+    endpoint, key_name, build_query = ROUTES[scope['path']]
+    query_string = scope['query_string'].decode('latin-1')
+    headers = dict(scope['headers'])
+    
+    async with aiosqlite.connect(DB_PATH, timeout=flask_app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000) as db:
+        db.row_factory = sqlite3.Row
+        async with db.execute(data_version.READ_SQL, (user_id,)) as cursor:
+            version, updated_at = data_version.from_row(await cursor.fetchone())
+        
+        key = data_version.response_key(endpoint, f"{scope['path']}?{query_string}", user_id, version,
+                                        flask_app.config['CACHE_VERSION'])
+        etag = data_version.etag(key)
+        response_headers = [
+            (b'etag', f'"{etag}"'.encode()),
+            (b'last-modified', http_date(data_version.last_modified(updated_at)).encode()),
+            (b'cache-control', b'private, no-cache'),
+        ]
+        if parse_etags(headers.get(b'if-none-match', b'').decode('latin-1')).contains(etag):
+            await send_response(send, 304, response_headers)
+            return
+        
+        query, args = build_query(parse_qs(query_string))
+        async with db.execute(query, (user_id,) + args) as cursor:
+            rows = [dict(zip(row.keys(), row)) for row in await cursor.fetchall()]
+    
+    body = json.dumps({key_name: rows}, separators=(',', ':'), sort_keys=True).encode()
+    await send_response(send, 200, response_headers + [(b'content-type', b'application/json')], body)
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(flask_app.extensions['services'].shutdown)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] in ROUTES:
+        # The user loader may hit SQLite; keep it off the event loop
+        user_id = await asyncio.to_thread(session_user_id, scope)
+        # No session user: let Flask answer (remember-me cookie, 401 JSON)
+        if user_id is not None:
+            await api_read(scope, send, user_id)
+            return
+    await wsgi(scope, receive, send)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Benchmark encrypted backup throughput at a target KDF cost
+Runs a batch of backups across many users with one operator passphrase,
+with and without the derived-key cache, and reports backups per second
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_store import DataStore
+from services.backup import BackupManager, KdfParams, KeyCache
+
+def seed(data_store, users, transactions_per_user):
+    """Create users with a few transactions each"""
+    user_ids = []
+    for i in range(users):
+        user = data_store.create_user(f'bench{i}', f'bench{i}@example.com', 'password')
+        for j in range(transactions_per_user):
+            data_store.add_transaction(user.id, -(j % 500) - 1, f'Merchant {j % 20}', 'Other',
+                                       f'2025-{(j % 12) + 1:02d}-{(j % 28) + 1:02d}')
+        user_ids.append(user.id)
+    return user_ids
+
+def run_batch(data_store, user_ids, passphrase, kdf, cache_ttl):
+    """Back up every user once; returns backups per second"""
+    manager = BackupManager(data_store, kdf=kdf, cache=KeyCache(ttl=cache_ttl))
+    start = time.perf_counter()
+    for user_id in user_ids:
+        manager.write_backup(user_id, passphrase, io.BytesIO())
+    elapsed = time.perf_counter() - start
+    return len(user_ids) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--transactions', type=int, default=100)
+    parser.add_argument('--kdf', choices=['scrypt', 'pbkdf2_sha256'], default='scrypt')
+    parser.add_argument('--n', type=int, default=2 ** 15, help='scrypt cost (N)')
+    parser.add_argument('--iterations', type=int, default=600000, help='PBKDF2 iterations')
+    args = parser.parse_args()
+    
+    kdf = KdfParams(name=args.kdf, n=args.n, iterations=args.iterations)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        data_store = DataStore(os.path.join(tmp, 'bench.db'), tmp)
+        data_store.init_db()
+        # Backups include the offers table, which OffersManager normally creates
+        from services.offers import OffersManager
+        OffersManager(data_store.db_path, offers_file=None)
+        
+        user_ids = seed(data_store, args.users, args.transactions)
+        
+        start = time.perf_counter()
+        kdf.derive('passphrase', os.urandom(16))
+        kdf_ms = (time.perf_counter() - start) * 1000
+        
+        cold = run_batch(data_store, user_ids, 'operator passphrase', kdf, cache_ttl=0)
+        cached = run_batch(data_store, user_ids, 'operator passphrase', kdf, cache_ttl=300)
+        data_store.shutdown()
+    
+    print(f'KDF: {kdf.to_dict()} ({kdf_ms:.1f} ms per derivation)')
+    print(f'{args.users} users x {args.transactions} transactions')
+    print(f'without key cache: {cold:8.2f} backups/s')
+    print(f'with key cache:    {cached:8.2f} backups/s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Compare CSV and columnar exports for a large user
+Reports file size, export time and the time to load every column back
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_store import DataStore
+from services.columnar import ColumnarReader
+
+MERCHANTS = ['Amazon', 'Flipkart', 'Swiggy', 'Zomato', 'Netflix', 'Uber', 'Starbucks', 'Salary', 'Rent', 'Myntra']
+CATEGORIES = ['Shopping', 'Food & Dining', 'Transportation', 'Entertainment', 'Bills & Utilities', 'Income']
+
+def seed(data_store, user_id, rows):
+    """Bulk-insert synthetic transactions"""
+    rng = random.Random(42)
+    conn = data_store.get_connection()
+    cursor = conn.cursor()
+    merchant_ids = [data_store.names.merchants.get_id(cursor, name) for name in MERCHANTS]
+    category_ids = [data_store.names.categories.get_id(cursor, name) for name in CATEGORIES]
+    conn.executemany('''
+        INSERT INTO transactions (user_id, amount_cents, merchant_id, category_id, date, notes, is_online_sale)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', ((user_id, rng.randint(-500000, 500000), rng.choice(merchant_ids), rng.choice(category_ids),
+           f'20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}', '', rng.randint(0, 1))
+          for _ in range(rows)))
+    conn.execute('UPDATE transactions SET day = CAST(julianday(date) - 2440587.5 AS INTEGER) WHERE user_id = ?',
+                 (user_id,))
+    conn.commit()
+    conn.close()
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        data_store = DataStore(os.path.join(tmp, 'bench.db'), tmp)
+        data_store.init_db()
+        user = data_store.create_user('bench', 'bench@example.com', 'password')
+        seed(data_store, user.id, args.rows)
+        
+        csv_data, csv_export = timed(lambda: ''.join(data_store.iter_transactions_csv(user.id)).encode('utf-8'))
+        col_buffer = io.BytesIO()
+        _, col_export = timed(lambda: data_store.export_columnar(user.id, col_buffer))
+        col_data = col_buffer.getvalue()
+        data_store.shutdown()
+    
+    def load_csv():
+        amounts, dates, merchants = [], [], []
+        for row in csv.DictReader(io.StringIO(csv_data.decode('utf-8'))):
+            amounts.append(float(row['amount']))
+            dates.append(row['date'])
+            merchants.append(row['merchant'])
+        return amounts
+    
+    def load_columnar():
+        reader = ColumnarReader(col_data)
+        return reader.read_column('amount_cents'), reader.read_column('day'), reader.read_column('merchant', decode=False)
+    
+    _, csv_load = timed(load_csv)
+    _, col_load = timed(load_columnar)
+    
+    print(f'{args.rows} transactions')
+    print(f'csv:      {len(csv_data) / 1024:10.1f} KiB  export {csv_export * 1000:8.1f} ms  load {csv_load * 1000:8.1f} ms')
+    print(f'columnar: {len(col_data) / 1024:10.1f} KiB  export {col_export * 1000:8.1f} ms  load {col_load * 1000:8.1f} ms')
+    print(f'size ratio {len(csv_data) / len(col_data):.1f}x, load speedup {csv_load / col_load:.1f}x')
+
+if __name__ == '__main__':
+    main()
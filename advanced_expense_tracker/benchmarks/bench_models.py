@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Per-transaction memory overhead of the ways rows can be held after a load
+Compares dict(row) and the old eager-parsing model class (before) with
+RowAdapter views and slotted Transaction.from_row models, which keep the
+epoch day instead of the date text (after)
+"""
+import argparse
+import gc
+import os
+import random
+import sqlite3
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.row import RowAdapter
+from models.transaction import Transaction
+from services.data_store import DataStore
+
+MERCHANTS = ['Amazon', 'Flipkart', 'Swiggy', 'Zomato', 'Netflix', 'Uber', 'Starbucks', 'Salary', 'Rent', 'Myntra']
+CATEGORIES = ['Shopping', 'Food & Dining', 'Transportation', 'Entertainment', 'Bills & Utilities', 'Income']
+
+class LegacyTransaction:
+    """The model as it was before: __dict__ per instance, date parsed in __init__"""
+    
+    def __init__(self, id, user_id, amount, merchant, category, date,
+                 envelope_id=None, notes='', is_online_sale=False):
+        self.id = id
+        self.user_id = user_id
+        self.amount = amount
+        self.merchant = merchant
+        self.category = category
+        self.date = date if isinstance(date, datetime) else datetime.fromisoformat(date)
+        self.envelope_id = envelope_id
+        self.notes = notes
+        self.is_online_sale = is_online_sale
+
+def seed(conn, rows):
+    rng = random.Random(42)
+    conn.execute('CREATE TABLE merchants (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+    conn.execute('CREATE TABLE categories (id INTEGER PRIMARY KEY, name TEXT UNIQUE)')
+    conn.executemany('INSERT INTO merchants (id, name) VALUES (?, ?)', enumerate(MERCHANTS, 1))
+    conn.executemany('INSERT INTO categories (id, name) VALUES (?, ?)', enumerate(CATEGORIES, 1))
+    conn.execute('CREATE TABLE transactions (id INTEGER PRIMARY KEY, user_id INTEGER, amount_cents INTEGER, '
+                 'merchant_id INTEGER, category_id INTEGER, date TEXT, day INTEGER, envelope_id INTEGER, '
+                 'notes TEXT, is_online_sale INTEGER, created_at TEXT)')
+    conn.executemany(
+        'INSERT INTO transactions (user_id, amount_cents, merchant_id, category_id, date, notes, is_online_sale, '
+        'created_at) VALUES (1, ?, ?, ?, ?, ?, ?, ?)',
+        ((rng.randint(-500000, 500000), rng.randint(1, len(MERCHANTS)), rng.randint(1, len(CATEGORIES)),
+          f'20{rng.randint(20, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}', '', rng.randint(0, 1),
+          '2025-01-01 00:00:00')
+         for _ in range(rows)))
+    conn.execute('UPDATE transactions SET day = CAST(julianday(date) - 2440587.5 AS INTEGER)')
+    conn.commit()
+
+def load(conn, build):
+    rows = conn.execute(f'SELECT {DataStore.TRANSACTION_FIELDS} FROM {DataStore.TRANSACTIONS_FROM}').fetchall()
+    return build(rows)
+
+def measure(conn, build):
+    """Retained bytes (traced run) and elapsed time (untraced run) for loading every row"""
+    gc.collect()
+    tracemalloc.start()
+    result = load(conn, build)
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    
+    gc.collect()
+    start = time.perf_counter()
+    result = load(conn, build)
+    elapsed = time.perf_counter() - start
+    del result
+    return retained, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+    
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    seed(conn, args.rows)
+    
+    variants = [
+        ('dict(row)', lambda rows: [dict(row) for row in rows]),
+        ('legacy model', lambda rows: [LegacyTransaction(r['id'], r['user_id'], r['amount'], r['merchant'],
+                                                         r['category'], r['date'], r['envelope_id'], r['notes'],
+                                                         r['is_online_sale']) for r in rows]),
+        ('RowAdapter', lambda rows: list(map(RowAdapter, rows))),
+        ('slotted model', lambda rows: list(map(Transaction.from_row, rows))),
+    ]
+    
+    print(f'{args.rows} transactions')
+    for name, build in variants:
+        retained, elapsed = measure(conn, build)
+        print(f'{name:14} {retained / args.rows:8.1f} B/row  {retained / 2 ** 20:8.1f} MiB  load {elapsed * 1000:8.1f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Requests/second for each server mode (run.py --server dev|prefork|async)
+Starts the server on a fresh database, signs up one user with some data, then
+hammers a set of endpoints from concurrent keep-alive clients
+"""
+import argparse
+import http.client
+import os
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/api/v1/transactions?limit=50', '/api/v1/envelopes', '/api/v1/goals', '/api/dashboard', '/']
+
+def wait_for_port(server, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and server.poll() is None:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def post(port, path, form, cookie=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    if cookie:
+        headers['Cookie'] = cookie
+    conn.request('POST', path, urlencode(form), headers)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    return response.getheader('Set-Cookie', '').split(';')[0] or cookie
+
+def seed(port, transactions):
+    """Sign up a user, add data and return their session cookie"""
+    cookie = post(port, '/signup', {'username': 'bench', 'email': 'bench@example.com',
+                                    'password': 'bench-pass', 'confirm_password': 'bench-pass'})
+    rng = random.Random(42)
+    for _ in range(transactions):
+        cookie = post(port, '/transactions/add', {
+            'amount': rng.choice([-1, -1, -1, 1]) * rng.randint(100, 50000) / 100,
+            'merchant': rng.choice(['Amazon', 'Swiggy', 'Netflix', 'Uber', 'Salary']),
+            'category': 'Other',
+            'date': f'2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+        }, cookie)
+    cookie = post(port, '/envelopes/add', {'name': 'Food', 'allocated': '5000'}, cookie)
+    return post(port, '/goals/add', {'name': 'Car', 'target': '100000', 'current': '100',
+                                     'deadline': '2027-01-01'}, cookie)
+
+def client(port, cookie, stop, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    rng = random.Random()
+    while not stop.is_set():
+        path = rng.choice(PATHS)
+        start = time.perf_counter()
+        try:
+            conn.request('GET', path, headers={'Cookie': cookie})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException):
+            errors.append('io')
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.close()
+
+def run_mode(mode, port, args):
+    tmp = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'), USER_DATA_PATH=os.path.join(tmp, 'users'),
+               WEB_WORKERS=str(args.workers), WEB_THREADS=str(args.threads), WEB_ACCESS_LOG='/dev/null',
+               LOGIN_IP_BURST='1000000')
+    log = open(os.path.join(tmp, 'server.log'), 'w+')
+    server = subprocess.Popen([sys.executable, 'run.py', '--server', mode, '--port', str(port)], cwd=BASE_DIR, env=env,
+                              stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    try:
+        if not wait_for_port(server, port):
+            log.seek(0)
+            error = log.read().strip().splitlines()
+            return f'unavailable ({error[-1] if error else "server did not start"})'
+        cookie = seed(port, args.transactions)
+        
+        stop = threading.Event()
+        latencies, errors = [], []
+        clients = [threading.Thread(target=client, args=(port, cookie, stop, latencies, errors))
+                   for _ in range(args.concurrency)]
+        for thread in clients:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in clients:
+            thread.join()
+        
+        if not latencies:
+            return 'no successful requests'
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        return (f'{len(latencies) / args.duration:8.1f} req/s  p50 {statistics.median(latencies) * 1000:6.1f} ms  '
+                f'p99 {p99 * 1000:6.1f} ms  errors {len(errors)} {sorted(set(errors), key=str) if errors else ""}')
+    finally:
+        log.close()
+        # The whole process group: the dev reloader and prefork/uvicorn workers are children
+        try:
+            os.killpg(server.pid, signal.SIGTERM)
+            server.wait(timeout=10)
+        except ProcessLookupError:
+            pass
+        except subprocess.TimeoutExpired:
+            os.killpg(server.pid, signal.SIGKILL)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--modes', default='dev,prefork,async')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--transactions', type=int, default=200)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    
+    print(f'{args.concurrency} clients, {args.duration:g}s per mode, {args.workers} workers x {args.threads} threads')
+    for offset, mode in enumerate(args.modes.split(',')):
+        print(f'{mode:8} {run_mode(mode, args.port + offset, args)}')
+
+if __name__ == '__main__':
+    main()
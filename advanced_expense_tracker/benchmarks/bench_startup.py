@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of the application
+Each run is a fresh interpreter that times `import app` and `create_app()`,
+first against a new database (first boot, schema DDL) and then against the
+same, already-migrated database (warm boot), and reports which heavy modules
+were loaded by the time the app was ready.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['cryptography', 'bcrypt', 'ofxparse', 'services.reconciliation']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+flask_app.extensions['services'].shutdown()
+print(json.dumps({'import': imported - start, 'create': created - imported,
+                  'loaded': [name for name in %r if name in sys.modules]}))
+''' % (HEAVY_MODULES,)
+
+def probe(env):
+    result = subprocess.run([sys.executable, '-c', PROBE], cwd=BASE_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def boot(runs, warm):
+    samples = []
+    for _ in range(runs):
+        tmp = tempfile.mkdtemp()
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'), USER_DATA_PATH=os.path.join(tmp, 'users'))
+        if warm:
+            probe(env)
+        samples.append(probe(env))
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+    
+    for label, warm in (('first boot', False), ('warm boot', True)):
+        samples = boot(args.runs, warm)
+        import_ms = statistics.median(s['import'] for s in samples) * 1000
+        create_ms = statistics.median(s['create'] for s in samples) * 1000
+        loaded = sorted(set().union(*(s['loaded'] for s in samples)))
+        print(f'{label:10}  import {import_ms:7.1f} ms  create_app {create_ms:7.1f} ms  '
+              f'heavy modules loaded: {", ".join(loaded) or "none"}')
+
+if __name__ == '__main__':
+    main()
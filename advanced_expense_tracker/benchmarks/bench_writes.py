@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Multi-process write stress test
+Several processes, each with its own ServiceRegistry like prefork workers,
+add transactions and record link clicks against one database while also
+reading dashboards. Reports throughput, failed writes and lock waits, then
+checks that every write landed exactly once.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.registry import ServiceRegistry
+
+MERCHANTS = ['Amazon', 'Swiggy', 'Netflix', 'Uber', 'Salary', 'Zomato', 'Myntra']
+
+def make_config(args, tmp):
+    return {'DATABASE_PATH': os.path.join(tmp, 'bench.db'), 'USER_DATA_PATH': os.path.join(tmp, 'users'),
+            'BCRYPT_ROUNDS': 4, 'SQLITE_WAL': not args.no_wal, 'SQLITE_BUSY_TIMEOUT_MS': args.busy_timeout_ms,
+            'SQLITE_WRITE_RETRIES': args.retries}
+
+def worker(config, writes, user_id, tracking_id, start, results):
+    services = ServiceRegistry(config)
+    data_store, link_tracker = services.data_store, services.link_tracker
+    failed = 0
+    start.wait()
+    began = time.perf_counter()
+    for i in range(writes):
+        try:
+            data_store.add_transaction(user_id, -(i % 97 + 1), MERCHANTS[i % len(MERCHANTS)], 'Other',
+                                       f'2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}')
+            link_tracker.record_click(tracking_id, user_id, '127.0.0.1', 'bench', '',
+                                      datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            if i % 4 == 0:
+                data_store.get_dashboard(user_id)
+        except sqlite3.OperationalError:
+            failed += 1
+    elapsed = time.perf_counter() - began
+    results.put((elapsed, failed, services.db.stats()))
+    services.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=300, help='transactions (and clicks) per process')
+    parser.add_argument('--busy-timeout-ms', type=int, default=5000)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--no-wal', action='store_true', help='keep the rollback journal for comparison')
+    args = parser.parse_args()
+    
+    tmp = tempfile.mkdtemp()
+    config = make_config(args, tmp)
+    os.makedirs(config['USER_DATA_PATH'])
+    services = ServiceRegistry(config)
+    user = services.data_store.create_user('bench', 'bench@example.com', 'bench-pass')
+    tracking_id, _ = services.link_tracker.create_tracking_link(user.id, 'Amazon', 'Deal', 100,
+                                                                'https://www.amazon.in/deals')
+    services.shutdown()
+    
+    start = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(config, args.writes, user.id, tracking_id, start, results))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    time.sleep(0.5)   # let every worker open its registry before the clock starts
+    start.set()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    
+    elapsed = max(outcome[0] for outcome in outcomes)
+    failed = sum(outcome[1] for outcome in outcomes)
+    totals = {key: sum(outcome[2][key] for outcome in outcomes)
+              for key in ('transactions', 'contended', 'retries', 'failures', 'lock_wait_ms_total')}
+    wait_max = max(outcome[2]['lock_wait_ms_max'] for outcome in outcomes)
+    writes = 2 * args.processes * args.writes
+    
+    print(f'{args.processes} processes x {args.writes} transactions + clicks, '
+          f'journal {outcomes[0][2]["journal_mode"]}, busy timeout {args.busy_timeout_ms} ms')
+    print(f'{writes / elapsed:8.1f} writes/s  failed {failed}  contended {totals["contended"]}/{totals["transactions"]}  '
+          f'retries {totals["retries"]}  lock wait total {totals["lock_wait_ms_total"]:.0f} ms  max {wait_max:.1f} ms')
+    
+    conn = sqlite3.connect(config['DATABASE_PATH'])
+    stored = conn.execute('SELECT COUNT(*) FROM transactions WHERE user_id = ?', (user.id,)).fetchone()[0]
+    clicks = conn.execute('SELECT COUNT(*) FROM link_clicks').fetchone()[0]
+    counted = conn.execute('SELECT total_clicks FROM link_click_counters WHERE user_id = ?', (user.id,)).fetchone()[0]
+    rolled_up = conn.execute("SELECT SUM(clicks) FROM link_click_rollups WHERE granularity = 'day'").fetchone()[0]
+    conn.close()
+    expected = args.processes * args.writes - failed
+    consistent = stored >= expected and clicks == counted == rolled_up
+    print(f'transactions {stored}, clicks {clicks}, click counter {counted}, rollups {rolled_up}: '
+          f'{"consistent" if consistent else "MISMATCH"}')
+    sys.exit(0 if consistent and not failed else 1)
+
+if __name__ == '__main__':
+    main()
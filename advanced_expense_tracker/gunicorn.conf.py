@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration: prefork workers, each serving requests on a thread pool
+Every worker builds its own services (caches, executors) after the fork; the
+caches check the shared data versions and the login limiter keeps its state
+in the database, so workers stay coherent.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 8000)}"
+workers = int(os.getenv('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 8))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so slow leaks can't accumulate
+max_requests = int(os.getenv('WEB_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+# Services start background threads; they must be created in each worker, not before the fork
+preload_app = False
+
+accesslog = os.getenv('WEB_ACCESS_LOG', '-')
+errorlog = '-'
@@ -0,0 +1,29 @@
+"""
+Epoch-day dates: whole days since 1970-01-01 as plain integers
+"""
+from datetime import date
+from functools import lru_cache
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def to_epoch_day(iso_date):
+    """'YYYY-MM-DD' (or a date/datetime) -> days since 1970-01-01; ValueError if it is not a date"""
+    if isinstance(iso_date, date):
+        return iso_date.toordinal() - EPOCH_ORDINAL
+    try:
+        return date.fromisoformat(iso_date[:10]).toordinal() - EPOCH_ORDINAL
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid date {iso_date!r}, expected YYYY-MM-DD') from None
+
+def from_epoch_day(day):
+    """Days since 1970-01-01 -> 'YYYY-MM-DD'"""
+    return date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+
+def today_epoch_day():
+    """Today's local date as an epoch day"""
+    return date.today().toordinal() - EPOCH_ORDINAL
+
+@lru_cache(maxsize=4096)
+def month_of_day(day):
+    """Epoch day -> 'YYYY-MM' bucket key"""
+    return from_epoch_day(day)[:7]
@@ -1,39 +1,62 @@
 """
 Envelope model for budget allocation
 """
+from models.money import Money, to_cents
 
 class Envelope:
     """Represents a budget envelope"""
     
+    __slots__ = ('id', 'user_id', 'name', 'allocated_cents', 'spent_cents', 'is_pooled')
+    
     def __init__(self, id, user_id, name, allocated, spent=0, is_pooled=False):
         self.id = id
         self.user_id = user_id
         self.name = name
-        self.allocated = allocated
-        self.spent = spent
+        self.allocated_cents = to_cents(allocated)
+        self.spent_cents = to_cents(spent)
         self.is_pooled = is_pooled
     
+    @classmethod
+    def from_row(cls, row):
+        """Build from an envelopes row"""
+        e = cls.__new__(cls)
+        e.id = row['id']
+        e.user_id = row['user_id']
+        e.name = row['name']
+        e.allocated_cents = row['allocated_cents']
+        e.spent_cents = row['spent_cents']
+        e.is_pooled = bool(row['is_pooled'])
+        return e
+    
+    @property
+    def allocated(self):
+        return Money(self.allocated_cents)
+    
+    @property
+    def spent(self):
+        return Money(self.spent_cents)
+    
     @property
     def remaining(self):
-        return self.allocated - self.spent
+        return Money(self.allocated_cents - self.spent_cents)
     
     @property
     def percentage_used(self):
-        if self.allocated == 0:
+        if self.allocated_cents == 0:
             return 0
-        return (self.spent / self.allocated) * 100
+        return (self.spent_cents / self.allocated_cents) * 100
     
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
             'name': self.name,
-            'allocated': self.allocated,
-            'spent': self.spent,
-            'remaining': self.remaining,
+            'allocated': self.allocated.major,
+            'spent': self.spent.major,
+            'remaining': self.remaining.major,
             'percentage_used': self.percentage_used,
             'is_pooled': self.is_pooled
         }
     
     def __repr__(self):
-        return f'<Envelope {self.name} ${self.remaining} remaining>'
+        return f'<Envelope {self.name} ${self.remaining:.2f} remaining>'
@@ -0,0 +1,96 @@
+"""
+Money model - exact amounts in integer minor units (paise/cents)
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from fractions import Fraction
+
+_CENT = Decimal('0.01')
+
+def to_cents(value):
+    """Convert a major-unit amount (float, str, Decimal or Money) to integer cents"""
+    if isinstance(value, Money):
+        return value.cents
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value * 100
+    return int((Decimal(str(value)).quantize(_CENT, rounding=ROUND_HALF_UP) * 100).to_integral_value())
+
+def to_major(cents):
+    """Convert integer cents to a major-unit float for display"""
+    return cents / 100
+
+class Money:
+    """An exact amount of money held as integer cents"""
+    
+    __slots__ = ('cents',)
+    
+    def __init__(self, cents=0):
+        self.cents = int(cents)
+    
+    @classmethod
+    def from_major(cls, value):
+        return cls(to_cents(value))
+    
+    @property
+    def major(self):
+        return to_major(self.cents)
+    
+    def __add__(self, other):
+        return Money(self.cents + to_cents(other))
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other):
+        return Money(self.cents - to_cents(other))
+    
+    def __neg__(self):
+        return Money(-self.cents)
+    
+    def __abs__(self):
+        return Money(abs(self.cents))
+    
+    def _operands(self, other):
+        """
+        Exact values to compare self with other, or None for non-numbers
+        Plain numbers are amounts in major units and compare exactly, so
+        Money(10) == 0.1 is False just as Fraction(1, 10) == 0.1 is.
+        """
+        if isinstance(other, Money):
+            return self.cents, other.cents
+        if isinstance(other, int):
+            return self.cents, other * 100
+        if isinstance(other, (float, Decimal, Fraction)):
+            return Fraction(self.cents, 100), other
+        return None
+    
+    def __eq__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] == operands[1]
+    
+    def __lt__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] < operands[1]
+    
+    def __le__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] <= operands[1]
+    
+    def __gt__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] > operands[1]
+    
+    def __ge__(self, other):
+        operands = self._operands(other)
+        return NotImplemented if operands is None else operands[0] >= operands[1]
+    
+    def __hash__(self):
+        # Equal to the hash of the number it compares equal to (Money(500) and 5)
+        return hash(Fraction(self.cents, 100))
+    
+    def __float__(self):
+        return self.major
+    
+    def __format__(self, spec):
+        return format(self.major, spec or '.2f')
+    
+    def __repr__(self):
+        return f'<Money {self.cents / 100:.2f}>'
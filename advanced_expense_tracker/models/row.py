@@ -0,0 +1,42 @@
+"""
+Read-only mapping view over a sqlite3.Row
+"""
+from collections.abc import Mapping
+
+class RowAdapter(Mapping):
+    """Dict-like access to a sqlite3.Row without copying it into a dict"""
+    
+    __slots__ = ('_row',)
+    
+    def __init__(self, row):
+        self._row = row
+    
+    def __getitem__(self, key):
+        try:
+            return self._row[key]
+        except IndexError:
+            raise KeyError(key) from None
+    
+    def get(self, key, default=None):
+        try:
+            return self._row[key]
+        except IndexError:
+            return default
+    
+    def __contains__(self, key):
+        return key in self._row.keys()
+    
+    def __iter__(self):
+        return iter(self._row.keys())
+    
+    def __len__(self):
+        return len(self._row)
+    
+    def keys(self):
+        return self._row.keys()
+    
+    def to_dict(self):
+        return dict(zip(self._row.keys(), self._row))
+    
+    def __repr__(self):
+        return f'<RowAdapter {self.to_dict()!r}>'
@@ -1,35 +1,72 @@
 """
 Transaction model
 """
-from datetime import datetime
+from datetime import date
+
+from models.day import EPOCH_ORDINAL, from_epoch_day, to_epoch_day
+from models.money import Money, to_cents
 
 class Transaction:
     """Represents a financial transaction"""
     
+    __slots__ = ('id', 'user_id', 'amount_cents', 'merchant', 'category', 'day',
+                 'envelope_id', 'notes', 'is_online_sale')
+    
     def __init__(self, id, user_id, amount, merchant, category, date, 
-                 envelope_id=None, notes='', is_online_sale=False):
+                 envelope_id=None, notes='', is_online_sale=False, day=None):
         self.id = id
         self.user_id = user_id
-        self.amount = amount
+        self.amount_cents = to_cents(amount)
         self.merchant = merchant
         self.category = category
-        self.date = date if isinstance(date, datetime) else datetime.fromisoformat(date)
+        self.day = to_epoch_day(date) if day is None else day   # days since 1970-01-01
         self.envelope_id = envelope_id
         self.notes = notes
         self.is_online_sale = is_online_sale
     
+    @classmethod
+    def from_row(cls, row):
+        """Build from a transactions row without re-validating or parsing any field"""
+        t = cls.__new__(cls)
+        t.id = row['id']
+        t.user_id = row['user_id']
+        t.amount_cents = row['amount_cents']
+        t.merchant = row['merchant']
+        t.category = row['category']
+        t.day = row['day']
+        t.envelope_id = row['envelope_id']
+        t.notes = row['notes']
+        t.is_online_sale = bool(row['is_online_sale'])
+        return t
+    
+    @property
+    def amount(self):
+        return Money(self.amount_cents)
+    
+    @property
+    def date(self):
+        """The calendar day of the transaction (None for legacy rows without one)"""
+        return None if self.day is None else date.fromordinal(self.day + EPOCH_ORDINAL)
+    
+    @property
+    def date_text(self):
+        """The day as 'YYYY-MM-DD'"""
+        return None if self.day is None else from_epoch_day(self.day)
+    
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'amount': self.amount,
+            'amount': self.amount_cents / 100,
+            'amount_cents': self.amount_cents,
             'merchant': self.merchant,
             'category': self.category,
-            'date': self.date.isoformat(),
+            'date': self.date_text,
+            'day': self.day,
             'envelope_id': self.envelope_id,
             'notes': self.notes,
             'is_online_sale': self.is_online_sale
         }
     
     def __repr__(self):
-        return f'<Transaction {self.merchant} ${self.amount}>'
+        return f'<Transaction {self.merchant} ${self.amount:.2f}>'
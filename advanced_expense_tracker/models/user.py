@@ -1,6 +1,8 @@
 """
 User model for authentication
 """
+import time
+
 from flask_login import UserMixin
 
 class User(UserMixin):
@@ -15,5 +17,19 @@ class User(UserMixin):
     def get_id(self):
         return str(self.id)
     
+    def to_snapshot(self):
+        """Compact dict for the signed session cookie"""
+        return {'id': self.id, 'u': self.username, 'e': self.email,
+                'a': 1 if self.auto_detect_enabled else 0, 't': int(time.time())}
+    
+    @classmethod
+    def from_snapshot(cls, snapshot, user_id, max_age):
+        """Rebuild from a session snapshot for user_id if it is younger than max_age seconds"""
+        if not snapshot or snapshot.get('id') != user_id:
+            return None
+        if time.time() - snapshot.get('t', 0) > max_age:
+            return None
+        return cls(snapshot['id'], snapshot['u'], snapshot['e'], bool(snapshot['a']))
+    
     def __repr__(self):
         return f'<User {self.username}>'
@@ -1,16 +1,38 @@
 #!/usr/bin/env python3
 """
 Application entry point for AdvancedExpenseTrackerPro
+  python run.py                   Flask development server (debug, single process)
+  python run.py --server prefork  gunicorn: prefork workers x threads (gunicorn.conf.py)
+  python run.py --server async    uvicorn: ASGI app with aiosqlite JSON reads (asgi.py)
 """
+import argparse
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from app import create_app
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    parser = argparse.ArgumentParser(description='Run AdvancedExpenseTrackerPro')
+    parser.add_argument('--server', choices=['dev', 'prefork', 'async'], default=os.getenv('SERVER_MODE', 'dev'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 8000)))
+    args = parser.parse_args()
+    os.environ['PORT'] = str(args.port)
+    
+    if args.server == 'prefork':
+        os.chdir(BASE_DIR)
+        os.execvp(sys.executable, [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'])
+    elif args.server == 'async':
+        import uvicorn
+        uvicorn.run('asgi:app', host='0.0.0.0', port=args.port, app_dir=BASE_DIR,
+                    workers=int(os.getenv('WEB_WORKERS', 1)), log_level='warning')
+    else:
+        from app import create_app
+        app = create_app()
+        app.run(host='0.0.0.0', port=args.port, debug=True)
 
 if __name__ == '__main__':
-    app = create_app()
-    port = int(os.getenv('PORT', 8000))
-    app.run(host='0.0.0.0', port =port, debug=True)
+    main()
@@ -0,0 +1,63 @@
+"""
+Password hashing off the request threads
+bcrypt hashes and checks run on a small dedicated pool. Requests beyond the
+pool's workers plus its queue depth are refused with AuthBusyError instead of
+piling up behind a login burst.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_ROUNDS = 12
+
+class AuthBusyError(Exception):
+    """Raised when the hashing queue is full"""
+
+class AuthExecutor:
+    """Bounded bcrypt worker pool with a configurable cost factor"""
+    
+    def __init__(self, workers=2, queue_depth=16, rounds=DEFAULT_ROUNDS):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.rounds = rounds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auth')
+        self._slots = threading.BoundedSemaphore(workers + queue_depth)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.rejected = 0
+    
+    def _run(self, fn, *args):
+        """Run fn on the pool and wait for it, shedding load when every slot is taken"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise AuthBusyError('Too many sign-in requests right now, please try again in a moment')
+        try:
+            return self._pool.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.completed += 1
+    
+    def hash_password(self, password):
+        """bcrypt hash of password at the configured cost"""
+        import bcrypt
+        return self._run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)))
+    
+    def check_password(self, password, password_hash):
+        import bcrypt
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash)
+    
+    def needs_rehash(self, password_hash):
+        """True when password_hash was made with a different cost than configured"""
+        try:
+            return int(password_hash.split(b'$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+    
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'queue_depth': self.queue_depth, 'rounds': self.rounds,
+                    'completed': self.completed, 'rejected': self.rejected}
+    
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
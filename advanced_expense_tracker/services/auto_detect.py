@@ -4,14 +4,11 @@ No ML/AI - pure Python logic for merchant normalization and pattern detection
 """
 import csv
 import re
-from datetime import datetime, timedelta
+from datetime import datetime
 from collections import defaultdict
 import io
 
-try:
-    from ofxparse import OfxParser
-except ImportError:
-    OfxParser = None
+from models.day import from_epoch_day
 
 class AutoDetector:
     """Rule-based transaction detection and normalization"""
@@ -62,9 +59,29 @@ class AutoDetector:
     # Online merchant indicators
     ONLINE_INDICATORS = ['amazon', 'ebay', 'etsy', 'paypal', 'stripe', '.com', 'online', 'web']
     
+    # Compiled rule tables, shared by every instance (built once by compile_rules)
+    _compiled_rules = None
+    
     def __init__(self, data_store):
         self.data_store = data_store
     
+    @classmethod
+    def compile_rules(cls):
+        """Precompile merchant patterns and cleanup regexes"""
+        if cls._compiled_rules is None:
+            cls._compiled_rules = {
+                'merchants': [(re.compile(pattern), normalized)
+                              for pattern, normalized in cls.MERCHANT_PATTERNS.items()],
+                'any_merchant': re.compile('|'.join(f'(?:{p})' for p in cls.MERCHANT_PATTERNS)),
+                'store_number': re.compile(r'#\d+'),
+                'long_number': re.compile(r'\d{10,}'),
+            }
+        return cls._compiled_rules
+    
+    def warmup(self):
+        """Registry hook: compile rule tables before the first request"""
+        self.compile_rules()
+    
     def import_file(self, file, user_id):
         """Import transactions from CSV or OFX file"""
         filename = file.filename.lower()
@@ -126,7 +143,10 @@ class AutoDetector:
     
     def _import_ofx(self, file, user_id):
         """Import from OFX/QFX file"""
-        if not OfxParser:
+        # ofxparse is optional and slow to import: load it only for OFX uploads
+        try:
+            from ofxparse import OfxParser
+        except ImportError:
             return []
         
         detected = []
@@ -203,15 +223,16 @@ class AutoDetector:
     
     def _normalize_merchant(self, merchant):
         """Normalize merchant name using pattern matching"""
+        rules = self.compile_rules()
         merchant_upper = merchant.upper()
         
-        for pattern, normalized in self.MERCHANT_PATTERNS.items():
-            if re.search(pattern, merchant_upper):
+        for pattern, normalized in rules['merchants']:
+            if pattern.search(merchant_upper):
                 return normalized
         
         # Clean up common prefixes/suffixes
-        cleaned = re.sub(r'#\d+', '', merchant)  # Remove store numbers
-        cleaned = re.sub(r'\d{10,}', '', cleaned)  # Remove long numbers
+        cleaned = rules['store_number'].sub('', merchant)  # Remove store numbers
+        cleaned = rules['long_number'].sub('', cleaned)  # Remove long numbers
         cleaned = cleaned.strip()
         
         return cleaned[:50]  # Limit length
@@ -246,11 +267,8 @@ class AutoDetector:
         confidence_score = 0
         
         # Known merchant patterns increase confidence
-        merchant_upper = merchant.upper()
-        for pattern in self.MERCHANT_PATTERNS.keys():
-            if re.search(pattern, merchant_upper):
-                confidence_score += 40
-                break
+        if self.compile_rules()['any_merchant'].search(merchant.upper()):
+            confidence_score += 40
         
         # Category detection adds confidence
         if category != 'Other':
@@ -310,28 +328,25 @@ class AutoDetector:
     
     def detect_recurring(self, user_id):
         """Detect recurring transactions using pattern analysis"""
-        transactions = self.data_store.get_transactions(user_id)
+        ledger = self.data_store.get_ledger(user_id)
+        days = ledger.days
         
-        # Group by merchant
-        merchant_groups = defaultdict(list)
-        for t in transactions:
-            merchant_groups[t['merchant']].append(t)
+        # Group row indices by merchant id
+        merchant_groups = ledger.group_by(ledger.merchant_ids)
         
         recurring = []
         
-        for merchant, trans_list in merchant_groups.items():
-            if len(trans_list) < 2:
+        for merchant_id, indices in merchant_groups.items():
+            if len(indices) < 2:
                 continue
             
             # Sort by date
-            trans_list.sort(key=lambda x: x['date'])
+            indices.sort(key=lambda i: days[i])
             
-            # Calculate intervals
+            # Calculate intervals (in days)
             intervals = []
-            for i in range(1, len(trans_list)):
-                date1 = datetime.fromisoformat(trans_list[i-1]['date'])
-                date2 = datetime.fromisoformat(trans_list[i]['date'])
-                intervals.append((date2 - date1).days)
+            for a, b in zip(indices, indices[1:]):
+                intervals.append(days[b] - days[a])
             
             if not intervals:
                 continue
@@ -346,21 +361,20 @@ class AutoDetector:
             
             if is_monthly or is_weekly:
                 pattern = 'Monthly' if is_monthly else 'Weekly'
-                avg_amount = sum(t['amount'] for t in trans_list) / len(trans_list)
+                avg_amount = sum(ledger.amount_cents[i] for i in indices) / len(indices) / 100
+                last_day = days[indices[-1]]
                 
                 recurring.append({
-                    'merchant': merchant,
+                    'merchant': ledger.names.merchant_name(merchant_id),
                     'pattern': pattern,
                     'avg_amount': round(avg_amount, 2),
-                    'count': len(trans_list),
-                    'last_date': trans_list[-1]['date'],
-                    'next_expected': self._calculate_next_date(trans_list[-1]['date'], avg_interval)
+                    'count': len(indices),
+                    'last_date': from_epoch_day(last_day),
+                    'next_expected': self._calculate_next_date(last_day, avg_interval)
                 })
         
         return recurring
     
-    def _calculate_next_date(self, last_date, interval):
-        """Calculate next expected date"""
-        last = datetime.fromisoformat(last_date)
-        next_date = last + timedelta(days=int(interval))
-        return next_date.strftime('%Y-%m-%d')
+    def _calculate_next_date(self, last_day, interval):
+        """Calculate next expected date from an epoch day"""
+        return from_epoch_day(last_day + int(interval))
@@ -0,0 +1,507 @@
+"""
+Streaming encrypted backups
+Backups are written and restored in fixed-size authenticated chunks so memory
+stays bounded regardless of how much data a user has
+"""
+import base64
+import hashlib
+import hmac
+import io
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from models.day import to_epoch_day
+from models.money import to_cents
+from services import data_version
+
+MAGIC = b'AETBK'
+FORMAT_VERSION = 2
+LEGACY_FORMAT_VERSION = 1  # unsalted sha256(passphrase) keys
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Per-user tables included in a backup, with the column that identifies the owner
+BACKUP_TABLES = {
+    'transactions': 'user_id',
+    'envelopes': 'user_id',
+    'goals': 'user_id',
+    'detected_transactions': 'user_id',
+    'offers': 'user_id',
+}
+
+# Columns a restore may write, per table. Nothing else from a backup reaches SQL:
+# ids are assigned locally and the owner column is always the restoring user.
+RESTORE_COLUMNS = {
+    'transactions': ('amount_cents', 'merchant_id', 'category_id', 'date', 'day', 'envelope_id', 'notes',
+                     'is_online_sale', 'created_at'),
+    'envelopes': ('name', 'allocated_cents', 'spent_cents', 'is_pooled', 'created_at'),
+    'goals': ('name', 'target_cents', 'current_cents', 'deadline', 'created_at'),
+    'detected_transactions': ('amount_cents', 'merchant_id', 'category_id', 'date', 'day', 'confidence',
+                              'is_online_sale', 'created_at'),
+    'offers': ('merchant', 'discount', 'description', 'expiry', 'created_at'),
+}
+
+# Most expensive KDF settings a backup header may ask for (headers are untrusted input)
+MAX_SCRYPT_N = 2 ** 20
+MAX_SCRYPT_R = 32
+MAX_SCRYPT_P = 16
+MAX_SCRYPT_MEMORY = 256 * 1024 * 1024   # 128 * n * r bytes
+MAX_SCRYPT_WORK = 2 ** 24   # n * r * p
+MAX_PBKDF2_ITERATIONS = 5000000
+
+_LENGTH = struct.Struct('>I')
+_CHUNK_PREFIX = struct.Struct('>QB')  # sequence number, final-chunk flag
+
+class BackupError(Exception):
+    """Raised when a backup cannot be read or does not belong to the user"""
+
+def derive_legacy_key(passphrase):
+    """Fernet key for version 1 backups (unsalted sha256 of the passphrase)"""
+    return base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode()).digest())
+
+class KdfParams:
+    """Tunable passphrase KDF settings (scrypt or PBKDF2-SHA256 from hashlib)"""
+    
+    def __init__(self, name='scrypt', n=2 ** 15, r=8, p=1, iterations=600000):
+        if name not in ('scrypt', 'pbkdf2_sha256'):
+            raise ValueError(f'Unknown KDF: {name}')
+        self.name = name
+        self.n = n
+        self.r = r
+        self.p = p
+        self.iterations = iterations
+    
+    def to_dict(self):
+        if self.name == 'scrypt':
+            return {'name': 'scrypt', 'n': self.n, 'r': self.r, 'p': self.p}
+        return {'name': 'pbkdf2_sha256', 'iterations': self.iterations}
+    
+    @classmethod
+    def from_dict(cls, data):
+        """KDF settings from a backup header; BackupError unless they are well-formed and affordable"""
+        fields = {'scrypt': ('n', 'r', 'p'), 'pbkdf2_sha256': ('iterations',)}.get(data.get('name'))
+        if fields is None or set(data) != {'name', *fields}:
+            raise BackupError('Backup uses unsupported key derivation settings')
+        for field in fields:
+            if type(data[field]) is not int or data[field] < 1:
+                raise BackupError('Backup uses unsupported key derivation settings')
+        
+        kdf = cls(**data)
+        if kdf.name == 'scrypt':
+            affordable = (kdf.n <= MAX_SCRYPT_N and kdf.n & (kdf.n - 1) == 0 and kdf.n > 1
+                          and kdf.r <= MAX_SCRYPT_R and kdf.p <= MAX_SCRYPT_P
+                          and 128 * kdf.n * kdf.r <= MAX_SCRYPT_MEMORY and kdf.n * kdf.r * kdf.p <= MAX_SCRYPT_WORK)
+        else:
+            affordable = kdf.iterations <= MAX_PBKDF2_ITERATIONS
+        if not affordable:
+            raise BackupError('Backup key derivation settings exceed the allowed cost')
+        return kdf
+    
+    def derive(self, passphrase, salt):
+        """Run the (slow) KDF and return a 32-byte master key"""
+        secret = passphrase.encode('utf-8')
+        if self.name == 'scrypt':
+            return hashlib.scrypt(secret, salt=salt, n=self.n, r=self.r, p=self.p,
+                                  maxmem=256 * self.n * self.r + 1024 * 1024, dklen=32)
+        return hashlib.pbkdf2_hmac('sha256', secret, salt, self.iterations, dklen=32)
+
+class KeyCache:
+    """
+    Short-lived in-memory cache of KDF master keys
+    Batch backup jobs that reuse one operator passphrase pay the KDF once per
+    TTL window: the KDF salt is reused inside the window while every backup
+    still gets its own random nonce (and therefore its own Fernet key).
+    Passphrases are never stored; entries are keyed by an HMAC under a
+    per-process random secret.
+    """
+    
+    def __init__(self, ttl=300, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._secret = os.urandom(32)
+        self._entries = {}   # (tag, salt, params) -> (master_key, expires_at)
+        self._current_salt = {}   # (tag, params) -> salt for new backups
+        self._lock = threading.Lock()
+    
+    def _tag(self, passphrase):
+        return hmac.new(self._secret, passphrase.encode('utf-8'), hashlib.sha256).digest()
+    
+    def _params_key(self, kdf):
+        return json.dumps(kdf.to_dict(), sort_keys=True)
+    
+    def get_master_key(self, passphrase, salt, kdf):
+        """Master key for (passphrase, salt, kdf), derived at most once per TTL"""
+        cache_key = (self._tag(passphrase), salt, self._params_key(kdf))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[1] > now:
+                return entry[0]
+        
+        master_key = kdf.derive(passphrase, salt)
+        with self._lock:
+            self._prune(now)
+            self._entries[cache_key] = (master_key, now + self.ttl)
+        return master_key
+    
+    def salt_for_new_backup(self, passphrase, kdf):
+        """KDF salt to use for a new backup (rotates once the cached key expires)"""
+        salt_key = (self._tag(passphrase), self._params_key(kdf))
+        now = time.monotonic()
+        with self._lock:
+            salt = self._current_salt.get(salt_key)
+            if salt is not None:
+                entry = self._entries.get((salt_key[0], salt, salt_key[1]))
+                if entry and entry[1] > now:
+                    return salt
+            salt = os.urandom(16)
+            self._current_salt[salt_key] = salt
+            return salt
+    
+    def _prune(self, now):
+        expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+        while len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k][1])
+            del self._entries[oldest]
+    
+    def clear(self):
+        """Drop every cached key"""
+        with self._lock:
+            self._entries.clear()
+            self._current_salt.clear()
+
+# Process-wide derived-key cache shared by every BackupManager
+key_cache = KeyCache()
+
+def backup_fernet(master_key, nonce):
+    """Per-backup Fernet built from the master key and the backup's random nonce"""
+    from cryptography.fernet import Fernet   # imported on first backup, not at startup
+    subkey = hmac.new(master_key, b'aet-backup-v2' + nonce, hashlib.sha256).digest()
+    return Fernet(base64.urlsafe_b64encode(subkey))
+
+class BackupWriter:
+    """Encrypts a stream of records into length-prefixed Fernet chunks"""
+    
+    def __init__(self, out, fernet, header, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.out = out
+        self.fernet = fernet
+        self.chunk_size = chunk_size
+        self.buffer = io.BytesIO()
+        self.sequence = 0
+        
+        header_bytes = json.dumps(header).encode('utf-8')
+        out.write(MAGIC + bytes([FORMAT_VERSION]))
+        out.write(_LENGTH.pack(len(header_bytes)) + header_bytes)
+        
+        # Repeat the header inside the encrypted stream so it is authenticated
+        self.write_record('header', header)
+    
+    def write_record(self, kind, row):
+        """Queue one record; emits a chunk whenever the buffer fills up"""
+        line = json.dumps({'t': kind, 'r': row}, separators=(',', ':'), default=str)
+        self.buffer.write(line.encode('utf-8') + b'\n')
+        if self.buffer.tell() >= self.chunk_size:
+            self._emit(final=False)
+    
+    def _emit(self, final):
+        payload = _CHUNK_PREFIX.pack(self.sequence, 1 if final else 0) + self.buffer.getvalue()
+        token = self.fernet.encrypt(payload)
+        self.out.write(_LENGTH.pack(len(token)) + token)
+        self.sequence += 1
+        self.buffer = io.BytesIO()
+    
+    def close(self):
+        """Write the final chunk"""
+        self._emit(final=True)
+
+def read_header(stream):
+    """Read the plaintext header at the start of a backup"""
+    prefix = stream.read(len(MAGIC) + 1)
+    if len(prefix) != len(MAGIC) + 1 or not prefix.startswith(MAGIC):
+        raise BackupError('Not a backup file')
+    version = prefix[-1]
+    if version not in (FORMAT_VERSION, LEGACY_FORMAT_VERSION):
+        raise BackupError(f'Unsupported backup version {version}')
+    
+    length = _read_length(stream)
+    return version, json.loads(stream.read(length))
+
+def iter_records(stream, fernet, header):
+    """Decrypt chunk by chunk, yielding (kind, row) records"""
+    from cryptography.fernet import InvalidToken
+    expected_sequence = 0
+    pending = b''
+    seen_final = False
+    
+    while not seen_final:
+        length = _read_length(stream)
+        token = stream.read(length)
+        try:
+            payload = fernet.decrypt(token)
+        except InvalidToken:
+            raise BackupError('Wrong passphrase or corrupted backup')
+        
+        sequence, final = _CHUNK_PREFIX.unpack_from(payload)
+        if sequence != expected_sequence:
+            raise BackupError('Backup chunks are out of order')
+        expected_sequence += 1
+        seen_final = bool(final)
+        
+        lines = (pending + payload[_CHUNK_PREFIX.size:]).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            record = json.loads(line)
+            if record['t'] == 'header':
+                if record['r'] != header:
+                    raise BackupError('Backup header was tampered with')
+                continue
+            yield record['t'], record['r']
+
+def _read_length(stream):
+    raw = stream.read(_LENGTH.size)
+    if len(raw) != _LENGTH.size:
+        raise BackupError('Backup is truncated')
+    return _LENGTH.unpack(raw)[0]
+
+class BackupManager:
+    """Creates and restores full or incremental per-user backups"""
+    
+    def __init__(self, data_store, chunk_size=DEFAULT_CHUNK_SIZE, kdf=None, cache=None):
+        self.data_store = data_store
+        self.chunk_size = chunk_size
+        self.kdf = kdf or KdfParams()
+        self.key_cache = cache or key_cache
+    
+    def _new_backup_fernet(self, passphrase):
+        """Fernet and header fields for a new backup"""
+        salt = self.key_cache.salt_for_new_backup(passphrase, self.kdf)
+        nonce = os.urandom(16)
+        master_key = self.key_cache.get_master_key(passphrase, salt, self.kdf)
+        kdf_header = dict(self.kdf.to_dict(),
+                          salt=base64.b64encode(salt).decode('ascii'),
+                          nonce=base64.b64encode(nonce).decode('ascii'))
+        return backup_fernet(master_key, nonce), kdf_header
+    
+    def _restore_fernet(self, version, header, passphrase):
+        """Fernet for an existing backup, from its header"""
+        if version == LEGACY_FORMAT_VERSION:
+            from cryptography.fernet import Fernet
+            return Fernet(derive_legacy_key(passphrase))
+        
+        try:
+            kdf_header = dict(header['kdf'])
+            salt = base64.b64decode(kdf_header.pop('salt'), validate=True)
+            nonce = base64.b64decode(kdf_header.pop('nonce'), validate=True)
+        except (KeyError, TypeError, ValueError):
+            raise BackupError('Backup header is malformed')
+        # Our own settings are always accepted; anything else must pass the cost limits
+        kdf = self.kdf if kdf_header == self.kdf.to_dict() else KdfParams.from_dict(kdf_header)
+        return backup_fernet(self.key_cache.get_master_key(passphrase, salt, kdf), nonce)
+    
+    def init_tables(self, cursor):
+        """Backup snapshot bookkeeping (one row per backup written)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS backups (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                last_transaction_id INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_backups_user ON backups(user_id, id)')
+    
+    def _last_snapshot(self, cursor, user_id):
+        cursor.execute('''
+            SELECT last_transaction_id FROM backups WHERE user_id = ? ORDER BY id DESC LIMIT 1
+        ''', (user_id,))
+        row = cursor.fetchone()
+        return row['last_transaction_id'] if row else None
+    
+    def write_backup(self, user_id, passphrase, out, incremental=False):
+        """
+        Stream a backup of the user's rows and log records into `out`
+        Incremental backups carry only transactions (and log records) added since
+        the last snapshot, plus the small mutable tables in full.
+        Returns the header describing the backup.
+        """
+        conn = self.data_store.get_connection()
+        cursor = conn.cursor()
+        
+        since_id = self._last_snapshot(cursor, user_id) if incremental else None
+        kind = 'incremental' if since_id is not None else 'full'
+        
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM transactions WHERE user_id = ?', (user_id,))
+        last_transaction_id = cursor.fetchone()[0]
+        
+        fernet, kdf_header = self._new_backup_fernet(passphrase)
+        header = {
+            'user_id': user_id,
+            'kind': kind,
+            'since_transaction_id': since_id,
+            'last_transaction_id': last_transaction_id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'kdf': kdf_header,
+        }
+        writer = BackupWriter(out, fernet, header, self.chunk_size)
+        names = self.data_store.names
+        
+        for table, owner_column in BACKUP_TABLES.items():
+            query = f'SELECT * FROM {table} WHERE {owner_column} = ?'
+            params = [user_id]
+            if table == 'transactions':
+                query += ' AND id <= ?'
+                params.append(last_transaction_id)
+                if since_id is not None:
+                    query += ' AND id > ?'
+                    params.append(since_id)
+            for row in conn.execute(query, params):
+                record = dict(row)
+                # Dictionary ids are local to this database; back up the names
+                if table in self.data_store.NAMED_TABLES:
+                    record['merchant'] = names.merchant_name(record.pop('merchant_id'))
+                    record['category'] = names.category_name(record.pop('category_id'))
+                writer.write_record(table, record)
+        
+        for record in self.data_store.get_log_records(user_id):
+            record_id = record.get('id')
+            if since_id is not None and (record_id is None or record_id <= since_id):
+                continue
+            if record_id is not None and record_id > last_transaction_id:
+                continue
+            writer.write_record('log', record)
+        
+        writer.close()
+        
+        cursor.execute('''
+            INSERT INTO backups (user_id, kind, last_transaction_id, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, kind, last_transaction_id, header['created_at']))
+        conn.commit()
+        conn.close()
+        
+        return header
+    
+    def _upgrade_row(self, cursor, table, row):
+        """Map backed-up names to local ids and bring rows from older backups up to date"""
+        if table in self.data_store.NAMED_TABLES:
+            names = self.data_store.names
+            row['merchant_id'] = names.merchants.get_id(cursor, row.pop('merchant', ''))
+            row['category_id'] = names.categories.get_id(cursor, row.pop('category', ''))
+        for money_table, old_column, new_column in self.data_store.MONEY_COLUMNS:
+            if money_table == table and old_column in row:
+                value = row.pop(old_column)
+                row.setdefault(new_column, to_cents(value or 0))
+        if table in self.data_store.DAY_TABLES:
+            # Always derived, never trusted: a missing or bad date rejects the row
+            row['day'] = to_epoch_day(row.get('date'))
+    
+    def restore_backup(self, user_id, passphrase, stream):
+        """
+        Stream-restore a backup into the user's account
+        Full backups replace the user's rows and log; incremental backups add
+        their transactions and replace the small mutable tables. Rows get new
+        local ids (envelope links and log records are remapped to match), and
+        the log is only touched once the database transaction has committed.
+        Returns per-table counts of restored rows.
+        """
+        version, header = read_header(stream)
+        if header.get('user_id') != user_id:
+            raise BackupError('Backup belongs to a different user')
+        
+        fernet = self._restore_fernet(version, header, passphrase)
+        records = iter_records(stream, fernet, header)
+        full = header['kind'] == 'full'
+        counts = {'log': 0}
+        ids = {'transactions': {}, 'envelopes': {}}   # backup id -> local id
+        
+        with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+            try:
+                with self.data_store.write() as cursor:
+                    previous_envelopes = self._clear_for_restore(cursor, user_id, full)
+                    for kind, row in records:
+                        if kind == 'log':
+                            spool.write(json.dumps(row, separators=(',', ':')) + '\n')
+                            counts['log'] += 1
+                            continue
+                        if kind not in RESTORE_COLUMNS:
+                            continue
+                        backup_id = row.get('id')
+                        try:
+                            self._upgrade_row(cursor, kind, row)
+                            columns = [column for column in RESTORE_COLUMNS[kind] if column in row]
+                            cursor.execute(f'''
+                                INSERT INTO {kind} ({', '.join([BACKUP_TABLES[kind]] + columns)})
+                                VALUES ({', '.join('?' * (len(columns) + 1))})
+                            ''', [user_id] + [row[column] for column in columns])
+                        except (ValueError, TypeError, sqlite3.IntegrityError, sqlite3.InterfaceError) as e:
+                            raise BackupError(f'Backup contains an invalid {kind} row') from e
+                        if kind in ids and backup_id is not None:
+                            ids[kind][backup_id] = cursor.lastrowid
+                        counts[kind] = counts.get(kind, 0) + 1
+                    self._relink_envelopes(cursor, user_id, ids, previous_envelopes)
+                    data_version.bump(cursor, user_id)
+            finally:
+                self.data_store.ledgers.invalidate(user_id)
+            
+            spool.seek(0)
+            log_records = (self._relink_log_record(json.loads(line), ids['transactions']) for line in spool)
+            log = self.data_store.transaction_log
+            if full:
+                log.replace(user_id, log_records)
+            else:
+                for record in log_records:
+                    log.append(user_id, record)
+        
+        return counts
+    
+    def _clear_for_restore(self, cursor, user_id, full):
+        """
+        Delete the rows a restore replaces: everything for a full backup, the
+        mutable tables for an incremental one. Returns the user's envelopes
+        as {id: name} from before the restore.
+        """
+        cursor.execute('SELECT id, name FROM envelopes WHERE user_id = ?', (user_id,))
+        previous_envelopes = {row['id']: row['name'] for row in cursor.fetchall()}
+        for table, owner_column in BACKUP_TABLES.items():
+            if full or table != 'transactions':
+                cursor.execute(f'DELETE FROM {table} WHERE {owner_column} = ?', (user_id,))
+        return previous_envelopes
+    
+    def _relink_envelopes(self, cursor, user_id, ids, previous_envelopes):
+        """
+        Point transactions at the re-created envelopes
+        Restored transactions map through the backup's envelope ids; transactions
+        kept by an incremental restore follow their old envelope by name.
+        Links that cannot be resolved are cleared.
+        """
+        restored = set(ids['transactions'].values())
+        cursor.execute('SELECT id, name FROM envelopes WHERE user_id = ? ORDER BY id', (user_id,))
+        by_name = {}
+        for row in cursor.fetchall():
+            by_name.setdefault(row['name'], row['id'])
+        
+        cursor.execute('SELECT id, envelope_id FROM transactions WHERE user_id = ? AND envelope_id IS NOT NULL',
+                       (user_id,))
+        for row in cursor.fetchall():
+            if row['id'] in restored:
+                envelope_id = ids['envelopes'].get(row['envelope_id'])
+            else:
+                envelope_id = by_name.get(previous_envelopes.get(row['envelope_id']))
+            if envelope_id != row['envelope_id']:
+                cursor.execute('UPDATE transactions SET envelope_id = ? WHERE id = ?', (envelope_id, row['id']))
+    
+    @staticmethod
+    def _relink_log_record(record, transaction_ids):
+        """Point a restored log record at the local id of its transaction"""
+        if record.get('id') is not None:
+            record['id'] = transaction_ids.get(record['id'])
+        return record
@@ -0,0 +1,179 @@
+"""
+Compact columnar export format for analytics extracts
+Transactions are stored column by column in row groups: money as int64 cents,
+dates as int32 days since 1970-01-01 and repeated strings (merchant, category,
+notes) dictionary-encoded. Each column chunk is zlib-compressed. A JSON footer
+holds the dictionaries and row-group offsets, as in Parquet.
+
+Layout:
+    MAGIC header_len header_json
+    row group*: for each column: chunk_len chunk_bytes
+    footer_json footer_len MAGIC
+"""
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+from models.day import from_epoch_day
+
+MAGIC = b'AETCOL1\n'
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+# Column name -> storage type ('dict' columns hold int32 codes into a dictionary)
+TRANSACTION_SCHEMA = [
+    ('id', 'int64'),
+    ('amount_cents', 'int64'),
+    ('day', 'int32'),
+    ('merchant', 'dict'),
+    ('category', 'dict'),
+    ('envelope_id', 'int64'),   # 0 when the transaction has no envelope
+    ('is_online_sale', 'int8'),
+    ('notes', 'dict'),
+]
+
+_TYPECODES = {'int64': 'q', 'int32': 'i', 'int8': 'b', 'dict': 'i'}
+_LENGTH = struct.Struct('<I')
+
+def _to_bytes(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+class ColumnarWriter:
+    """Encodes rows into row groups; yields the file as a sequence of byte blocks"""
+    
+    def __init__(self, schema=TRANSACTION_SCHEMA, row_group_size=DEFAULT_ROW_GROUP_SIZE, compression_level=6):
+        self.schema = schema
+        self.row_group_size = row_group_size
+        self.compression_level = compression_level
+        self.dictionaries = {name: {} for name, kind in schema if kind == 'dict'}
+        self.row_groups = []
+        self.offset = 0
+    
+    def _block(self, data):
+        self.offset += len(data)
+        return data
+    
+    def _encode_group(self, rows):
+        columns = {name: array(_TYPECODES[kind]) for name, kind in self.schema}
+        for row in rows:
+            for name, kind in self.schema:
+                value = row[name]
+                if kind == 'dict':
+                    codes = self.dictionaries[name]
+                    value = '' if value is None else value
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = len(codes)
+                    columns[name].append(code)
+                else:
+                    columns[name].append(value or 0)
+        
+        chunks = []
+        for name, _ in self.schema:
+            data = zlib.compress(_to_bytes(columns[name]), self.compression_level)
+            chunks.append(_LENGTH.pack(len(data)) + data)
+        return b''.join(chunks)
+    
+    def iter_blocks(self, rows):
+        """Yield the encoded file block by block (header, row groups, footer)"""
+        header = json.dumps({'schema': self.schema}).encode('utf-8')
+        yield self._block(MAGIC + _LENGTH.pack(len(header)) + header)
+        
+        group = []
+        for row in rows:
+            group.append(row)
+            if len(group) >= self.row_group_size:
+                yield self._flush_group(group)
+                group = []
+        if group:
+            yield self._flush_group(group)
+        
+        footer = json.dumps({
+            'row_groups': self.row_groups,
+            'num_rows': sum(g['rows'] for g in self.row_groups),
+            'dictionaries': {name: list(codes) for name, codes in self.dictionaries.items()},
+        }).encode('utf-8')
+        yield self._block(footer + _LENGTH.pack(len(footer)) + MAGIC)
+    
+    def _flush_group(self, group):
+        self.row_groups.append({'offset': self.offset, 'rows': len(group)})
+        return self._block(self._encode_group(group))
+    
+    def write(self, rows, out):
+        """Write every row to a binary file object"""
+        for block in self.iter_blocks(rows):
+            out.write(block)
+
+class ColumnarReader:
+    """Reads a columnar export back into typed column arrays"""
+    
+    def __init__(self, data):
+        if not data.startswith(MAGIC) or not data.endswith(MAGIC):
+            raise ValueError('Not a columnar export')
+        self.data = data
+        
+        header_len = _LENGTH.unpack_from(data, len(MAGIC))[0]
+        header_start = len(MAGIC) + _LENGTH.size
+        self.schema = [tuple(c) for c in json.loads(data[header_start:header_start + header_len])['schema']]
+        
+        footer_len = _LENGTH.unpack_from(data, len(data) - len(MAGIC) - _LENGTH.size)[0]
+        footer_end = len(data) - len(MAGIC) - _LENGTH.size
+        footer = json.loads(data[footer_end - footer_len:footer_end])
+        self.row_groups = footer['row_groups']
+        self.num_rows = footer['num_rows']
+        self.dictionaries = footer['dictionaries']
+    
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'rb') as f:
+            return cls(f.read())
+    
+    def read_column(self, name, decode=True):
+        """
+        Concatenate one column across row groups
+        Dictionary columns are decoded to strings unless decode=False, in which
+        case the raw int32 codes are returned (cheapest for group-by work).
+        """
+        index = [n for n, _ in self.schema].index(name)
+        kind = self.schema[index][1]
+        values = array(_TYPECODES[kind])
+        
+        for group in self.row_groups:
+            pos = group['offset']
+            for _ in range(index):
+                pos += _LENGTH.size + _LENGTH.unpack_from(self.data, pos)[0]
+            length = _LENGTH.unpack_from(self.data, pos)[0]
+            chunk = self.data[pos + _LENGTH.size:pos + _LENGTH.size + length]
+            values.extend(_from_bytes(_TYPECODES[kind], zlib.decompress(chunk)))
+        
+        if kind == 'dict' and decode:
+            dictionary = self.dictionaries[name]
+            return [dictionary[code] for code in values]
+        return values
+    
+    def read_all(self):
+        """Every column as {name: values}"""
+        return {name: self.read_column(name) for name, _ in self.schema}
+    
+    def to_rows(self):
+        """Decode back into row dicts (amounts in rupees, ISO dates)"""
+        columns = self.read_all()
+        rows = []
+        for i in range(self.num_rows):
+            row = {name: columns[name][i] for name, _ in self.schema}
+            row['amount'] = row.pop('amount_cents') / 100
+            row['date'] = from_epoch_day(row.pop('day'))
+            row['envelope_id'] = row['envelope_id'] or None
+            rows.append(row)
+        return rows
@@ -2,463 +2,911 @@
 Data storage service using SQLite and per-user text files
 """
 import sqlite3
-import bcrypt
 import os
+import io
 import csv
+from contextlib import contextmanager
 from datetime import datetime
-from threading import Lock
-from cryptography.fernet import Fernet
-import base64
-import hashlib
 
 from models.user import User
 from models.transaction import Transaction
 from models.envelope import Envelope
+from models.money import Money, to_cents, to_major
+from models.row import RowAdapter
+from services.user_log import UserLogWriter, TransactionLog
+from services.backup import BackupManager
+from models.day import to_epoch_day
+from services.columnar import ColumnarWriter, DEFAULT_ROW_GROUP_SIZE
+from services.ledger_cache import LedgerCache, DEFAULT_MEMORY_BUDGET
+from services.names import get_directory
+from services.user_cache import UserCache
+from services.auth_executor import AuthExecutor, AuthBusyError
+from services.db import Database
+from services import data_version
+from services.link_tracker import init_click_windows
+from services.request_memo import memoized, invalidates
 
 class DataStore:
     """Manages all data persistence"""
     
-    def __init__(self, db_path, user_data_path):
+    # Columns that may be selected for CSV export (name -> SQL expression)
+    EXPORT_COLUMNS = {
+        'id': 't.id',
+        'user_id': 't.user_id',
+        'amount': 't.amount_cents / 100.0 AS amount',
+        'amount_cents': 't.amount_cents',
+        'merchant': 'm.name AS merchant',
+        'category': 'c.name AS category',
+        'date': 't.date',
+        'envelope_id': 't.envelope_id',
+        'notes': 't.notes',
+        'is_online_sale': 't.is_online_sale',
+        'created_at': 't.created_at'
+    }
+    DEFAULT_EXPORT_COLUMNS = ('id', 'user_id', 'amount', 'merchant', 'category', 'date',
+                              'envelope_id', 'notes', 'is_online_sale', 'created_at')
+    
+    # Money is stored as INTEGER minor units; reads also expose major-unit floats.
+    # Merchant and category names live in dictionary tables joined in by id.
+    TRANSACTION_FIELDS = '''t.id, t.user_id, t.amount_cents, t.amount_cents / 100.0 AS amount,
+        t.merchant_id, m.name AS merchant, t.category_id, c.name AS category,
+        t.date, t.day, t.envelope_id, t.notes, t.is_online_sale, t.created_at'''
+    DETECTED_FIELDS = '''t.id, t.user_id, t.amount_cents, t.amount_cents / 100.0 AS amount,
+        t.merchant_id, m.name AS merchant, t.category_id, c.name AS category,
+        t.date, t.day, t.confidence, t.is_online_sale, t.created_at'''
+    TRANSACTIONS_FROM = '''transactions t
+        JOIN merchants m ON m.id = t.merchant_id JOIN categories c ON c.id = t.category_id'''
+    DETECTED_FROM = '''detected_transactions t
+        JOIN merchants m ON m.id = t.merchant_id JOIN categories c ON c.id = t.category_id'''
+    
+    # Categories offered in forms, seeded into the categories table in this order
+    DEFAULT_CATEGORIES = ('Food & Dining', 'Shopping', 'Transportation', 'Bills & Utilities',
+                          'Entertainment', 'Healthcare', 'Travel', 'Income', 'Other')
+    ENVELOPE_FIELDS = '''id, user_id, name, allocated_cents, spent_cents, allocated_cents / 100.0 AS allocated,
+        spent_cents / 100.0 AS spent, is_pooled, created_at'''
+    GOAL_FIELDS = '''id, user_id, name, target_cents, current_cents, target_cents / 100.0 AS target,
+        current_cents / 100.0 AS current, deadline, created_at'''
+    
+    # (table, legacy REAL column, INTEGER cents column)
+    MONEY_COLUMNS = (
+        ('transactions', 'amount', 'amount_cents'),
+        ('detected_transactions', 'amount', 'amount_cents'),
+        ('envelopes', 'allocated', 'allocated_cents'),
+        ('envelopes', 'spent', 'spent_cents'),
+        ('goals', 'target', 'target_cents'),
+        ('goals', 'current', 'current_cents'),
+    )
+    
+    # Schema migrations keyed by PRAGMA user_version. init_db is skipped once the
+    # database reaches SCHEMA_VERSION, so any DDL change (in any service sharing
+    # the database) must come with a new migration.
+    MIGRATIONS = (
+        (1, '_migrate_money_to_cents'),
+        (2, '_migrate_add_epoch_day'),
+        (3, '_migrate_names_to_ids'),
+        (4, '_migrate_add_data_versions'),
+        (5, '_migrate_add_click_windows'),
+    )
+    SCHEMA_VERSION = MIGRATIONS[-1][0]
+    
+    # Tables carrying a TEXT date with a derived epoch-day column
+    DAY_TABLES = ('transactions', 'detected_transactions')
+    
+    # Tables whose merchant/category names are stored as dictionary ids
+    NAMED_TABLES = ('transactions', 'detected_transactions')
+    
+    # Merchant keywords that mark a transaction as an online sale
+    ONLINE_KEYWORDS = ('amazon', 'ebay', 'etsy', 'shopify', 'paypal', 'stripe', 'online', 'web')
+    
+    def __init__(self, db_path, user_data_path, log_writer=None, backup_kdf=None,
+                 ledger_budget=DEFAULT_MEMORY_BUDGET, user_cache_ttl=60, auth=None, db=None):
         self.db_path = db_path
+        self.db = db or Database(db_path)
         self.user_data_path = user_data_path
-        self.file_locks = {}
-        self.lock = Lock()
+        self.log_writer = log_writer or UserLogWriter()
+        self.transaction_log = TransactionLog(user_data_path, self.log_writer)
+        self.backups = BackupManager(self, kdf=backup_kdf)
+        self.names = get_directory(os.path.abspath(db_path), self.get_connection)
+        self.ledgers = LedgerCache(self._load_ledger, self.names, memory_budget=ledger_budget)
+        self.user_cache = UserCache(ttl=user_cache_ttl)
+        self.auth = auth or AuthExecutor()
     
     def get_connection(self):
         """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return self.db.connect()
+    
+    @contextmanager
+    def write(self):
+        """Write transaction (BEGIN IMMEDIATE) yielding a cursor; commits on success"""
+        self.names.begin()
+        try:
+            with self.db.transaction() as cursor:
+                yield cursor
+        except BaseException:
+            # Ids of names inserted by a rolled-back transaction get reused; never cache them
+            self.names.end(committed=False)
+            raise
+        self.names.end(committed=True)
+    
+    def schema_is_current(self):
+        """True when the database is already at SCHEMA_VERSION (nothing for init_db to do)"""
+        return self.db.user_version() >= self.SCHEMA_VERSION
     
     def init_db(self):
-        """Initialize database schema"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                auto_detect_enabled INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Transactions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                merchant TEXT NOT NULL,
-                category TEXT NOT NULL,
-                date TEXT NOT NULL,
-                envelope_id INTEGER,
-                notes TEXT,
-                is_online_sale INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Envelopes table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS envelopes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                allocated REAL NOT NULL,
-                spent REAL DEFAULT 0,
-                is_pooled INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
-        
-        # Goals table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS goals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                name TEXT NOT NULL,
-                target REAL NOT NULL,
-                current REAL DEFAULT 0,
-                deadline TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        """Initialize database schema (a no-op once user_version is current)"""
+        if self.schema_is_current():
+            return
         
-        # Detected transactions table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS detected_transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                amount REAL NOT NULL,
-                merchant TEXT NOT NULL,
-                category TEXT NOT NULL,
-                date TEXT NOT NULL,
-                confidence TEXT NOT NULL,
-                is_online_sale INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        ''')
+        with self.write() as cursor:
+            # Users table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS users (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    username TEXT NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password_hash TEXT NOT NULL,
+                    auto_detect_enabled INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            
+            # Merchant and category dictionaries
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS merchants (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS categories (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT UNIQUE NOT NULL,
+                    sort_order INTEGER
+                )
+            ''')
+            cursor.executemany('INSERT OR IGNORE INTO categories (name, sort_order) VALUES (?, ?)',
+                               [(name, i) for i, name in enumerate(self.DEFAULT_CATEGORIES)])
+            
+            # Transactions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    amount_cents INTEGER NOT NULL,
+                    merchant_id INTEGER NOT NULL,
+                    category_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    day INTEGER,
+                    envelope_id INTEGER,
+                    notes TEXT,
+                    is_online_sale INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+            
+            # Envelopes table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS envelopes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    allocated_cents INTEGER NOT NULL,
+                    spent_cents INTEGER NOT NULL DEFAULT 0,
+                    is_pooled INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+            
+            # Per-user data versions (bumped by every write; see services.data_version)
+            data_version.init_table(cursor)
+            
+            # Goals table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS goals (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    target_cents INTEGER NOT NULL,
+                    current_cents INTEGER NOT NULL DEFAULT 0,
+                    deadline TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+            
+            # Detected transactions table
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS detected_transactions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    amount_cents INTEGER NOT NULL,
+                    merchant_id INTEGER NOT NULL,
+                    category_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    day INTEGER,
+                    confidence TEXT NOT NULL,
+                    is_online_sale INTEGER DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES users(id)
+                )
+            ''')
+            
+            # Backup snapshots
+            self.backups.init_tables(cursor)
         
-        conn.commit()
-        conn.close()
+        self._run_migrations()
+    
+    def _run_migrations(self):
+        """
+        Apply schema migrations newer than the database's user_version
+        Each migration and its user_version bump commit together in one
+        BEGIN IMMEDIATE transaction, so a crash never leaves a half-converted
+        table behind a version that says it is done.
+        """
+        for target_version, migration in self.MIGRATIONS:
+            with self.write() as cursor:
+                # Read under the write lock: another worker may have just applied it
+                cursor.execute('PRAGMA user_version')
+                if cursor.fetchone()[0] >= target_version:
+                    continue
+                getattr(self, migration)(cursor)
+                cursor.execute(f'PRAGMA user_version = {int(target_version)}')
+    
+    def _migrate_add_data_versions(self, cursor):
+        """Migration 4: per-user data versions (services.data_version)"""
+        data_version.init_table(cursor)
+    
+    def _migrate_add_click_windows(self, cursor):
+        """Migration 5: per-user hourly click buckets (services.link_tracker.init_click_windows)"""
+        init_click_windows(cursor)
+    
+    def _table_columns(self, cursor, table):
+        cursor.execute(f'PRAGMA table_info({table})')
+        return {row['name'] for row in cursor.fetchall()}
+    
+    def _migrate_money_to_cents(self, cursor):
+        """Migration 1: REAL money columns -> INTEGER minor units"""
+        for table, old_column, new_column in self.MONEY_COLUMNS:
+            columns = self._table_columns(cursor, table)
+            if old_column not in columns:
+                continue
+            if new_column not in columns:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {new_column} INTEGER NOT NULL DEFAULT 0')
+            cursor.execute(f'UPDATE {table} SET {new_column} = CAST(ROUND(COALESCE({old_column}, 0) * 100) AS INTEGER)')
+            cursor.execute(f'ALTER TABLE {table} DROP COLUMN {old_column}')
+    
+    def _migrate_add_epoch_day(self, cursor):
+        """Migration 2: integer day (days since 1970-01-01) alongside the ISO date"""
+        for table in self.DAY_TABLES:
+            if 'day' not in self._table_columns(cursor, table):
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN day INTEGER')
+            # julianday('1970-01-01') = 2440587.5
+            cursor.execute(f'''
+                UPDATE {table} SET day = CAST(julianday(substr(date, 1, 10)) - 2440587.5 AS INTEGER)
+                WHERE day IS NULL
+            ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_day ON transactions(user_id, day)')
+    
+    def _migrate_names_to_ids(self, cursor):
+        """Migration 3: merchant/category TEXT columns -> ids into the dictionary tables"""
+        for table in self.NAMED_TABLES:
+            columns = self._table_columns(cursor, table)
+            for column, dictionary in (('merchant', 'merchants'), ('category', 'categories')):
+                if column not in columns:
+                    continue
+                cursor.execute(f'''
+                    INSERT OR IGNORE INTO {dictionary} (name)
+                    SELECT DISTINCT TRIM(COALESCE({column}, '')) FROM {table}
+                ''')
+                if f'{column}_id' not in columns:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column}_id INTEGER NOT NULL DEFAULT 0')
+                cursor.execute(f'''
+                    UPDATE {table} SET {column}_id =
+                        (SELECT d.id FROM {dictionary} d WHERE d.name = TRIM(COALESCE({table}.{column}, '')))
+                ''')
+                cursor.execute(f'ALTER TABLE {table} DROP COLUMN {column}')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_merchant ON transactions(user_id, merchant_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user_category ON transactions(user_id, category_id)')
     
     def create_user(self, username, email, password, auto_detect=False):
-        """Create new user with hashed password"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Hash password
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        """Create new user with hashed password (raises AuthBusyError when hashing is saturated)"""
+        # Hash before opening the connection so no connection is held while queued
+        password_hash = self.auth.hash_password(password)
         
         try:
-            cursor.execute('''
-                INSERT INTO users (username, email, password_hash, auto_detect_enabled)
-                VALUES (?, ?, ?, ?)
-            ''', (username, email, password_hash, 1 if auto_detect else 0))
-            conn.commit()
-            user_id = cursor.lastrowid
-            
-            # Create user text file
-            user_file = self._get_user_file_path(user_id)
-            with open(user_file, 'w') as f:
-                f.write(f"# Transaction log for user {user_id}\n")
-            
-            conn.close()
-            return User(user_id, username, email, auto_detect)
+            with self.write() as cursor:
+                cursor.execute('''
+                    INSERT INTO users (username, email, password_hash, auto_detect_enabled)
+                    VALUES (?, ?, ?, ?)
+                ''', (username, email, password_hash, 1 if auto_detect else 0))
+                user_id = cursor.lastrowid
         except sqlite3.IntegrityError:
-            conn.close()
             return None
+        
+        # Create user transaction log
+        self.transaction_log.create(user_id)
+        
+        return User(user_id, username, email, auto_detect)
     
     def authenticate_user(self, email, password):
-        """Authenticate user credentials"""
+        """Authenticate user credentials (raises AuthBusyError when hashing is saturated)"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
+        # One statement, so the row and its data version come from the same snapshot
+        cursor.execute('''
+            SELECT u.*, COALESCE(v.version, 0) AS data_version
+            FROM users u LEFT JOIN data_versions v ON v.user_id = u.id
+            WHERE u.email = ?
+        ''', (email,))
         row = cursor.fetchone()
         conn.close()
         
-        if row and bcrypt.checkpw(password.encode('utf-8'), row['password_hash']):
-            return User(row['id'], row['username'], row['email'], row['auto_detect_enabled'])
+        if row and self.auth.check_password(password, row['password_hash']):
+            if self.auth.needs_rehash(row['password_hash']):
+                try:
+                    self._rehash_password(row['id'], password)
+                except AuthBusyError:
+                    pass   # keep the old hash; retried on the next login
+            user = User(row['id'], row['username'], row['email'], row['auto_detect_enabled'])
+            self.user_cache.put(user, row['data_version'])
+            return user
         return None
     
+    def _rehash_password(self, user_id, password):
+        """Re-hash a verified password at the configured bcrypt cost"""
+        password_hash = self.auth.hash_password(password)
+        with self.write() as cursor:
+            cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+    
     def get_user_by_id(self, user_id):
-        """Get user by ID"""
+        """Get user by ID (served from the user cache while the user's data version is unchanged)"""
+        version = self.get_data_version(user_id)[0]
+        user = self.user_cache.get(user_id, version)
+        if user is not None:
+            return user
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
+        cursor.execute('SELECT id, username, email, auto_detect_enabled FROM users WHERE id = ?', (user_id,))
         row = cursor.fetchone()
         conn.close()
         
         if row:
-            return User(row['id'], row['username'], row['email'], row['auto_detect_enabled'])
+            user = User(row['id'], row['username'], row['email'], row['auto_detect_enabled'])
+            self.user_cache.put(user, version)
+            return user
         return None
     
     def _get_user_file_path(self, user_id):
         """Get path to user's transaction log file"""
-        # Sanitize user_id to prevent path traversal
-        safe_user_id = str(int(user_id))
-        return os.path.join(self.user_data_path, f'{safe_user_id}.txt')
+        return self.transaction_log.path(user_id)
     
     def _append_to_user_file(self, user_id, transaction_data):
-        """Append transaction to user's text file"""
-        user_file = self._get_user_file_path(user_id)
-        
-        # Simple file locking
-        with self.lock:
-            with open(user_file, 'a') as f:
-                line = f"{transaction_data['date']} | {transaction_data['amount']} | {transaction_data['merchant']} | {transaction_data['category']} | {transaction_data.get('notes', '')}\n"
-                f.write(line)
+        """Append transaction record to user's log"""
+        self.transaction_log.append(user_id, transaction_data)
+    
+    def get_log_records(self, user_id, since=None):
+        """Iterate user's log records, optionally only those logged since a date"""
+        return self.transaction_log.read(user_id, since)
+    
+    def convert_legacy_logs(self):
+        """Convert legacy pipe-delimited .txt logs to the structured format"""
+        return self.transaction_log.convert_all_legacy()
+    
+    def warmup(self):
+        """Registry hook: convert any legacy user logs and load the name dictionaries"""
+        self.convert_legacy_logs()
+        self.names.warmup()
+    
+    def flush(self):
+        """Flush buffered user log writes"""
+        self.log_writer.flush()
     
+    def shutdown(self):
+        """Flush and close user log files and stop the hashing pool"""
+        self.log_writer.close()
+        self.auth.shutdown()
+    
+    @invalidates
     def add_transaction(self, user_id, amount, merchant, category, date, envelope_id=None, notes=''):
         """Add new transaction"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.write() as cursor:
+            row = self._insert_transaction(cursor, user_id, amount, merchant, category, date, envelope_id, notes)
         
+        self._transaction_added(user_id, row, date, merchant, category, notes)
+        return row['id']
+    
+    def _insert_transaction(self, cursor, user_id, amount, merchant, category, date, envelope_id=None, notes=''):
+        """Insert a transaction inside the caller's write transaction; returns its ledger row and data version"""
         # Detect if online sale
         is_online_sale = self._is_online_merchant(merchant)
+        amount_cents = to_cents(amount)
+        day = to_epoch_day(date)   # ValueError before anything is written; the ledger needs a day
+        merchant_id = self.names.merchants.get_id(cursor, merchant)
+        category_id = self.names.categories.get_id(cursor, category)
         
         cursor.execute('''
-            INSERT INTO transactions (user_id, amount, merchant, category, date, envelope_id, notes, is_online_sale)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, amount, merchant, category, date, envelope_id, notes, 1 if is_online_sale else 0))
+            INSERT INTO transactions (user_id, amount_cents, merchant_id, category_id, date, day, envelope_id, notes,
+                                      is_online_sale)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, amount_cents, merchant_id, category_id, date, day, envelope_id, notes,
+              1 if is_online_sale else 0))
         
         transaction_id = cursor.lastrowid
         
         # Update envelope if specified
         if envelope_id:
-            cursor.execute('UPDATE envelopes SET spent = spent + ? WHERE id = ?', (abs(amount), envelope_id))
-        
-        conn.commit()
-        conn.close()
+            cursor.execute('UPDATE envelopes SET spent_cents = spent_cents + ? WHERE id = ?',
+                           (abs(amount_cents), envelope_id))
+        
+        version = data_version.bump(cursor, user_id)
+        
+        return {
+            'id': transaction_id,
+            'amount_cents': amount_cents,
+            'day': day,
+            'merchant_id': merchant_id,
+            'category_id': category_id,
+            'envelope_id': envelope_id,
+            'version': version
+        }
+    
+    def _transaction_added(self, user_id, row, date, merchant, category, notes):
+        """After commit: update the cached ledger and append to the user's log"""
+        self.ledgers.on_insert(user_id, row, row['version'])
         
         # Append to user file
         self._append_to_user_file(user_id, {
+            'id': row['id'],
             'date': date,
-            'amount': amount,
+            'amount': to_major(row['amount_cents']),
             'merchant': merchant,
             'category': category,
             'notes': notes
         })
-        
-        return transaction_id
     
     def _is_online_merchant(self, merchant):
         """Detect if merchant is online"""
-        online_keywords = ['amazon', 'ebay', 'etsy', 'shopify', 'paypal', 'stripe', 'online', 'web']
         merchant_lower = merchant.lower()
-        return any(keyword in merchant_lower for keyword in online_keywords)
+        return any(keyword in merchant_lower for keyword in self.ONLINE_KEYWORDS)
     
+    @memoized
     def get_transactions(self, user_id, limit=None):
         """Get user transactions"""
         conn = self.get_connection()
-        cursor = conn.cursor()
+        rows = self._select_transactions(conn.cursor(), user_id, limit)
+        conn.close()
         
-        query = 'SELECT * FROM transactions WHERE user_id = ? ORDER BY date DESC'
+        return rows
+    
+    def _select_transactions(self, cursor, user_id, limit=None):
+        query = f'SELECT {self.TRANSACTION_FIELDS} FROM {self.TRANSACTIONS_FROM} WHERE t.user_id = ? ORDER BY t.date DESC'
         if limit:
-            query += f' LIMIT {limit}'
-        
-        cursor.execute(query, (user_id,))
+            query += ' LIMIT ?'
+            cursor.execute(query, (user_id, int(limit)))
+        else:
+            cursor.execute(query, (user_id,))
+        return list(map(RowAdapter, cursor.fetchall()))
+    
+    def get_dashboard(self, user_id, limit=10):
+        """Recent transactions, envelopes, goals and balance summary read in one snapshot"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            # One read transaction: every part sees the same committed state
+            cursor.execute('BEGIN')
+            return {
+                'transactions': self._select_transactions(cursor, user_id, limit),
+                'envelopes': self._select_envelopes(cursor, user_id),
+                'goals': self._select_goals(cursor, user_id),
+                'summary': self._select_balance_summary(cursor, user_id)
+            }
+        finally:
+            conn.rollback()
+            conn.close()
+    
+    @memoized
+    def get_data_version(self, user_id):
+        """(version, updated_at) of the user's data; changes on every write"""
+        conn = self.get_connection()
+        try:
+            return data_version.read(conn.cursor(), user_id)
+        finally:
+            conn.close()
+    
+    def get_ledger(self, user_id):
+        """
+        The user's cached columnar ledger (see services.ledger_cache)
+        Checked against the shared data version, so writes made by other
+        processes (workers, CLI commands) are never served stale.
+        """
+        return self.ledgers.get(user_id, self.get_data_version(user_id)[0])
+    
+    def _load_ledger(self, user_id):
+        """(data version, transaction rows) read in one snapshot for a ledger load"""
+        conn = self.get_connection()
+        try:
+            conn.execute('BEGIN')
+            version = data_version.read(conn.cursor(), user_id)[0]
+        except BaseException:
+            conn.close()
+            raise
+        return version, self._iter_ledger_rows(conn, user_id)
+    
+    def _iter_ledger_rows(self, conn, user_id, chunk_size=1000):
+        try:
+            # Legacy rows whose date never parsed (NULL day) cannot be placed on the timeline
+            cursor = conn.execute('''
+                SELECT id, amount_cents, day, merchant_id, category_id, envelope_id
+                FROM transactions WHERE user_id = ? AND day IS NOT NULL ORDER BY day, id
+            ''', (user_id,))
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.rollback()
+            conn.close()
+    
+    @memoized
+    def get_transaction_models(self, user_id):
+        """Get user transactions as slotted Transaction objects (dated by epoch day, no date text kept)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT {self.TRANSACTION_FIELDS} FROM {self.TRANSACTIONS_FROM} WHERE t.user_id = ? ORDER BY t.date DESC',
+                       (user_id,))
         rows = cursor.fetchall()
         conn.close()
         
-        return [dict(row) for row in rows]
+        return list(map(Transaction.from_row, rows))
     
+    @memoized
+    def get_balance_summary(self, user_id):
+        """Income, expenses and balance for a user, aggregated exactly in SQL (cents)"""
+        conn = self.get_connection()
+        summary = self._select_balance_summary(conn.cursor(), user_id)
+        conn.close()
+        
+        return summary
+    
+    def _select_balance_summary(self, cursor, user_id):
+        cursor.execute('''
+            SELECT
+                COALESCE(SUM(CASE WHEN amount_cents > 0 THEN amount_cents END), 0) AS income_cents,
+                COALESCE(SUM(CASE WHEN amount_cents < 0 THEN -amount_cents END), 0) AS expenses_cents
+            FROM transactions
+            WHERE user_id = ?
+        ''', (user_id,))
+        row = cursor.fetchone()
+        
+        income_cents = row['income_cents']
+        expenses_cents = row['expenses_cents']
+        return {
+            'income_cents': income_cents,
+            'expenses_cents': expenses_cents,
+            'balance_cents': income_cents - expenses_cents,
+            'income': to_major(income_cents),
+            'expenses': to_major(expenses_cents),
+            'balance': to_major(income_cents - expenses_cents)
+        }
+    
+    @invalidates
     def delete_transaction(self, transaction_id, user_id):
         """Delete transaction"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.write() as cursor:
+            cursor.execute('DELETE FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
+            data_version.bump(cursor, user_id)
         
-        cursor.execute('DELETE FROM transactions WHERE id = ? AND user_id = ?', (transaction_id, user_id))
-        conn.commit()
-        conn.close()
+        self.ledgers.invalidate(user_id)
     
+    @invalidates
     def create_envelope(self, user_id, name, allocated, is_pooled=False):
         """Create new envelope"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO envelopes (user_id, name, allocated, is_pooled)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, name, allocated, 1 if is_pooled else 0))
+        with self.write() as cursor:
+            cursor.execute('''
+                INSERT INTO envelopes (user_id, name, allocated_cents, is_pooled)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, name, to_cents(allocated), 1 if is_pooled else 0))
+            
+            version = data_version.bump(cursor, user_id)
         
-        conn.commit()
-        conn.close()
+        self.ledgers.advance(user_id, version)
     
+    @memoized
     def get_envelopes(self, user_id):
         """Get user envelopes"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM envelopes WHERE user_id = ?', (user_id,))
-        rows = cursor.fetchall()
+        rows = self._select_envelopes(conn.cursor(), user_id)
         conn.close()
         
-        return [dict(row) for row in rows]
+        return rows
+    
+    def _select_envelopes(self, cursor, user_id):
+        cursor.execute(f'SELECT {self.ENVELOPE_FIELDS} FROM envelopes WHERE user_id = ?', (user_id,))
+        return list(map(RowAdapter, cursor.fetchall()))
     
+    @invalidates
     def allocate_to_envelope(self, envelope_id, amount, user_id):
         """Allocate funds from balance to envelope"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('UPDATE envelopes SET allocated = allocated + ? WHERE id = ? AND user_id = ?', 
-                      (amount, envelope_id, user_id))
+        with self.write() as cursor:
+            cursor.execute('UPDATE envelopes SET allocated_cents = allocated_cents + ? WHERE id = ? AND user_id = ?',
+                          (to_cents(amount), envelope_id, user_id))
+            
+            version = data_version.bump(cursor, user_id)
         
-        conn.commit()
-        conn.close()
+        self.ledgers.advance(user_id, version)
     
+    @invalidates
     def transfer_envelope_funds(self, from_id, to_id, amount, user_id):
         """Transfer funds between envelopes"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        # Check if source envelope has sufficient funds
-        cursor.execute('SELECT allocated FROM envelopes WHERE id = ? AND user_id = ?', (from_id, user_id))
-        row = cursor.fetchone()
+        amount_cents = to_cents(amount)
         
-        if row and row['allocated'] >= amount:
-            cursor.execute('UPDATE envelopes SET allocated = allocated - ? WHERE id = ? AND user_id = ?', 
-                          (amount, from_id, user_id))
-            cursor.execute('UPDATE envelopes SET allocated = allocated + ? WHERE id = ? AND user_id = ?', 
-                          (amount, to_id, user_id))
-            conn.commit()
-        
-        conn.close()
+        version = None
+        with self.write() as cursor:
+            # Check if source envelope has sufficient funds
+            cursor.execute('SELECT allocated_cents FROM envelopes WHERE id = ? AND user_id = ?', (from_id, user_id))
+            row = cursor.fetchone()
+            
+            if row and row['allocated_cents'] >= amount_cents:
+                cursor.execute('UPDATE envelopes SET allocated_cents = allocated_cents - ? WHERE id = ? AND user_id = ?',
+                              (amount_cents, from_id, user_id))
+                cursor.execute('UPDATE envelopes SET allocated_cents = allocated_cents + ? WHERE id = ? AND user_id = ?',
+                              (amount_cents, to_id, user_id))
+                version = data_version.bump(cursor, user_id)
+        
+        if version:
+            self.ledgers.advance(user_id, version)
     
+    @invalidates
     def create_goal(self, user_id, name, target, current, deadline):
         """Create savings goal"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO goals (user_id, name, target, current, deadline)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, name, target, current, deadline))
+        with self.write() as cursor:
+            cursor.execute('''
+                INSERT INTO goals (user_id, name, target_cents, current_cents, deadline)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (user_id, name, to_cents(target), to_cents(current), deadline))
+            
+            version = data_version.bump(cursor, user_id)
         
-        conn.commit()
-        conn.close()
+        self.ledgers.advance(user_id, version)
     
+    @memoized
     def get_goals(self, user_id):
         """Get user goals"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM goals WHERE user_id = ?', (user_id,))
-        rows = cursor.fetchall()
+        rows = self._select_goals(conn.cursor(), user_id)
         conn.close()
         
-        return [dict(row) for row in rows]
+        return rows
+    
+    def _select_goals(self, cursor, user_id):
+        cursor.execute(f'SELECT {self.GOAL_FIELDS} FROM goals WHERE user_id = ?', (user_id,))
+        return list(map(RowAdapter, cursor.fetchall()))
     
+    @memoized
     def get_online_sales(self, user_id):
         """Get online sale transactions"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM transactions WHERE user_id = ? AND is_online_sale = 1 ORDER BY date DESC', 
-                      (user_id,))
+        cursor.execute(f'''
+            SELECT {self.TRANSACTION_FIELDS} FROM {self.TRANSACTIONS_FROM}
+            WHERE t.user_id = ? AND t.is_online_sale = 1 ORDER BY t.date DESC
+        ''', (user_id,))
         rows = cursor.fetchall()
         conn.close()
         
-        return [dict(row) for row in rows]
+        return list(map(RowAdapter, rows))
     
+    @invalidates
     def store_detected_transactions(self, user_id, detected):
         """Store detected transactions for review"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        for item in detected:
-            cursor.execute('''
-                INSERT INTO detected_transactions (user_id, amount, merchant, category, date, confidence, is_online_sale)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (user_id, item['amount'], item['merchant'], item['category'], 
-                  item['date'], item['confidence'], 1 if item.get('is_online_sale') else 0))
+        with self.write() as cursor:
+            merchants, categories = self.names.merchants, self.names.categories
+            for item in detected:
+                cursor.execute('''
+                    INSERT INTO detected_transactions
+                    (user_id, amount_cents, merchant_id, category_id, date, day, confidence, is_online_sale)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, to_cents(item['amount']), merchants.get_id(cursor, item['merchant']),
+                      categories.get_id(cursor, item['category']), item['date'], to_epoch_day(item['date']),
+                      item['confidence'], 1 if item.get('is_online_sale') else 0))
+            
+            version = data_version.bump(cursor, user_id)
         
-        conn.commit()
-        conn.close()
+        self.ledgers.advance(user_id, version)
     
+    @memoized
     def get_detected_transactions(self, user_id):
         """Get pending detected transactions"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM detected_transactions WHERE user_id = ? ORDER BY date DESC', (user_id,))
+        cursor.execute(f'''
+            SELECT {self.DETECTED_FIELDS} FROM {self.DETECTED_FROM} WHERE t.user_id = ? ORDER BY t.date DESC
+        ''', (user_id,))
         rows = cursor.fetchall()
         conn.close()
         
-        return [dict(row) for row in rows]
+        return list(map(RowAdapter, rows))
     
+    @invalidates
     def accept_detected_transaction(self, detected_id, user_id, tracking_id=None):
         """Accept and convert detected transaction to regular transaction"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM detected_transactions WHERE id = ? AND user_id = ?', 
-                      (detected_id, user_id))
-        row = cursor.fetchone()
-        
-        if row:
-            notes = f"Auto-detected ({row['confidence']} confidence)"
-            if tracking_id:
-                notes += f" | tracking_id={tracking_id}"
+        # Insert and delete in one write transaction so a detected row is never accepted twice
+        with self.write() as cursor:
+            cursor.execute(f'SELECT {self.DETECTED_FIELDS} FROM {self.DETECTED_FROM} WHERE t.id = ? AND t.user_id = ?',
+                          (detected_id, user_id))
+            row = cursor.fetchone()
             
-            self.add_transaction(user_id, row['amount'], row['merchant'], row['category'], 
-                               row['date'], notes=notes)
-            cursor.execute('DELETE FROM detected_transactions WHERE id = ?', (detected_id,))
-            conn.commit()
+            if row:
+                notes = f"Auto-detected ({row['confidence']} confidence)"
+                if tracking_id:
+                    notes += f" | tracking_id={tracking_id}"
+                
+                added = self._insert_transaction(cursor, user_id, Money(row['amount_cents']), row['merchant'],
+                                                 row['category'], row['date'], notes=notes)
+                cursor.execute('DELETE FROM detected_transactions WHERE id = ?', (detected_id,))
         
-        conn.close()
+        if row:
+            self._transaction_added(user_id, added, row['date'], row['merchant'], row['category'], notes)
     
+    @invalidates
     def create_detected_from_link(self, user_id, merchant, amount, tracking_id, confidence='Medium'):
         """Create a detected transaction from a tracking link"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
         # Use negative amount for purchases
         if amount and amount > 0:
             amount = -abs(amount)
         
-        cursor.execute('''
-            INSERT INTO detected_transactions 
-            (user_id, amount, merchant, category, date, confidence, is_online_sale)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (user_id, amount, merchant, 'Shopping', datetime.now().strftime('%Y-%m-%d'), 
-              confidence, 1))
-        
-        detected_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        today = datetime.now().date()
+        with self.write() as cursor:
+            cursor.execute('''
+                INSERT INTO detected_transactions 
+                (user_id, amount_cents, merchant_id, category_id, date, day, confidence, is_online_sale)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, to_cents(amount or 0), self.names.merchants.get_id(cursor, merchant),
+                  self.names.categories.get_id(cursor, 'Shopping'), today.isoformat(), to_epoch_day(today),
+                  confidence, 1))
+            
+            detected_id = cursor.lastrowid
+            version = data_version.bump(cursor, user_id)
+        
+        self.ledgers.advance(user_id, version)
         
         return detected_id
     
+    @invalidates
     def reject_detected_transaction(self, detected_id, user_id):
         """Reject detected transaction"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        with self.write() as cursor:
+            cursor.execute('DELETE FROM detected_transactions WHERE id = ? AND user_id = ?', 
+                          (detected_id, user_id))
+            version = data_version.bump(cursor, user_id)
         
-        cursor.execute('DELETE FROM detected_transactions WHERE id = ? AND user_id = ?', 
-                      (detected_id, user_id))
-        conn.commit()
-        conn.close()
+        self.ledgers.advance(user_id, version)
     
+    @memoized
     def get_categories(self):
-        """Get available categories"""
-        return ['Food & Dining', 'Shopping', 'Transportation', 'Bills & Utilities', 
-                'Entertainment', 'Healthcare', 'Travel', 'Income', 'Other']
-    
-    def update_user_settings(self, user_id, username, auto_detect):
-        """Update user settings"""
+        """Get available categories (seeded defaults first, then ones added by transactions)"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        
         cursor.execute('''
-            UPDATE users SET username = ?, auto_detect_enabled = ? WHERE id = ?
-        ''', (username, 1 if auto_detect else 0, user_id))
-        
-        conn.commit()
+            SELECT name FROM categories WHERE name != ''
+            ORDER BY sort_order IS NULL, sort_order, name
+        ''')
+        names = [row['name'] for row in cursor.fetchall()]
         conn.close()
+        return names
     
-    def export_to_csv(self, user_id):
-        """Export transactions to CSV"""
-        transactions = self.get_transactions(user_id)
-        
-        export_path = os.path.join(self.user_data_path, f'export_{user_id}_{datetime.now().strftime("%Y%m%d")}.csv')
-        
-        with open(export_path, 'w', newline='') as f:
-            if transactions:
-                writer = csv.DictWriter(f, fieldnames=transactions[0].keys())
-                writer.writeheader()
-                writer.writerows(transactions)
+    @invalidates
+    def update_user_settings(self, user_id, username, auto_detect):
+        """Update user settings"""
+        with self.write() as cursor:
+            cursor.execute('''
+                UPDATE users SET username = ?, auto_detect_enabled = ? WHERE id = ?
+            ''', (username, 1 if auto_detect else 0, user_id))
+            
+            version = data_version.bump(cursor, user_id)
         
-        return export_path
+        self.ledgers.advance(user_id, version)
+        self.user_cache.invalidate(user_id)
     
-    def create_encrypted_backup(self, user_id, passphrase):
-        """Create encrypted backup of user data"""
-        # Generate key from passphrase
-        key = base64.urlsafe_b64encode(hashlib.sha256(passphrase.encode()).digest())
-        fernet = Fernet(key)
-        
-        # Read user file
-        user_file = self._get_user_file_path(user_id)
-        with open(user_file, 'rb') as f:
-            data = f.read()
+    def iter_transactions_csv(self, user_id, start_date=None, end_date=None, columns=None, chunk_size=500):
+        """
+        Stream the user's transactions as CSV text chunks
+        Rows are pulled from a cursor chunk_size at a time, so nothing is
+        materialized in memory or written to disk.
+        """
+        columns = list(columns or self.DEFAULT_EXPORT_COLUMNS)
+        unknown = [c for c in columns if c not in self.EXPORT_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown export columns: {', '.join(unknown)}")
+        
+        select = ', '.join(self.EXPORT_COLUMNS[c] for c in columns)
+        query = f"SELECT {select} FROM {self.TRANSACTIONS_FROM} WHERE t.user_id = ?"
+        params = [user_id]
+        if start_date:
+            query += ' AND t.day >= ?'
+            params.append(to_epoch_day(start_date))
+        if end_date:
+            query += ' AND t.day <= ?'
+            params.append(to_epoch_day(end_date))
+        query += ' ORDER BY t.day DESC, t.id DESC'
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
         
-        # Encrypt
-        encrypted = fernet.encrypt(data)
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(query, params)
+            writer.writerow(columns)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.close()
+    
+    def iter_columnar_export(self, user_id, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        """Stream the user's transactions in the compact columnar format (byte blocks); legacy rows without a day are skipped"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(f'''
+                SELECT t.id, t.amount_cents, m.name AS merchant, c.name AS category, t.day, t.envelope_id,
+                       t.is_online_sale, t.notes
+                FROM {self.TRANSACTIONS_FROM} WHERE t.user_id = ? AND t.day IS NOT NULL ORDER BY t.day, t.id
+            ''', (user_id,))
+            
+            def rows():
+                while True:
+                    batch = cursor.fetchmany(row_group_size)
+                    if not batch:
+                        return
+                    for row in batch:
+                        yield {
+                            'id': row['id'],
+                            'amount_cents': row['amount_cents'],
+                            'day': row['day'],
+                            'merchant': row['merchant'],
+                            'category': row['category'],
+                            'envelope_id': row['envelope_id'],
+                            'is_online_sale': row['is_online_sale'],
+                            'notes': row['notes'],
+                        }
+            
+            yield from ColumnarWriter(row_group_size=row_group_size).iter_blocks(rows())
+        finally:
+            conn.close()
+    
+    def export_columnar(self, user_id, out, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        """Write the columnar export to a binary file object"""
+        for block in self.iter_columnar_export(user_id, row_group_size):
+            out.write(block)
+    
+    def create_encrypted_backup(self, user_id, passphrase, incremental=False):
+        """Create a streaming, chunk-encrypted backup of user data"""
+        kind = 'incr' if incremental else 'full'
+        backup_path = os.path.join(self.user_data_path,
+                                   f'backup_{int(user_id)}_{datetime.now().strftime("%Y%m%d%H%M%S")}_{kind}.enc')
         
-        # Save backup
-        backup_path = os.path.join(self.user_data_path, f'backup_{user_id}_{datetime.now().strftime("%Y%m%d")}.enc')
+        self.log_writer.flush(self._get_user_file_path(user_id))
         with open(backup_path, 'wb') as f:
-            f.write(encrypted)
+            self.backups.write_backup(user_id, passphrase, f, incremental=incremental)
         
         return backup_path
+    
+    @invalidates
+    def restore_encrypted_backup(self, user_id, passphrase, stream):
+        """Restore user data from a backup stream; returns restored row counts"""
+        return self.backups.restore_backup(user_id, passphrase, stream)
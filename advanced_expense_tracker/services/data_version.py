@@ -0,0 +1,51 @@
+"""
+Per-user data versions
+Every write to a user's data bumps a monotonic counter in the data_versions
+table inside the writing transaction. Pages and API responses derive their
+ETags from it, so an unchanged version means an unchanged response.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+def init_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+def bump(cursor, user_id):
+    """Advance user_id's version (call before committing the write); returns the new version"""
+    cursor.execute('''
+        INSERT INTO data_versions (user_id, version, updated_at) VALUES (?, 1, ?)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+    ''', (user_id, datetime.now(timezone.utc).isoformat(timespec='seconds')))
+    cursor.execute('SELECT version FROM data_versions WHERE user_id = ?', (user_id,))
+    return cursor.fetchone()[0]
+
+READ_SQL = 'SELECT version, updated_at FROM data_versions WHERE user_id = ?'
+
+def read(cursor, user_id):
+    """(version, updated_at as an aware UTC datetime) for user_id; (0, None) before the first write"""
+    cursor.execute(READ_SQL, (user_id,))
+    return from_row(cursor.fetchone())
+
+def from_row(row):
+    """(version, updated_at) from a READ_SQL row (or None)"""
+    if row is None:
+        return 0, None
+    return row[0], datetime.fromisoformat(row[1])
+
+def response_key(endpoint, full_path, user_id, version, cache_version):
+    """Cache/ETag key for a rendered response (also keyed by date: forecasts and offer expiries depend on it)"""
+    return (endpoint, full_path, user_id, version, datetime.now().date().isoformat(), cache_version)
+
+def etag(key):
+    return hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+def last_modified(updated_at):
+    """Last-Modified for a versioned response: the last write, but never before local midnight"""
+    midnight = datetime.combine(datetime.now().date(), datetime.min.time()).astimezone()
+    return max(updated_at, midnight) if updated_at else midnight
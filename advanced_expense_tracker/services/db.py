@@ -0,0 +1,137 @@
+"""
+SQLite connections shared safely by several worker processes
+The database runs in WAL mode, so readers never block the writer, and every
+connection waits up to a busy timeout for locks instead of failing at once.
+Write transactions start with BEGIN IMMEDIATE: the write lock is taken before
+anything is read, so two writers can no longer deadlock upgrading from a read
+("database is locked"). A write lock still held by another process after the
+busy timeout is retried a bounded number of times with exponential backoff
+and jitter before DatabaseBusyError is raised. Lock waits are counted per
+process.
+"""
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# An uncontended BEGIN IMMEDIATE takes microseconds; longer means we waited on another writer
+CONTENDED_AFTER = 0.001
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """Raised when the write lock could not be taken within the retry budget"""
+
+def is_lock_error(error):
+    """True for SQLITE_BUSY/SQLITE_LOCKED failures"""
+    return 'locked' in str(error) or 'busy' in str(error)
+
+class Database:
+    """Connection factory and write transactions for one SQLite file"""
+    
+    def __init__(self, path, wal=True, busy_timeout_ms=5000, write_retries=3, retry_backoff_ms=50,
+                 retry_backoff_max_ms=1000):
+        self.path = path
+        self.wal = wal
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff_ms / 1000
+        self.retry_backoff_max = retry_backoff_max_ms / 1000
+        self._journal_mode = None
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.contended = 0
+        self.retries = 0
+        self.failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+    
+    def connect(self):
+        """
+        New connection returning sqlite3.Row rows
+        Implicit transactions (a plain execute + commit) also begin IMMEDIATE.
+        """
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level='IMMEDIATE')
+        conn.row_factory = sqlite3.Row
+        if self._journal_mode is None:
+            self._set_journal_mode(conn)
+        return conn
+    
+    def _set_journal_mode(self, conn):
+        # journal_mode=WAL is persistent in the file; once per process is enough
+        if not self.wal:
+            self._journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+            return
+        try:
+            self._journal_mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e):
+                raise   # another process is switching it right now; check again on the next connect
+    
+    def user_version(self):
+        """The schema version recorded in the database file (PRAGMA user_version)"""
+        conn = self.connect()
+        try:
+            return conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Write transaction on a new connection, yielding its cursor
+        Commits when the block completes and rolls back if it raises.
+        """
+        conn = self.connect()
+        try:
+            self._begin(conn)
+            try:
+                yield conn.cursor()
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def _begin(self, conn):
+        """BEGIN IMMEDIATE, backing off and retrying while another writer keeps the lock"""
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                break
+            except sqlite3.OperationalError as e:
+                if not is_lock_error(e):
+                    raise
+                if attempt >= self.write_retries:
+                    self._record(time.perf_counter() - start, attempt, failed=True)
+                    raise DatabaseBusyError('The database is busy, please try again in a moment') from e
+                attempt += 1
+                time.sleep(self._backoff(attempt))
+        self._record(time.perf_counter() - start, attempt)
+    
+    def _backoff(self, attempt):
+        """Exponential delay for a retry, half fixed and half random so writers spread out"""
+        delay = min(self.retry_backoff_max, self.retry_backoff * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _record(self, waited, retries, failed=False):
+        with self._lock:
+            self.transactions += 1
+            self.retries += retries
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if waited >= CONTENDED_AFTER:
+                self.contended += 1
+            if failed:
+                self.failures += 1
+    
+    def stats(self):
+        """Write-lock counters for this process"""
+        with self._lock:
+            return {'journal_mode': self._journal_mode, 'busy_timeout_ms': self.busy_timeout_ms,
+                    'transactions': self.transactions, 'contended': self.contended,
+                    'retries': self.retries, 'failures': self.failures,
+                    'lock_wait_ms_total': round(self.wait_total * 1000, 1),
+                    'lock_wait_ms_max': round(self.wait_max * 1000, 1)}
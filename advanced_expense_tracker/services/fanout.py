@@ -0,0 +1,124 @@
+"""
+Request-scoped fan-out of independent reads
+A FanOut lives for one request. Tasks submitted under the same key run once;
+all of them start immediately on a shared FanOutPool, so a page waits roughly
+as long as its slowest read. Each task has a deadline measured from submit.
+
+A task that misses its deadline is cancelled if it has not started. One that
+is already running cannot be interrupted, so the pool counts it as abandoned
+until it finishes. While abandoned tasks hold max_abandoned workers, or every
+worker and queue slot is taken, the pool sheds new work instead of queueing
+it behind stuck tasks: optional panels get their default at once and required
+ones run on the request thread.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+class FanOutTimeout(Exception):
+    """Raised when a required task misses its deadline"""
+
+_MISSING = object()
+
+class FanOutPool:
+    """Shared fan-out workers that shed load instead of queueing behind abandoned tasks"""
+    
+    def __init__(self, workers=8, queue_depth=16, max_abandoned=None):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.max_abandoned = max(1, workers // 2) if max_abandoned is None else max_abandoned
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fanout')
+        self._lock = threading.Lock()
+        self._in_flight = 0   # submitted and not finished
+        self._abandoned = 0   # still running after their caller gave up
+        self.completed = 0
+        self.shed = 0
+        self.cancelled = 0
+        self.abandoned_total = 0
+    
+    def submit(self, fn, *args, **kwargs):
+        """Start fn on the pool; None when the pool is shedding load"""
+        with self._lock:
+            if self._abandoned >= self.max_abandoned or self._in_flight >= self.workers + self.queue_depth:
+                self.shed += 1
+                return None
+            self._in_flight += 1
+        future = self._pool.submit(fn, *args, **kwargs)
+        future.add_done_callback(self._finished)
+        return future
+    
+    def _finished(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            if future.cancelled():
+                self.cancelled += 1
+            else:
+                self.completed += 1
+    
+    def abandon(self, future):
+        """The caller stopped waiting for future: cancel it, or count it until it finishes"""
+        if future.cancel():
+            return
+        with self._lock:
+            if future.done():
+                return
+            self._abandoned += 1
+            self.abandoned_total += 1
+        future.add_done_callback(self._abandoned_finished)
+    
+    def _abandoned_finished(self, future):
+        with self._lock:
+            self._abandoned -= 1
+    
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'queue_depth': self.queue_depth, 'max_abandoned': self.max_abandoned,
+                    'in_flight': self._in_flight, 'abandoned': self._abandoned, 'completed': self.completed,
+                    'shed': self.shed, 'cancelled': self.cancelled, 'abandoned_total': self.abandoned_total}
+    
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+class FanOut:
+    """Deduplicating, deadline-bounded task group on a shared FanOutPool"""
+    
+    def __init__(self, pool, timeout=2.0):
+        self.pool = pool
+        self.timeout = timeout
+        self._tasks = {}   # key -> (future or None if shed, deadline, call)
+        self.timed_out = []
+    
+    def submit(self, key, fn, *args, **kwargs):
+        """Start fn(*args, **kwargs) unless a task with this key already exists"""
+        if key not in self._tasks:
+            self._tasks[key] = (self.pool.submit(fn, *args, **kwargs), time.monotonic() + self.timeout,
+                                (fn, args, kwargs))
+        return self._tasks[key][0]
+    
+    def result(self, key, default=_MISSING):
+        """
+        Wait for a task until its deadline
+        Task exceptions propagate. On timeout the task is abandoned and default
+        is returned, or FanOutTimeout raised when no default was given. A task
+        the pool shed returns default at once, or runs here if it is required.
+        """
+        future, deadline, (fn, args, kwargs) = self._tasks[key]
+        if future is None:
+            if default is _MISSING:
+                return fn(*args, **kwargs)
+            self.timed_out.append(key)
+            return default
+        try:
+            return future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            if key not in self.timed_out:
+                self.pool.abandon(future)
+                self.timed_out.append(key)
+            if default is _MISSING:
+                raise FanOutTimeout(f'{key} did not finish within {self.timeout}s')
+            return default
+    
+    @property
+    def partial(self):
+        """True when some result was replaced by its default"""
+        return bool(self.timed_out)
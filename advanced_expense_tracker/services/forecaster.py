@@ -5,17 +5,20 @@ No ML - uses historical patterns and recurring transactions
 from datetime import datetime, timedelta
 from collections import defaultdict
 
+from models.day import month_of_day, today_epoch_day
+
 class Forecaster:
     """Balance forecasting using rule-based analysis"""
     
-    def __init__(self, data_store):
+    def __init__(self, data_store, detector=None):
         self.data_store = data_store
+        self.detector = detector
     
     def forecast_balance(self, user_id, days=30):
         """Project balance over N days based on historical data"""
-        transactions = self.data_store.get_transactions(user_id)
+        ledger = self.data_store.get_ledger(user_id)
         
-        if not transactions:
+        if not len(ledger):
             return {
                 'current_balance': 0,
                 'projected_balance': 0,
@@ -23,16 +26,14 @@ class Forecaster:
                 'confidence': 'Low'
             }
         
-        # Calculate current balance
-        current_balance = sum(t['amount'] for t in transactions)
+        # Calculate current balance (exact, in cents)
+        current_balance = ledger.total_cents() / 100
         
         # Analyze spending patterns
-        daily_avg = self._calculate_daily_average(transactions)
+        daily_avg = self._calculate_daily_average(ledger)
         
         # Get recurring transactions
-        from services.auto_detect import AutoDetector
-        detector = AutoDetector(self.data_store)
-        recurring = detector.detect_recurring(user_id)
+        recurring = self._get_detector().detect_recurring(user_id)
         
         # Project daily balances
         daily_projections = []
@@ -55,7 +56,7 @@ class Forecaster:
             })
         
         # Calculate confidence based on data quality
-        confidence = self._calculate_forecast_confidence(transactions, recurring)
+        confidence = self._calculate_forecast_confidence(ledger, recurring)
         
         return {
             'current_balance': round(current_balance, 2),
@@ -65,43 +66,48 @@ class Forecaster:
             'confidence': confidence
         }
     
-    def _calculate_daily_average(self, transactions):
+    def _get_detector(self):
+        """Shared AutoDetector (created on first use when not injected)"""
+        if self.detector is None:
+            from services.auto_detect import AutoDetector
+            self.detector = AutoDetector(self.data_store)
+        return self.detector
+    
+    def _calculate_daily_average(self, ledger):
         """Calculate average daily spending"""
-        if not transactions:
-            return 0
-        
         # Filter expenses (negative amounts)
-        expenses = [t for t in transactions if t['amount'] < 0]
+        expenses = ledger.expense_indices()
         
         if not expenses:
             return 0
         
         # Get date range
-        dates = [datetime.fromisoformat(t['date']) for t in expenses]
-        date_range = (max(dates) - min(dates)).days or 1
+        days = [ledger.days[i] for i in expenses]
+        date_range = (max(days) - min(days)) or 1
         
-        total_spent = sum(abs(t['amount']) for t in expenses)
+        total_spent = -sum(ledger.amount_cents[i] for i in expenses) / 100
         return total_spent / date_range
     
-    def _calculate_forecast_confidence(self, transactions, recurring):
+    def _calculate_forecast_confidence(self, ledger, recurring):
         """Calculate confidence level for forecast"""
         score = 0
+        count = len(ledger)
         
         # More transactions = higher confidence
-        if len(transactions) > 50:
+        if count > 50:
             score += 40
-        elif len(transactions) > 20:
+        elif count > 20:
             score += 25
-        elif len(transactions) > 5:
+        elif count > 5:
             score += 10
         
         # Recurring patterns increase confidence
         score += min(len(recurring) * 10, 30)
         
         # Recent data increases confidence
-        recent = [t for t in transactions 
-                 if (datetime.now() - datetime.fromisoformat(t['date'])).days < 30]
-        if len(recent) > 10:
+        cutoff = today_epoch_day() - 30
+        recent = sum(1 for day in ledger.days if day > cutoff)
+        if recent > 10:
             score += 30
         
         if score >= 70:
@@ -113,21 +119,23 @@ class Forecaster:
     
     def analyze_spending_trends(self, user_id):
         """Analyze spending trends by category and merchant"""
-        transactions = self.data_store.get_transactions(user_id)
-        
-        # Group by category
-        category_totals = defaultdict(float)
-        merchant_totals = defaultdict(float)
-        monthly_totals = defaultdict(float)
-        
-        for t in transactions:
-            if t['amount'] < 0:  # Expenses only
-                category_totals[t['category']] += abs(t['amount'])
-                merchant_totals[t['merchant']] += abs(t['amount'])
+        ledger = self.data_store.get_ledger(user_id)
+        
+        # Group by category/merchant ids (totals accumulate in integer cents)
+        category_totals = defaultdict(int)
+        merchant_totals = defaultdict(int)
+        monthly_totals = defaultdict(int)
+        
+        amounts, days = ledger.amount_cents, ledger.days
+        category_ids, merchant_ids = ledger.category_ids, ledger.merchant_ids
+        for i in range(len(ledger)):
+            cents = amounts[i]
+            if cents < 0:  # Expenses only
+                category_totals[category_ids[i]] -= cents
+                merchant_totals[merchant_ids[i]] -= cents
                 
                 # Monthly grouping
-                month = datetime.fromisoformat(t['date']).strftime('%Y-%m')
-                monthly_totals[month] += abs(t['amount'])
+                monthly_totals[month_of_day(days[i])] -= cents
         
         # Top categories
         top_categories = sorted(category_totals.items(), key=lambda x: x[1], reverse=True)[:5]
@@ -138,10 +146,11 @@ class Forecaster:
         # Monthly trend
         monthly_trend = sorted(monthly_totals.items())
         
+        names = ledger.names
         return {
-            'top_categories': [{'name': k, 'amount': round(v, 2)} for k, v in top_categories],
-            'top_merchants': [{'name': k, 'amount': round(v, 2)} for k, v in top_merchants],
-            'monthly_trend': [{'month': k, 'amount': round(v, 2)} for k, v in monthly_trend]
+            'top_categories': [{'name': names.category_name(k), 'amount': v / 100} for k, v in top_categories],
+            'top_merchants': [{'name': names.merchant_name(k), 'amount': v / 100} for k, v in top_merchants],
+            'monthly_trend': [{'month': k, 'amount': v / 100} for k, v in monthly_trend]
         }
     
     def detect_budget_breach(self, user_id, envelope_id):
@@ -154,23 +163,24 @@ class Forecaster:
                 envelope = env
                 break
         
-        if not envelope or envelope['spent'] <= envelope['allocated']:
+        if not envelope or envelope['spent_cents'] <= envelope['allocated_cents']:
             return None
         
         # Get transactions for this envelope
-        transactions = [t for t in self.data_store.get_transactions(user_id) 
-                       if t.get('envelope_id') == envelope_id]
+        ledger = self.data_store.get_ledger(user_id)
+        indices = [i for i in range(len(ledger)) if ledger.envelope_ids[i] == envelope_id]
         
         # Analyze breach
-        overage = envelope['spent'] - envelope['allocated']
+        overage = (envelope['spent_cents'] - envelope['allocated_cents']) / 100
         
         # Find largest transactions
-        largest = sorted(transactions, key=lambda x: abs(x['amount']), reverse=True)[:3]
+        largest = [ledger.row(i) for i in
+                   sorted(indices, key=lambda i: abs(ledger.amount_cents[i]), reverse=True)[:3]]
         
         # Category breakdown
-        category_totals = defaultdict(float)
-        for t in transactions:
-            category_totals[t['category']] += abs(t['amount'])
+        category_totals = defaultdict(int)
+        for i in indices:
+            category_totals[ledger.category(i)] += abs(ledger.amount_cents[i])
         
         return {
             'envelope_name': envelope['name'],
@@ -181,7 +191,7 @@ class Forecaster:
                 for t in largest
             ],
             'category_breakdown': [
-                {'category': k, 'amount': round(v, 2)}
+                {'category': k, 'amount': v / 100}
                 for k, v in sorted(category_totals.items(), key=lambda x: x[1], reverse=True)
             ],
             'suggestion': self._generate_breach_suggestion(envelope, overage, category_totals)
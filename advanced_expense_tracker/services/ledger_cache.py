@@ -0,0 +1,208 @@
+"""
+Per-user in-memory ledger for analytics
+Each user's transactions are held column by column in typed arrays (amounts in
+cents, epoch days, merchant/category dictionary ids), loaded once from SQLite and
+kept current by DataStore writes. Each ledger records the user's data version
+it reflects; a reader asking for a newer version (another process wrote) gets
+a fresh load. Ledgers are evicted least recently used first once their
+combined size exceeds a memory budget.
+"""
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+
+from models.day import from_epoch_day
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024
+
+class Ledger:
+    """One user's transactions as parallel typed arrays"""
+    
+    __slots__ = ('user_id', 'names', 'version', 'ids', 'amount_cents', 'days', 'merchant_ids',
+                 'category_ids', 'envelope_ids')
+    
+    def __init__(self, user_id, names, version=0):
+        self.user_id = user_id
+        self.names = names   # services.names.NameDirectory resolving merchant/category ids
+        self.version = version   # services.data_version of the user's data these rows reflect
+        self.ids = array('q')
+        self.amount_cents = array('q')
+        self.days = array('i')
+        self.merchant_ids = array('i')
+        self.category_ids = array('i')
+        self.envelope_ids = array('q')   # 0 when the transaction has no envelope
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    def append(self, row):
+        """Add one transactions row (any mapping with the table's columns)"""
+        self.amount_cents.append(row['amount_cents'])
+        self.days.append(row['day'])
+        self.merchant_ids.append(row['merchant_id'])
+        self.category_ids.append(row['category_id'])
+        self.envelope_ids.append(row['envelope_id'] or 0)
+        # ids last: len(ledger) never counts a half-appended row
+        self.ids.append(row['id'])
+    
+    def nbytes(self):
+        """Approximate memory held by this ledger"""
+        return sum(sys.getsizeof(column) for column in (self.ids, self.amount_cents, self.days,
+                                                         self.merchant_ids, self.category_ids,
+                                                         self.envelope_ids))
+    
+    def merchant(self, i):
+        return self.names.merchant_name(self.merchant_ids[i])
+    
+    def category(self, i):
+        return self.names.category_name(self.category_ids[i])
+    
+    def total_cents(self):
+        return sum(self.amount_cents)
+    
+    def expense_indices(self):
+        """Indices of expenses (negative amounts)"""
+        return [i for i, cents in enumerate(self.amount_cents) if cents < 0]
+    
+    def group_by(self, key_ids, indices=None):
+        """{key id: [row indices]} for merchant_ids or category_ids"""
+        groups = {}
+        for i in (range(len(self.ids)) if indices is None else indices):
+            groups.setdefault(key_ids[i], []).append(i)
+        return groups
+    
+    def row(self, i):
+        """Materialize one transaction as a dict (date rebuilt from the epoch day)"""
+        cents = self.amount_cents[i]
+        return {
+            'id': self.ids[i],
+            'amount_cents': cents,
+            'amount': cents / 100,
+            'merchant': self.merchant(i),
+            'category': self.category(i),
+            'day': self.days[i],
+            'date': from_epoch_day(self.days[i]),
+            'envelope_id': self.envelope_ids[i] or None,
+        }
+    
+    def rows(self, indices=None):
+        """Materialized rows, lazily, in ledger order"""
+        return map(self.row, range(len(self.ids)) if indices is None else indices)
+    
+    def newest_first(self, indices=None):
+        """Row indices ordered by date, newest first"""
+        indices = range(len(self.ids)) if indices is None else indices
+        return sorted(indices, key=lambda i: (self.days[i], self.ids[i]), reverse=True)
+
+class LedgerCache:
+    """LRU of per-user ledgers bounded by an approximate memory budget"""
+    
+    def __init__(self, loader, names, memory_budget=DEFAULT_MEMORY_BUDGET):
+        self.loader = loader   # callable(user_id) -> (data version, transaction rows at that version)
+        self.names = names
+        self.memory_budget = memory_budget
+        self._ledgers = OrderedDict()
+        self._sizes = {}
+        self._loading = {}   # user_id -> Event set when the in-flight load finishes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+    
+    def get(self, user_id, version):
+        """
+        The user's ledger at data version `version` or later, loading it when
+        missing or behind (concurrent callers share one load)
+        """
+        while True:
+            with self._lock:
+                ledger = self._ledgers.get(user_id)
+                if ledger is not None and ledger.version >= version:
+                    self._ledgers.move_to_end(user_id)
+                    self.hits += 1
+                    return ledger
+                loading = self._loading.get(user_id)
+                if loading is None:
+                    if ledger is not None:
+                        # Written elsewhere since it was loaded
+                        self._drop(user_id)
+                        self.stale += 1
+                    self.misses += 1
+                    loading = self._loading[user_id] = threading.Event()
+                    break
+            # Another thread is loading this user; wait for it and look again
+            loading.wait()
+        
+        try:
+            loaded_version, rows = self.loader(user_id)
+            ledger = Ledger(user_id, self.names, loaded_version)
+            for row in rows:
+                ledger.append(row)
+            
+            with self._lock:
+                # A write applied while loading may already have cached a newer copy
+                cached = self._ledgers.get(user_id)
+                if cached is None or cached.version < ledger.version:
+                    self._ledgers[user_id] = ledger
+                    self._sizes[user_id] = ledger.nbytes()
+                    self._evict()
+            return ledger
+        finally:
+            with self._lock:
+                del self._loading[user_id]
+            loading.set()
+    
+    def _evict(self):
+        """Drop least recently used ledgers until within budget (caller holds _lock)"""
+        while len(self._ledgers) > 1 and sum(self._sizes.values()) > self.memory_budget:
+            user_id, _ = self._ledgers.popitem(last=False)
+            del self._sizes[user_id]
+    
+    def _drop(self, user_id):
+        self._ledgers.pop(user_id, None)
+        self._sizes.pop(user_id, None)
+    
+    def on_insert(self, user_id, row, version):
+        """Apply a transaction committed at data version `version` to a cached ledger"""
+        with self._lock:
+            ledger = self._ledgers.get(user_id)
+            if ledger is None:
+                return
+            if ledger.version == version - 1:
+                ledger.append(row)
+                ledger.version = version
+                self._sizes[user_id] = ledger.nbytes()
+                self._evict()
+            elif ledger.version < version:
+                # Some other write landed in between; reload on next use
+                self._drop(user_id)
+    
+    def advance(self, user_id, version):
+        """Note a write at data version `version` that left the user's transactions alone"""
+        with self._lock:
+            ledger = self._ledgers.get(user_id)
+            if ledger is not None and ledger.version == version - 1:
+                ledger.version = version
+    
+    def invalidate(self, user_id):
+        """Forget a user's ledger after deletes or bulk changes (restores)"""
+        with self._lock:
+            self._drop(user_id)
+    
+    def clear(self):
+        with self._lock:
+            self._ledgers.clear()
+            self._sizes.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._ledgers),
+                'bytes': sum(self._sizes.values()),
+                'budget': self.memory_budget,
+                'names': len(self.names.merchants) + len(self.names.categories),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale
+            }
@@ -2,11 +2,43 @@
 Link-based purchase tracking service
 Tracks clicks on shopping/offer links and creates detected transactions
 """
-import sqlite3
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from urllib.parse import urlparse
 
+from services.db import Database
+
+# Hours of per-user click buckets kept for sliding-window counts
+CLICK_WINDOW_HOURS = 7 * 24
+
+def init_click_windows(cursor):
+    """
+    Per-user hourly click buckets behind the sliding-window counts
+    Created by LinkTracker.init_tables or DataStore migration 5, whichever runs
+    first; whichever creates the table backfills it from the raw clicks still
+    inside the window.
+    """
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('link_click_windows', 'link_clicks')")
+    existing = {row[0] for row in cursor.fetchall()}
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS link_click_windows (
+            user_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            accepted INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, bucket)
+        )
+    ''')
+    if 'link_click_windows' not in existing and 'link_clicks' in existing:
+        cutoff = (datetime.now() - timedelta(hours=CLICK_WINDOW_HOURS)).strftime('%Y-%m-%d %H')
+        cursor.execute('''
+            INSERT INTO link_click_windows (user_id, bucket, clicks, accepted)
+            SELECT user_id, substr(datetime(timestamp), 1, 13), COUNT(*), SUM(accepted_flag)
+            FROM link_clicks
+            WHERE user_id IS NOT NULL AND substr(datetime(timestamp), 1, 13) >= ?
+            GROUP BY user_id, substr(datetime(timestamp), 1, 13)
+        ''', (cutoff,))
+
 class LinkTracker:
     """Manages tracking links and click recording"""
     
@@ -23,15 +55,46 @@ class LinkTracker:
         'nykaa.com'
     ]
     
-    def __init__(self, db_path):
+    # Merchants recognised when scoring link-detected transactions
+    KNOWN_MERCHANTS = (
+        'amazon', 'flipkart', 'myntra', 'swiggy', 'zomato',
+        'paytm', 'snapdeal', 'ajio', 'nykaa'
+    )
+    
+    # Compiled whitelist lookup (built once by compile_rules)
+    _safe_domain_set = None
+    
+    # Rollup granularity -> length of the timestamp prefix that identifies a bucket
+    # ('YYYY-MM-DD HH' for hourly, 'YYYY-MM-DD' for daily)
+    ROLLUP_GRANULARITIES = {
+        'hour': 13,
+        'day': 10
+    }
+    
+    def __init__(self, db_path, init_schema=None, db=None):
         self.db_path = db_path
-        self.init_tables()
+        self.db = db or Database(db_path)
+        if init_schema is None:
+            # Same rule as DataStore.init_db: DDL only while the schema is behind
+            from services.data_store import DataStore
+            init_schema = self.db.user_version() < DataStore.SCHEMA_VERSION
+        if init_schema:
+            self.init_tables()
+    
+    @classmethod
+    def compile_rules(cls):
+        """Precompile the safe-domain whitelist into a set"""
+        if cls._safe_domain_set is None:
+            cls._safe_domain_set = frozenset(cls.SAFE_DOMAINS)
+        return cls._safe_domain_set
+    
+    def warmup(self):
+        """Registry hook: compile the redirect whitelist before the first request"""
+        self.compile_rules()
     
     def get_connection(self):
         """Get database connection"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return self.db.connect()
     
     def init_tables(self):
         """Initialize tracking tables"""
@@ -70,9 +133,109 @@ class LinkTracker:
             )
         ''')
         
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_link_clicks_user ON link_clicks(user_id, timestamp)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_link_clicks_timestamp ON link_clicks(timestamp)')
+        
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'link_click_rollups'")
+        needs_backfill = cursor.fetchone() is None
+        
+        # Per-user click counters (maintained on insert/accept)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS link_click_counters (
+                user_id INTEGER PRIMARY KEY,
+                total_clicks INTEGER NOT NULL DEFAULT 0,
+                accepted_clicks INTEGER NOT NULL DEFAULT 0,
+                unique_items INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        
+        # Per-link click counters
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS link_item_counters (
+                tracking_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                clicks INTEGER NOT NULL DEFAULT 0,
+                accepted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (tracking_id, user_id)
+            )
+        ''')
+        
+        # Hourly/daily click rollups per merchant
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS link_click_rollups (
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                merchant TEXT NOT NULL,
+                clicks INTEGER NOT NULL DEFAULT 0,
+                accepted INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (granularity, bucket, merchant)
+            )
+        ''')
+        
+        if needs_backfill:
+            self._backfill_rollups(cursor)
+        
+        init_click_windows(cursor)
+        
         conn.commit()
         conn.close()
     
+    def _backfill_rollups(self, cursor):
+        """Build counters and rollups from existing raw click rows"""
+        cursor.execute('''
+            INSERT OR REPLACE INTO link_item_counters (tracking_id, user_id, clicks, accepted)
+            SELECT tracking_id, user_id, COUNT(*), SUM(accepted_flag)
+            FROM link_clicks
+            WHERE user_id IS NOT NULL
+            GROUP BY tracking_id, user_id
+        ''')
+        cursor.execute('''
+            INSERT OR REPLACE INTO link_click_counters (user_id, total_clicks, accepted_clicks, unique_items)
+            SELECT user_id, SUM(clicks), SUM(accepted), COUNT(*)
+            FROM link_item_counters
+            GROUP BY user_id
+        ''')
+        for granularity, length in self.ROLLUP_GRANULARITIES.items():
+            cursor.execute('''
+                INSERT OR REPLACE INTO link_click_rollups (granularity, bucket, merchant, clicks, accepted)
+                SELECT ?, substr(datetime(lc.timestamp), 1, ?), lt.merchant, COUNT(*), SUM(lc.accepted_flag)
+                FROM link_clicks lc
+                JOIN link_tracking lt ON lc.tracking_id = lt.tracking_id
+                GROUP BY substr(datetime(lc.timestamp), 1, ?), lt.merchant
+            ''', (granularity, length, length))
+    
+    @staticmethod
+    def _timestamp(value):
+        """Click time as 'YYYY-MM-DD HH:MM:SS', the form buckets and compaction compare on"""
+        if not isinstance(value, datetime):
+            value = datetime.fromisoformat(str(value))
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    
+    def _bucket(self, timestamp, granularity):
+        """Truncate a click timestamp to its rollup bucket"""
+        return self._timestamp(timestamp)[:self.ROLLUP_GRANULARITIES[granularity]]
+    
+    def _bump_rollups(self, cursor, merchant, timestamp, clicks, accepted):
+        """Add click/accept counts to every rollup bucket of a timestamp"""
+        for granularity in self.ROLLUP_GRANULARITIES:
+            cursor.execute('''
+                INSERT INTO link_click_rollups (granularity, bucket, merchant, clicks, accepted)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (granularity, bucket, merchant)
+                DO UPDATE SET clicks = clicks + excluded.clicks, accepted = accepted + excluded.accepted
+            ''', (granularity, self._bucket(timestamp, granularity), merchant, clicks, accepted))
+    
+    def _bump_window(self, cursor, user_id, timestamp, clicks, accepted):
+        """Add click/accept counts to the user's hourly window bucket for a timestamp"""
+        if user_id is None:
+            return
+        cursor.execute('''
+            INSERT INTO link_click_windows (user_id, bucket, clicks, accepted)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id, bucket)
+            DO UPDATE SET clicks = clicks + excluded.clicks, accepted = accepted + excluded.accepted
+        ''', (user_id, self._bucket(timestamp, 'hour'), clicks, accepted))
+    
     def create_tracking_link(self, user_id, merchant, title, amount, target_url, offer_id=None):
         """
         Create a new tracking link
@@ -80,34 +243,47 @@ class LinkTracker:
         """
         tracking_id = str(uuid.uuid4())
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO link_tracking 
-            (tracking_id, merchant, title, amount, target_url, offer_id, created_by_user)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (tracking_id, merchant, title, amount, target_url, offer_id, user_id))
-        
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO link_tracking 
+                (tracking_id, merchant, title, amount, target_url, offer_id, created_by_user)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (tracking_id, merchant, title, amount, target_url, offer_id, user_id))
         
         tracking_url = f'/track/{tracking_id}'
         return tracking_id, tracking_url
     
     def record_click(self, tracking_id, user_id, ip, user_agent, referer, timestamp, extra_meta=''):
         """Record a click on a tracking link"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO link_clicks 
-            (tracking_id, user_id, ip, user_agent, referer, timestamp, extra_meta)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (tracking_id, user_id, ip, user_agent, referer, timestamp, extra_meta))
-        
-        conn.commit()
-        conn.close()
+        timestamp = self._timestamp(timestamp)
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO link_clicks 
+                (tracking_id, user_id, ip, user_agent, referer, timestamp, extra_meta)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (tracking_id, user_id, ip, user_agent, referer, timestamp, extra_meta))
+            
+            # Maintain per-link and per-user counters
+            cursor.execute('''
+                INSERT OR IGNORE INTO link_item_counters (tracking_id, user_id) VALUES (?, ?)
+            ''', (tracking_id, user_id))
+            is_new_item = cursor.rowcount == 1
+            cursor.execute('''
+                UPDATE link_item_counters SET clicks = clicks + 1 WHERE tracking_id = ? AND user_id = ?
+            ''', (tracking_id, user_id))
+            cursor.execute('''
+                INSERT INTO link_click_counters (user_id, total_clicks, unique_items)
+                VALUES (?, 1, ?)
+                ON CONFLICT (user_id)
+                DO UPDATE SET total_clicks = total_clicks + 1, unique_items = unique_items + excluded.unique_items
+            ''', (user_id, 1 if is_new_item else 0))
+            self._bump_window(cursor, user_id, timestamp, 1, 0)
+            
+            # Maintain merchant rollups
+            cursor.execute('SELECT merchant FROM link_tracking WHERE tracking_id = ?', (tracking_id,))
+            row = cursor.fetchone()
+            if row:
+                self._bump_rollups(cursor, row['merchant'], timestamp, 1, 0)
     
     def get_tracked_item(self, tracking_id):
         """Retrieve tracking metadata"""
@@ -127,17 +303,48 @@ class LinkTracker:
     
     def mark_click_accepted(self, tracking_id, user_id):
         """Mark a click as accepted (transaction created)"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE link_clicks 
-            SET accepted_flag = 1 
-            WHERE tracking_id = ? AND user_id = ?
-        ''', (tracking_id, user_id))
-        
-        conn.commit()
-        conn.close()
+        with self.db.transaction() as cursor:
+            # Collect the clicks that are about to flip so rollups land in the right buckets
+            cursor.execute('''
+                SELECT lc.timestamp, lt.merchant
+                FROM link_clicks lc
+                JOIN link_tracking lt ON lc.tracking_id = lt.tracking_id
+                WHERE lc.tracking_id = ? AND lc.user_id = ? AND lc.accepted_flag = 0
+            ''', (tracking_id, user_id))
+            newly_accepted = cursor.fetchall()
+            
+            cursor.execute('''
+                UPDATE link_clicks 
+                SET accepted_flag = 1 
+                WHERE tracking_id = ? AND user_id = ? AND accepted_flag = 0
+            ''', (tracking_id, user_id))
+            
+            # Pending clicks per the counters; raw rows for some may already be compacted away
+            cursor.execute('''
+                SELECT lic.clicks - lic.accepted AS pending, lt.merchant
+                FROM link_item_counters lic
+                JOIN link_tracking lt ON lic.tracking_id = lt.tracking_id
+                WHERE lic.tracking_id = ? AND lic.user_id = ?
+            ''', (tracking_id, user_id))
+            item = cursor.fetchone()
+            compacted = max(0, item['pending'] - len(newly_accepted)) if item else 0
+            
+            count = len(newly_accepted) + compacted
+            if count:
+                cursor.execute('''
+                    UPDATE link_item_counters SET accepted = accepted + ? WHERE tracking_id = ? AND user_id = ?
+                ''', (count, tracking_id, user_id))
+                cursor.execute('''
+                    UPDATE link_click_counters SET accepted_clicks = accepted_clicks + ? WHERE user_id = ?
+                ''', (count, user_id))
+                for row in newly_accepted:
+                    self._bump_rollups(cursor, row['merchant'], row['timestamp'], 0, 1)
+                    self._bump_window(cursor, user_id, row['timestamp'], 0, 1)
+                if compacted:
+                    # Their click times are gone; count the accepts in the current bucket
+                    now = datetime.now()
+                    self._bump_rollups(cursor, item['merchant'], now, 0, compacted)
+                    self._bump_window(cursor, user_id, now, 0, compacted)
     
     def get_user_clicks(self, user_id, limit=50):
         """Get recent clicks for a user"""
@@ -177,12 +384,10 @@ class LinkTracker:
             if hostname.startswith('www.'):
                 hostname = hostname[4:]
             
-            # Check against whitelist
-            for safe_domain in self.SAFE_DOMAINS:
-                if hostname == safe_domain or hostname.endswith('.' + safe_domain):
-                    return True
-            
-            return False
+            # Check the host and each parent domain against the whitelist
+            safe_domains = self.compile_rules()
+            labels = hostname.split('.')
+            return any('.'.join(labels[i:]) in safe_domains for i in range(len(labels)))
         except:
             return False
     
@@ -193,13 +398,8 @@ class LinkTracker:
         Medium: Known merchant OR amount present
         Low: Neither
         """
-        known_merchants = [
-            'amazon', 'flipkart', 'myntra', 'swiggy', 'zomato', 
-            'paytm', 'snapdeal', 'ajio', 'nykaa'
-        ]
-        
         merchant_lower = merchant.lower()
-        is_known = any(km in merchant_lower for km in known_merchants)
+        is_known = any(km in merchant_lower for km in self.KNOWN_MERCHANTS)
         has_amount = amount is not None and amount > 0
         
         if is_known and has_amount:
@@ -215,11 +415,8 @@ class LinkTracker:
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT 
-                COUNT(*) as total_clicks,
-                SUM(accepted_flag) as accepted_clicks,
-                COUNT(DISTINCT tracking_id) as unique_items
-            FROM link_clicks
+            SELECT total_clicks, accepted_clicks, unique_items
+            FROM link_click_counters
             WHERE user_id = ?
         ''', (user_id,))
         
@@ -229,3 +426,98 @@ class LinkTracker:
         if row:
             return dict(row)
         return {'total_clicks': 0, 'accepted_clicks': 0, 'unique_items': 0}
+    
+    def get_recent_click_stats(self, user_id, hours=24):
+        """
+        Clicks and accepts in a sliding window of the last `hours` hours
+        Summed from the user's hourly buckets (the current hour counts as the
+        first), so the raw click table is never scanned.
+        """
+        if not 1 <= hours <= CLICK_WINDOW_HOURS:
+            raise ValueError(f'Click windows cover 1 to {CLICK_WINDOW_HOURS} hours')
+        start = self._bucket(datetime.now() - timedelta(hours=hours - 1), 'hour')
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COALESCE(SUM(clicks), 0) AS clicks, COALESCE(SUM(accepted), 0) AS accepted
+            FROM link_click_windows
+            WHERE user_id = ? AND bucket >= ?
+        ''', (user_id, start))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return dict(row)
+    
+    def get_item_stats(self, tracking_id, user_id):
+        """Get click statistics for a single tracking link"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT clicks, accepted FROM link_item_counters
+            WHERE tracking_id = ? AND user_id = ?
+        ''', (tracking_id, user_id))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row:
+            return dict(row)
+        return {'clicks': 0, 'accepted': 0}
+    
+    def get_merchant_conversion(self, granularity='day', since=None, merchant=None):
+        """
+        Get click/accept rollups per merchant and time bucket
+        Returns rows ordered by bucket with a conversion rate (accepted / clicks)
+        """
+        if granularity not in self.ROLLUP_GRANULARITIES:
+            raise ValueError(f'Unknown rollup granularity: {granularity}')
+        
+        query = '''
+            SELECT bucket, merchant, clicks, accepted
+            FROM link_click_rollups
+            WHERE granularity = ?
+        '''
+        params = [granularity]
+        if since:
+            query += ' AND bucket >= ?'
+            params.append(self._bucket(since, granularity))
+        if merchant:
+            query += ' AND merchant = ?'
+            params.append(merchant)
+        query += ' ORDER BY bucket, merchant'
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        results = []
+        for row in rows:
+            item = dict(row)
+            item['conversion_rate'] = round(item['accepted'] / item['clicks'], 4) if item['clicks'] else 0
+            results.append(item)
+        return results
+    
+    def compact_clicks(self, retention_days=90):
+        """
+        Retention job: drop raw click rows older than N days
+        Counters and rollups are maintained on insert/accept, so compacted
+        clicks stay represented in stats and merchant reports. Hourly window
+        buckets older than CLICK_WINDOW_HOURS are pruned as well.
+        Returns the number of raw rows removed.
+        """
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        
+        with self.db.transaction() as cursor:
+            # julianday() also normalizes rows stored before timestamps were (e.g. '...T...' or fractional seconds)
+            cursor.execute('DELETE FROM link_clicks WHERE julianday(timestamp) < julianday(?)',
+                           (self._timestamp(cutoff),))
+            removed = cursor.rowcount
+            # Window buckets only need to reach back as far as the longest window
+            cursor.execute('DELETE FROM link_click_windows WHERE bucket < ?',
+                           (self._bucket(datetime.now() - timedelta(hours=CLICK_WINDOW_HOURS), 'hour'),))
+        
+        return removed
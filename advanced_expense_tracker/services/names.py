@@ -0,0 +1,124 @@
+"""
+Merchant and category name dictionaries
+Names are stored once in the merchants/categories tables and referenced by
+integer id. A process-wide cache maps ids <-> names per database so hot paths
+never query the dictionary tables twice for the same name. A name inserted by
+a write transaction is only cached once that transaction commits; a rolled
+back insert frees its id for reuse.
+"""
+import threading
+
+class NameTable:
+    """Cached id <-> name mapping for one dictionary table (merchants or categories)"""
+    
+    def __init__(self, table, local=None):
+        self.table = table
+        self._ids = {}
+        self._names = {}
+        self._lock = threading.Lock()
+        self._local = local or threading.local()   # .pending: names inserted by this thread's open write
+    
+    def _remember(self, name_id, name):
+        self._ids[name] = name_id
+        self._names[name_id] = name
+    
+    def remember(self, name_id, name):
+        """Cache a committed id/name pair"""
+        with self._lock:
+            self._remember(name_id, name)
+    
+    def get_id(self, cursor, name):
+        """Id for name, inserting it into the table on first use (within cursor's transaction)"""
+        name = (name or '').strip()
+        name_id = self._ids.get(name)
+        if name_id is not None:
+            return name_id
+        pending = getattr(self._local, 'pending', None)
+        if pending is not None and (self, name) in pending:
+            return pending[self, name]
+        
+        cursor.execute(f'INSERT OR IGNORE INTO {self.table} (name) VALUES (?)', (name,))
+        inserted = cursor.rowcount > 0
+        cursor.execute(f'SELECT id FROM {self.table} WHERE name = ?', (name,))
+        name_id = cursor.fetchone()[0]
+        if inserted:
+            # Uncommitted: cached by NameDirectory.end once the write commits (never outside one)
+            if pending is not None:
+                pending[self, name] = name_id
+            return name_id
+        self.remember(name_id, name)
+        return name_id
+    
+    def name(self, name_id, conn_factory=None):
+        """Name for an id; loads the table through conn_factory on a miss"""
+        name = self._names.get(name_id)
+        if name is None and conn_factory is not None:
+            self.load(conn_factory)
+            name = self._names.get(name_id)
+        return name
+    
+    def load(self, conn_factory):
+        """(Re)load every id/name pair from the database"""
+        conn = conn_factory()
+        try:
+            rows = conn.execute(f'SELECT id, name FROM {self.table}').fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for name_id, name in rows:
+                self._remember(name_id, name)
+    
+    def clear(self):
+        """Forget cached ids"""
+        with self._lock:
+            self._ids.clear()
+            self._names.clear()
+    
+    def __len__(self):
+        return len(self._names)
+
+class NameDirectory:
+    """The merchant and category tables of one database"""
+    
+    def __init__(self, conn_factory):
+        self.conn_factory = conn_factory
+        self._local = threading.local()
+        self.merchants = NameTable('merchants', self._local)
+        self.categories = NameTable('categories', self._local)
+    
+    def merchant_name(self, merchant_id):
+        return self.merchants.name(merchant_id, self.conn_factory)
+    
+    def category_name(self, category_id):
+        return self.categories.name(category_id, self.conn_factory)
+    
+    def begin(self):
+        """Start collecting the names inserted by this thread's write transaction"""
+        self._local.pending = {}
+    
+    def end(self, committed):
+        """Cache the names the write inserted once it has committed; forget them if it rolled back"""
+        pending = self._local.__dict__.pop('pending', None)
+        if committed and pending:
+            for (table, name), name_id in pending.items():
+                table.remember(name_id, name)
+    
+    def warmup(self):
+        self.merchants.load(self.conn_factory)
+        self.categories.load(self.conn_factory)
+    
+    def clear(self):
+        self.merchants.clear()
+        self.categories.clear()
+
+# One directory per database file, shared by every DataStore in the process
+_directories = {}
+_directories_lock = threading.Lock()
+
+def get_directory(db_path, conn_factory):
+    """Process-wide NameDirectory for db_path"""
+    with _directories_lock:
+        directory = _directories.get(db_path)
+        if directory is None:
+            directory = _directories[db_path] = NameDirectory(conn_factory)
+        return directory
@@ -3,8 +3,15 @@ Offers management system for discounts and promotions
 """
 import json
 import os
+import re
+from collections import defaultdict
 from datetime import datetime
 
+from models.day import month_of_day
+from services import data_version
+from services.db import Database
+from services.request_memo import invalidates
+
 class OffersManager:
     """Manage discount offers and promotions"""
     
@@ -72,80 +79,134 @@ class OffersManager:
         }
     }
     
-    def __init__(self, offers_file='data/offers.json'):
+    def __init__(self, db_path, offers_file='data/offers.json', init_schema=True, db=None):
+        self.db_path = db_path
+        self.db = db or Database(db_path)
         self.offers_file = offers_file
-        self._ensure_file_exists()
+        if init_schema:
+            self.init_tables()
+        self.migrate_from_json()
+    
+    def get_connection(self):
+        """Get database connection"""
+        return self.db.connect()
+    
+    def init_tables(self):
+        """Initialize offers table"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS offers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                merchant TEXT NOT NULL,
+                discount REAL NOT NULL,
+                description TEXT,
+                expiry TEXT,
+                created_at TEXT NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_offers_user_expiry ON offers(user_id, expiry)')
+        data_version.init_table(cursor)
+        
+        conn.commit()
+        conn.close()
     
-    def _ensure_file_exists(self):
-        """Create offers file if it doesn't exist"""
-        os.makedirs(os.path.dirname(self.offers_file), exist_ok=True)
-        if not os.path.exists(self.offers_file):
-            with open(self.offers_file, 'w') as f:
-                json.dump([], f)
+    def migrate_from_json(self):
+        """
+        One-shot migration of the legacy offers.json file into the offers table
+        The file is first claimed by renaming it, so when several processes start
+        at once only one imports it; it ends up as *.migrated so it is never
+        imported twice, or back in place if the import fails.
+        Returns the number of offers migrated.
+        """
+        if not self.offers_file:
+            return 0
+        claimed = f'{self.offers_file}.{os.getpid()}.migrating'
+        try:
+            os.replace(self.offers_file, claimed)
+        except FileNotFoundError:
+            return 0
+        
+        try:
+            with open(claimed, 'r') as f:
+                try:
+                    legacy_offers = json.load(f)
+                except ValueError:
+                    legacy_offers = []
+            
+            with self.db.transaction() as cursor:
+                for offer in legacy_offers:
+                    cursor.execute('''
+                        INSERT INTO offers (user_id, merchant, discount, description, expiry, created_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (offer['user_id'], offer['merchant'], offer['discount'], offer.get('description'),
+                          offer.get('expiry') or None, offer.get('created_at') or datetime.now().isoformat()))
+                for user_id in {offer['user_id'] for offer in legacy_offers}:
+                    data_version.bump(cursor, user_id)
+        except BaseException:
+            os.replace(claimed, self.offers_file)
+            raise
+        
+        os.replace(claimed, self.offers_file + '.migrated')
+        return len(legacy_offers)
     
     def get_offers(self, user_id):
-        """Get all offers for user"""
-        with open(self.offers_file, 'r') as f:
-            all_offers = json.load(f)
+        """Get all active (unexpired) offers for user"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        # Filter by user and check expiry
-        active_offers = []
-        for offer in all_offers:
-            if offer['user_id'] == user_id:
-                if not offer.get('expiry') or datetime.fromisoformat(offer['expiry']) > datetime.now():
-                    active_offers.append(offer)
+        cursor.execute('''
+            SELECT * FROM offers
+            WHERE user_id = ? AND (expiry IS NULL OR expiry > ?)
+            ORDER BY id
+        ''', (user_id, datetime.now().isoformat()))
+        rows = cursor.fetchall()
+        conn.close()
         
-        return active_offers
+        return [dict(row) for row in rows]
     
+    @invalidates
     def add_offer(self, user_id, merchant, discount, description, expiry=None):
         """Add new offer"""
-        with open(self.offers_file, 'r') as f:
-            offers = json.load(f)
-        
         new_offer = {
-            'id': len(offers) + 1,
             'user_id': user_id,
             'merchant': merchant,
             'discount': discount,
             'description': description,
-            'expiry': expiry,
+            'expiry': expiry or None,
             'created_at': datetime.now().isoformat()
         }
         
-        offers.append(new_offer)
-        
-        with open(self.offers_file, 'w') as f:
-            json.dump(offers, f, indent=2)
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO offers (user_id, merchant, discount, description, expiry, created_at)
+                VALUES (:user_id, :merchant, :discount, :description, :expiry, :created_at)
+            ''', new_offer)
+            new_offer['id'] = cursor.lastrowid
+            data_version.bump(cursor, user_id)
         
         return new_offer
     
     def apply_offer_to_transaction(self, transaction, offers):
         """Apply matching offer to transaction"""
-        merchant = transaction['merchant'].lower()
-        
-        for offer in offers:
-            if offer['merchant'].lower() in merchant:
-                discount_amount = transaction['amount'] * (offer['discount'] / 100)
-                return {
-                    'original_amount': transaction['amount'],
-                    'discount': discount_amount,
-                    'final_amount': transaction['amount'] - discount_amount,
-                    'offer_description': offer['description']
-                }
-        
-        return None
+        return OfferMatcher(offers).apply(transaction)
+    
+    def get_matcher(self, user_id):
+        """Compile the user's active offers into a matcher (build once per request)"""
+        return OfferMatcher(self.get_offers(user_id))
     
     def get_potential_savings(self, user_id, transactions):
         """Calculate potential savings from available offers"""
-        offers = self.get_offers(user_id)
-        total_savings = 0
-        
-        for transaction in transactions:
-            result = self.apply_offer_to_transaction(transaction, offers)
-            if result:
-                total_savings += result['discount']
-        
-        return round(total_savings, 2)
+        return self.get_matcher(user_id).summarize(transactions)['total']
+    
+    def get_savings_report(self, user_id, transactions, top=5):
+        """Potential savings in total, per month and per merchant"""
+        report = self.get_matcher(user_id).summarize(transactions)
+        report['by_merchant'] = report['by_merchant'][:top]
+        return report
     
     def get_live_offers(self):
         """Get live offers from popular shopping sites"""
@@ -160,3 +221,75 @@ class OffersManager:
                 return site_name, site_info
         
         return None, None
+
+
+class OfferMatcher:
+    """
+    Matches transactions to offers in a single pass
+    Offer merchants are compiled into one alternation regex that rejects
+    non-matching merchants in a single scan; the winning offer (first in offer
+    order, as before) is resolved once per distinct merchant and memoized.
+    """
+    
+    def __init__(self, offers):
+        self.offers = [offer for offer in offers if offer.get('merchant')]
+        self._needles = [offer['merchant'].lower() for offer in self.offers]
+        
+        unique_needles = sorted(set(self._needles), key=len, reverse=True)
+        self._prefilter = re.compile('|'.join(re.escape(n) for n in unique_needles)) if unique_needles else None
+        self._by_merchant = {}
+    
+    def match(self, merchant):
+        """Return the offer applying to a merchant name, or None"""
+        key = merchant.lower()
+        if key in self._by_merchant:
+            return self._by_merchant[key]
+        
+        offer = None
+        if self._prefilter is not None and self._prefilter.search(key):
+            for needle, candidate in zip(self._needles, self.offers):
+                if needle in key:
+                    offer = candidate
+                    break
+        
+        self._by_merchant[key] = offer
+        return offer
+    
+    def apply(self, transaction):
+        """Apply the matching offer to one transaction"""
+        offer = self.match(transaction['merchant'])
+        if not offer:
+            return None
+        
+        discount_amount = transaction['amount'] * (offer['discount'] / 100)
+        return {
+            'original_amount': transaction['amount'],
+            'discount': discount_amount,
+            'final_amount': transaction['amount'] - discount_amount,
+            'offer_description': offer['description']
+        }
+    
+    def summarize(self, transactions):
+        """Potential savings on expenses: total, per month and per merchant"""
+        # Savings are rounded to whole cents per transaction and summed exactly
+        total = 0
+        by_month = defaultdict(int)
+        by_merchant = defaultdict(int)
+        
+        if self.offers:
+            for t in transactions:
+                if t['amount_cents'] >= 0:
+                    continue
+                offer = self.match(t['merchant'])
+                if offer:
+                    saving = round(-t['amount_cents'] * offer['discount'] / 100)
+                    total += saving
+                    by_month[month_of_day(t['day'])] += saving
+                    by_merchant[t['merchant']] += saving
+        
+        return {
+            'total': total / 100,
+            'by_month': [{'month': k, 'amount': v / 100} for k, v in sorted(by_month.items())],
+            'by_merchant': [{'name': k, 'amount': v / 100}
+                            for k, v in sorted(by_merchant.items(), key=lambda x: x[1], reverse=True)]
+        }
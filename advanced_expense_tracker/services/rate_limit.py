@@ -0,0 +1,323 @@
+"""
+Login rate limiting
+Token buckets keyed by client IP and by email decide whether a login attempt
+may reach the password check at all; they allow short bursts. Sliding-window
+counters on the same keys cap the attempts per hour, which a bucket refilling
+every few seconds would let a slow, steady attacker exceed. Both live in
+bounded LRUs; with a database path they are also saved on flush and reloaded
+on warmup so limits survive restarts. Shared limiters keep them in the
+database instead: every admitted attempt reads and updates its rows in one
+write transaction, so worker processes enforce one set of limits between them.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from services.db import Database
+
+class RateLimitedError(Exception):
+    """Raised when a login attempt exceeds its rate limit"""
+    
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBuckets:
+    """Bounded set of token buckets sharing one burst size and refill rate"""
+    
+    def __init__(self, name, burst, per_minute, max_keys=100000):
+        self.name = name
+        self.burst = burst
+        self.rate = per_minute / 60.0   # tokens per second
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()    # key -> [tokens, updated_at (epoch seconds)]
+    
+    def tokens(self, key, now):
+        """Current token count for key (buckets refill continuously up to burst)"""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return float(self.burst)
+        return min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+    
+    def retry_after(self, key, now):
+        """Seconds until key has a whole token again"""
+        if self.rate <= 0:
+            return 60
+        return max(1, int((1 - self.tokens(key, now)) / self.rate) + 1)
+    
+    def take(self, key, now):
+        self.buckets[key] = [self.tokens(key, now) - 1, now]
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+    
+    def full_at(self, bucket):
+        """When a bucket will have refilled to burst (it can be forgotten after that)"""
+        if self.rate <= 0:
+            return float('inf')
+        return bucket[1] + (self.burst - bucket[0]) / self.rate
+
+class SlidingWindows:
+    """
+    Bounded set of sliding-window attempt counters sharing one limit and window
+    Each key keeps the count of its current fixed window and of the one before;
+    the sliding count weights the previous window by how much of it still
+    overlaps the last `window` seconds. A limit of 0 disables the counters.
+    """
+    
+    def __init__(self, name, limit, window=3600, max_keys=100000):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.counters = OrderedDict()   # key -> [window start (epoch seconds), count, previous window's count]
+    
+    def _current(self, key, now):
+        """The key's counter rolled forward to the window containing now"""
+        start = now - now % self.window
+        counter = self.counters.get(key)
+        if counter is None or counter[0] < start - self.window:
+            return [start, 0, 0]
+        if counter[0] < start:
+            return [start, 0, counter[1]]
+        return counter
+    
+    def count(self, key, now):
+        """Attempts by key in the last `window` seconds (estimated)"""
+        start, count, previous = self._current(key, now)
+        return count + previous * (1 - (now - start) / self.window)
+    
+    def exceeded(self, key, now):
+        return self.limit > 0 and self.count(key, now) >= self.limit
+    
+    def retry_after(self, key, now):
+        """Seconds until key is back under its limit"""
+        start, count, previous = self._current(key, now)
+        if count < self.limit:
+            # The previous window's share fades out during this one
+            until = start + self.window * (1 - (self.limit - count) / previous)
+        else:
+            # Only the next window helps, once enough of this one has slid out
+            until = start + self.window * (2 - self.limit / count)
+        return max(1, int(until - now) + 1)
+    
+    def add(self, key, now):
+        counter = self._current(key, now)
+        self.counters[key] = [counter[0], counter[1] + 1, counter[2]]
+        self.counters.move_to_end(key)
+        while len(self.counters) > self.max_keys:
+            self.counters.popitem(last=False)
+    
+    def expires_at(self, counter):
+        """When a counter stops counting anything (it can be forgotten after that)"""
+        return counter[0] + 2 * self.window
+
+class LoginRateLimiter:
+    """Admits or rejects login attempts before any password hashing happens"""
+    
+    def __init__(self, ip_burst=20, ip_per_minute=10, email_burst=5, email_per_minute=2,
+                 ip_per_hour=200, email_per_hour=30, max_keys=100000, db_path=None, db=None, shared=False):
+        self.by_ip = TokenBuckets('ip', ip_burst, ip_per_minute, max_keys)
+        self.by_email = TokenBuckets('email', email_burst, email_per_minute, max_keys)
+        self.ip_windows = SlidingWindows('ip', ip_per_hour, max_keys=max_keys)
+        self.email_windows = SlidingWindows('email', email_per_hour, max_keys=max_keys)
+        if shared and not db_path:
+            raise ValueError('A shared login rate limiter needs a database path')
+        self.db_path = db_path
+        self.db = db or (Database(db_path) if db_path else None)
+        self.shared = shared
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+        if db_path:
+            self.init_tables()
+    
+    def get_connection(self):
+        return self.db.connect()
+    
+    def init_tables(self):
+        conn = self.get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS login_rate_limits (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS login_rate_windows (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                window_start REAL NOT NULL,
+                count INTEGER NOT NULL,
+                previous INTEGER NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+    
+    def acquire(self, ip, email):
+        """Spend one token and count one attempt for the IP and the email, or raise RateLimitedError"""
+        email = (email or '').strip().lower()
+        now = time.time()
+        with self._lock:
+            if self.shared:
+                # Reject from a plain read; only admitted attempts take the write lock
+                conn = self.get_connection()
+                try:
+                    self._load(conn.cursor(), ip, email)
+                finally:
+                    conn.close()
+                self._check(ip, email, now)
+                with self.db.transaction() as cursor:
+                    self._load(cursor, ip, email)
+                    self._admit(ip, email, now)
+                    self._save(cursor, ip, email)
+            else:
+                self._admit(ip, email, now)
+            self.admitted += 1
+    
+    def _check(self, ip, email, now):
+        """Raise RateLimitedError unless both keys may try now (caller holds _lock)"""
+        retry_after = self._retry_after(self.by_ip, self.ip_windows, ip, now)
+        if retry_after:
+            self.rejected_ip += 1
+            raise RateLimitedError('Too many login attempts from this address, please wait and try again',
+                                   retry_after)
+        retry_after = self._retry_after(self.by_email, self.email_windows, email, now)
+        if retry_after:
+            self.rejected_email += 1
+            raise RateLimitedError('Too many login attempts for this account, please wait and try again',
+                                   retry_after)
+    
+    def _admit(self, ip, email, now):
+        self._check(ip, email, now)
+        self.by_ip.take(ip, now)
+        self.by_email.take(email, now)
+        self.ip_windows.add(ip, now)
+        self.email_windows.add(email, now)
+    
+    def _keys(self, ip, email):
+        return ((self.by_ip, self.ip_windows, ip), (self.by_email, self.email_windows, email))
+    
+    def _load(self, cursor, ip, email):
+        """Replace the in-memory state of both keys with their database rows (shared limiters)"""
+        for buckets, windows, key in self._keys(ip, email):
+            cursor.execute('SELECT tokens, updated_at FROM login_rate_limits WHERE scope = ? AND key = ?',
+                           (buckets.name, key))
+            row = cursor.fetchone()
+            if row is None:
+                buckets.buckets.pop(key, None)
+            else:
+                buckets.buckets[key] = [row[0], row[1]]
+            cursor.execute('''
+                SELECT window_start, count, previous FROM login_rate_windows WHERE scope = ? AND key = ?
+            ''', (windows.name, key))
+            row = cursor.fetchone()
+            if row is None:
+                windows.counters.pop(key, None)
+            else:
+                windows.counters[key] = [row[0], row[1], row[2]]
+    
+    def _save(self, cursor, ip, email):
+        """Write both keys' state back to the database (shared limiters)"""
+        for buckets, windows, key in self._keys(ip, email):
+            cursor.execute('''
+                INSERT OR REPLACE INTO login_rate_limits (scope, key, tokens, updated_at) VALUES (?, ?, ?, ?)
+            ''', (buckets.name, key, *buckets.buckets[key]))
+            cursor.execute('''
+                INSERT OR REPLACE INTO login_rate_windows (scope, key, window_start, count, previous)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (windows.name, key, *windows.counters[key]))
+    
+    @staticmethod
+    def _retry_after(buckets, windows, key, now):
+        """Seconds until key may try again, or 0 when it may try now"""
+        if buckets.tokens(key, now) < 1:
+            return buckets.retry_after(key, now)
+        if windows.exceeded(key, now):
+            return windows.retry_after(key, now)
+        return 0
+    
+    def warmup(self):
+        """Registry hook: reload buckets that have not refilled yet and counters still counting"""
+        if not self.db_path or self.shared:   # shared limiters read the database on every attempt
+            return
+        now = time.time()
+        conn = self.get_connection()
+        rows = conn.execute('SELECT scope, key, tokens, updated_at FROM login_rate_limits').fetchall()
+        window_rows = conn.execute('SELECT scope, key, window_start, count, previous FROM login_rate_windows').fetchall()
+        conn.close()
+        scopes = {self.by_ip.name: self.by_ip, self.by_email.name: self.by_email}
+        window_scopes = {self.ip_windows.name: self.ip_windows, self.email_windows.name: self.email_windows}
+        with self._lock:
+            for scope, key, tokens, updated_at in rows:
+                buckets = scopes.get(scope)
+                if buckets is not None and buckets.full_at([tokens, updated_at]) > now:
+                    buckets.buckets[key] = [tokens, updated_at]
+            for scope, key, window_start, count, previous in window_rows:
+                windows = window_scopes.get(scope)
+                if windows is not None and windows.expires_at([window_start, count, previous]) > now:
+                    windows.counters[key] = [window_start, count, previous]
+    
+    def flush(self):
+        """Registry hook: persist buckets that are still below burst and counters still counting"""
+        if not self.db_path:
+            return
+        now = time.time()
+        if self.shared:
+            self._prune(now)
+            return
+        with self._lock:
+            rows = [(buckets.name, key, bucket[0], bucket[1])
+                    for buckets in (self.by_ip, self.by_email)
+                    for key, bucket in buckets.buckets.items()
+                    if buckets.full_at(bucket) > now]
+            window_rows = [(windows.name, key, *counter)
+                           for windows in (self.ip_windows, self.email_windows)
+                           for key, counter in windows.counters.items()
+                           if windows.expires_at(counter) > now]
+        with self.db.transaction() as cursor:
+            cursor.execute('DELETE FROM login_rate_limits')
+            cursor.executemany('INSERT INTO login_rate_limits (scope, key, tokens, updated_at) VALUES (?, ?, ?, ?)',
+                               rows)
+            cursor.execute('DELETE FROM login_rate_windows')
+            cursor.executemany('''
+                INSERT INTO login_rate_windows (scope, key, window_start, count, previous) VALUES (?, ?, ?, ?, ?)
+            ''', window_rows)
+    
+    def _prune(self, now):
+        """Delete the rows of buckets that have refilled and counters that stopped counting (shared limiters)"""
+        with self.db.transaction() as cursor:
+            for buckets in (self.by_ip, self.by_email):
+                if buckets.rate > 0:
+                    # Same test as TokenBuckets.full_at
+                    cursor.execute('''
+                        DELETE FROM login_rate_limits WHERE scope = ? AND updated_at + (? - tokens) / ? <= ?
+                    ''', (buckets.name, buckets.burst, buckets.rate, now))
+            for windows in (self.ip_windows, self.email_windows):
+                cursor.execute('DELETE FROM login_rate_windows WHERE scope = ? AND window_start + ? <= ?',
+                               (windows.name, 2 * windows.window, now))
+    
+    def clear(self):
+        with self._lock:
+            self.by_ip.buckets.clear()
+            self.by_email.buckets.clear()
+            self.ip_windows.counters.clear()
+            self.email_windows.counters.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'admitted': self.admitted,
+                'rejected_ip': self.rejected_ip,
+                'rejected_email': self.rejected_email,
+                'ip_keys': len(self.by_ip.buckets),
+                'email_keys': len(self.by_email.buckets),
+                'ip_windows': len(self.ip_windows.counters),
+                'email_windows': len(self.email_windows.counters)
+            }
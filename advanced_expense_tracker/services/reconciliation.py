@@ -3,8 +3,11 @@ Reconciliation service for matching transactions against bank statements
 """
 import csv
 import io
-from datetime import datetime, timedelta
-from difflib import SequenceMatcher
+from datetime import datetime
+from collections import defaultdict
+
+from models.day import to_epoch_day
+from models.money import to_cents
 
 class Reconciler:
     """Match transactions against bank statements"""
@@ -17,16 +20,21 @@ class Reconciler:
         # Parse statement
         statement_transactions = self._parse_statement(file)
         
-        # Get user transactions
-        user_transactions = self.data_store.get_transactions(user_id)
+        # Index the user's ledger rows by exact amount in cents
+        ledger = self.data_store.get_ledger(user_id)
+        by_amount = defaultdict(list)
+        for i, cents in enumerate(ledger.amount_cents[:len(ledger)]):
+            by_amount[cents].append(i)
         
         # Match transactions
         matches = []
         unmatched_statement = []
-        unmatched_user = list(user_transactions)
+        matched_ids = set()
         
         for stmt_trans in statement_transactions:
-            match = self._find_best_match(stmt_trans, unmatched_user)
+            candidates = [ledger.row(i) for i in by_amount.get(stmt_trans['amount_cents'], ())
+                          if ledger.ids[i] not in matched_ids]
+            match = self._find_best_match(stmt_trans, candidates)
             
             if match:
                 matches.append({
@@ -34,14 +42,14 @@ class Reconciler:
                     'user': match,
                     'confidence': self._calculate_match_confidence(stmt_trans, match)
                 })
-                unmatched_user.remove(match)
+                matched_ids.add(match['id'])
             else:
                 unmatched_statement.append(stmt_trans)
         
         return {
             'matches': matches,
             'unmatched_statement': unmatched_statement,
-            'unmatched_user': unmatched_user,
+            'unmatched_user': [ledger.row(i) for i in ledger.newest_first() if ledger.ids[i] not in matched_ids],
             'match_rate': round(len(matches) / len(statement_transactions) * 100, 1) if statement_transactions else 0
         }
     
@@ -59,31 +67,31 @@ class Reconciler:
             merchant = self._extract_merchant(row)
             
             if date and amount and merchant:
+                amount_cents = to_cents(amount)
                 transactions.append({
                     'date': date,
-                    'amount': amount,
+                    'amount': amount_cents / 100,
+                    'amount_cents': amount_cents,
+                    'day': to_epoch_day(date),
                     'merchant': merchant
                 })
         
         return transactions
     
     def _find_best_match(self, stmt_trans, user_transactions):
-        """Find best matching user transaction"""
+        """Find best matching user transaction among candidates with the same amount"""
         best_match = None
         best_score = 0
         
-        stmt_date = datetime.fromisoformat(stmt_trans['date'])
+        stmt_day = stmt_trans['day']
         
         for user_trans in user_transactions:
-            user_date = datetime.fromisoformat(user_trans['date'])
-            
             # Date must be within 3 days
-            if abs((stmt_date - user_date).days) > 3:
+            if abs(stmt_day - user_trans['day']) > 3:
                 continue
             
-            # Amount must match closely
-            amount_diff = abs(stmt_trans['amount'] - user_trans['amount'])
-            if amount_diff > 0.01:
+            # Amount must match exactly
+            if stmt_trans['amount_cents'] != user_trans['amount_cents']:
                 continue
             
             # Calculate merchant similarity
@@ -103,11 +111,10 @@ class Reconciler:
     def _calculate_match_confidence(self, stmt_trans, user_trans):
         """Calculate confidence of match"""
         # Exact amount match
-        amount_match = abs(stmt_trans['amount'] - user_trans['amount']) < 0.01
+        amount_match = stmt_trans['amount_cents'] == user_trans['amount_cents']
         
         # Date proximity
-        date_diff = abs((datetime.fromisoformat(stmt_trans['date']) - 
-                        datetime.fromisoformat(user_trans['date'])).days)
+        date_diff = abs(stmt_trans['day'] - user_trans['day'])
         
         # Merchant similarity
         merchant_sim = self._string_similarity(
@@ -133,6 +140,7 @@ class Reconciler:
     
     def _string_similarity(self, str1, str2):
         """Calculate string similarity ratio"""
+        from difflib import SequenceMatcher
         return SequenceMatcher(None, str1, str2).ratio()
     
     def _extract_date(self, row):
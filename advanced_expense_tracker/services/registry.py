@@ -0,0 +1,150 @@
+"""
+Service registry - builds every service once per application
+Owns shared service state (compiled rule tables, caches) and lifecycle hooks
+"""
+from services.db import Database
+from services.data_store import DataStore
+from services.auto_detect import AutoDetector
+from services.forecaster import Forecaster
+from services.offers import OffersManager
+from services.link_tracker import LinkTracker
+from services.user_log import UserLogWriter
+from services.backup import KdfParams, key_cache
+from services.auth_executor import AuthExecutor
+from services.rate_limit import LoginRateLimiter
+from services.fragment_cache import FragmentCache
+from services.fanout import FanOut, FanOutPool
+
+class ServiceRegistry:
+    """Holds one instance of each service for the lifetime of the app"""
+    
+    def __init__(self, config):
+        self.config = config
+        self.caches = {}
+        
+        self.log_writer = UserLogWriter(
+            durability=config.get('LOG_DURABILITY', 'flush'),
+            max_open_files=config.get('LOG_MAX_OPEN_FILES', 64),
+            flush_interval=config.get('LOG_FLUSH_INTERVAL', 1.0)
+        )
+        backup_kdf = KdfParams(
+            name=config.get('BACKUP_KDF', 'scrypt'),
+            n=config.get('BACKUP_KDF_N', 2 ** 15),
+            iterations=config.get('BACKUP_KDF_ITERATIONS', 600000)
+        )
+        key_cache.ttl = config.get('BACKUP_KEY_CACHE_TTL', 300)
+        self.auth = AuthExecutor(
+            workers=config.get('AUTH_WORKERS', 2),
+            queue_depth=config.get('AUTH_QUEUE_DEPTH', 16),
+            rounds=config.get('BCRYPT_ROUNDS', 12)
+        )
+        self.register_cache('backup_keys', key_cache)
+        
+        # One connection factory per process, shared by every service writing to the database
+        self.db = Database(
+            config['DATABASE_PATH'],
+            wal=config.get('SQLITE_WAL', True),
+            busy_timeout_ms=config.get('SQLITE_BUSY_TIMEOUT_MS', 5000),
+            write_retries=config.get('SQLITE_WRITE_RETRIES', 3),
+            retry_backoff_ms=config.get('SQLITE_RETRY_BACKOFF_MS', 50)
+        )
+        
+        self.data_store = DataStore(config['DATABASE_PATH'], config['USER_DATA_PATH'],
+                                    log_writer=self.log_writer, backup_kdf=backup_kdf,
+                                    ledger_budget=config.get('LEDGER_CACHE_MB', 64) * 1024 * 1024,
+                                    user_cache_ttl=config.get('USER_CACHE_TTL', 60), auth=self.auth, db=self.db)
+        self.register_cache('ledgers', self.data_store.ledgers)
+        self.register_cache('names', self.data_store.names)
+        self.register_cache('users', self.data_store.user_cache)
+        self.fragments = self.register_cache('fragments', FragmentCache(config.get('FRAGMENT_CACHE_ENTRIES', 256)))
+        
+        # Schema DDL only runs while the database is behind SCHEMA_VERSION (first boot, upgrades).
+        # init_db records the version, so it runs after the other services have created their tables.
+        init_schema = not self.data_store.schema_is_current()
+        self.link_tracker = LinkTracker(config['DATABASE_PATH'], init_schema=init_schema, db=self.db)
+        self.offers = OffersManager(config['DATABASE_PATH'], init_schema=init_schema, db=self.db)
+        if init_schema:
+            self.data_store.init_db()
+        
+        self.detector = AutoDetector(self.data_store)
+        self.forecaster = Forecaster(self.data_store, detector=self.detector)
+        self._reconciler = None
+        self.login_limiter = LoginRateLimiter(
+            ip_burst=config.get('LOGIN_IP_BURST', 20),
+            ip_per_minute=config.get('LOGIN_IP_PER_MINUTE', 10),
+            email_burst=config.get('LOGIN_EMAIL_BURST', 5),
+            email_per_minute=config.get('LOGIN_EMAIL_PER_MINUTE', 2),
+            ip_per_hour=config.get('LOGIN_IP_PER_HOUR', 200),
+            email_per_hour=config.get('LOGIN_EMAIL_PER_HOUR', 30),
+            max_keys=config.get('LOGIN_RATE_MAX_KEYS', 100000),
+            db_path=config['DATABASE_PATH'] if config.get('LOGIN_RATE_PERSIST') or config.get('LOGIN_RATE_SHARED') else None,
+            db=self.db,
+            shared=config.get('LOGIN_RATE_SHARED', False)
+        )
+        
+        # Shared pool for request fan-out (see fan_out)
+        self.fan_out_pool = FanOutPool(workers=config.get('FANOUT_WORKERS', 8),
+                                       queue_depth=config.get('FANOUT_QUEUE_DEPTH', 16),
+                                       max_abandoned=config.get('FANOUT_MAX_ABANDONED'))
+        
+        self._is_shut_down = False
+    
+    def services(self):
+        """All registered service instances"""
+        services = [self.data_store, self.link_tracker, self.offers,
+                    self.detector, self.forecaster, self.login_limiter]
+        if self._reconciler is not None:
+            services.append(self._reconciler)
+        return services
+    
+    @property
+    def reconciler(self):
+        """Statement reconciler, built (and its module imported) on first use"""
+        if self._reconciler is None:
+            from services.reconciliation import Reconciler
+            self._reconciler = Reconciler(self.data_store)
+        return self._reconciler
+    
+    def fan_out(self):
+        """A new request-scoped FanOut on the shared pool"""
+        return FanOut(self.fan_out_pool, timeout=self.config.get('FANOUT_TIMEOUT', 2.0))
+    
+    def register_cache(self, name, cache):
+        """Register a cache so flush() and shutdown() manage it"""
+        self.caches[name] = cache
+        return cache
+    
+    def stats(self):
+        """Counters from every cache and pool that keeps them"""
+        stats = {name: cache.stats() for name, cache in self.caches.items() if hasattr(cache, 'stats')}
+        stats['auth'] = self.auth.stats()
+        stats['database'] = self.db.stats()
+        stats['login_limiter'] = self.login_limiter.stats()
+        stats['fan_out'] = self.fan_out_pool.stats()
+        return stats
+    
+    def _call_hook(self, targets, hook):
+        for target in targets:
+            method = getattr(target, hook, None)
+            if callable(method):
+                method()
+    
+    def warmup(self):
+        """Precompile rule tables and prime service state before serving"""
+        self._call_hook(self.services(), 'warmup')
+    
+    def flush(self):
+        """Flush buffered service state and clear owned caches"""
+        self._call_hook(self.services(), 'flush')
+        for cache in self.caches.values():
+            if hasattr(cache, 'clear'):
+                cache.clear()
+    
+    def shutdown(self):
+        """Flush and release service resources (idempotent)"""
+        if self._is_shut_down:
+            return
+        self._is_shut_down = True
+        self.flush()
+        self.fan_out_pool.shutdown()
+        self._call_hook(self.services(), 'shutdown')
@@ -0,0 +1,44 @@
+"""
+Request-scoped memoization of reads
+Inside a Flask request, reads decorated with @memoized return the same result
+for the same arguments (callers must not mutate it) until a write decorated
+with @invalidates runs. The memo lives on flask.g and dies with the request;
+outside a request (CLI commands, fan-out workers, benchmarks) reads run
+normally.
+"""
+from functools import wraps
+
+from flask import g, has_request_context
+
+def memoized(method):
+    name = method.__name__
+    
+    @wraps(method)
+    def wrapped(self, *args, **kwargs):
+        if not has_request_context():
+            return method(self, *args, **kwargs)
+        memo = g.setdefault('_read_memo', {})
+        key = (id(self), name, args, tuple(sorted(kwargs.items())))
+        try:
+            return memo[key]
+        except KeyError:
+            pass
+        except TypeError:   # unhashable arguments
+            return method(self, *args, **kwargs)
+        result = memo[key] = method(self, *args, **kwargs)
+        return result
+    return wrapped
+
+def invalidates(method):
+    @wraps(method)
+    def wrapped(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            clear()
+    return wrapped
+
+def clear():
+    """Drop everything memoized in the current request"""
+    if has_request_context():
+        g.pop('_read_memo', None)
@@ -0,0 +1,66 @@
+"""
+User identity cache
+Keeps slim User objects in memory for a short TTL so the Flask-Login user
+loader does not query the users table on every authenticated request. Each
+entry records the user's data version it was loaded at and is dropped once
+the shared version moves, so a settings change made by another worker
+process is picked up on its next request. Writes to a user's row must bump
+the data version or call invalidate().
+"""
+import threading
+import time
+from collections import OrderedDict
+
+class UserCache:
+    """TTL + LRU cache of User objects keyed by user id"""
+    
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # user_id -> (user, data version, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+    
+    def get(self, user_id, version):
+        """Cached User, or None when missing, expired or loaded before data version `version`"""
+        if self.ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] == version and entry[2] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[user_id]
+                if entry[1] != version:
+                    self.stale += 1
+            self.misses += 1
+            return None
+    
+    def put(self, user, version):
+        """Cache user as loaded at data version `version` (read the version before the row)"""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user.id] = (user, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id):
+        """Forget a user after their row changes"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._entries), 'ttl': self.ttl, 'hits': self.hits, 'misses': self.misses,
+                    'stale': self.stale}
@@ -0,0 +1,466 @@
+"""
+Per-user transaction log
+Append-only JSON Lines records with a sidecar per-month offset index, written
+through striped per-file locks, an LRU of open file handles and
+group-commit flushing driven by a timer or a pending-bytes threshold.
+Writes hold an flock on the log file, so worker processes can share logs.
+"""
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:   # Windows: logs are only safe to share between threads
+    fcntl = None
+
+# Durability modes:
+#   none  - buffered; flushed to the OS by the timer, size threshold or close
+#   flush - flushed to the OS after every append (matches open/append/close)
+#   fsync - flushed and fsync'd after every append
+#   group - buffered; dirty files are flushed and fsync'd together (group commit)
+DURABILITY_MODES = ('none', 'flush', 'fsync', 'group')
+
+class UserLogWriter:
+    """
+    Appends lines to per-user log files through persistent handles
+    Buffered lines are kept here, not in the file handles, and are written out
+    while holding an exclusive flock on the log, so worker processes sharing
+    the files never interleave partial lines or append to a log another
+    process has just replaced.
+    """
+    
+    def __init__(self, durability='flush', max_open_files=64, flush_interval=1.0,
+                 flush_bytes=64 * 1024, lock_stripes=64):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'Unknown log durability mode: {durability}')
+        
+        self.durability = durability
+        self.max_open_files = max(1, max_open_files)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        
+        self._stripes = [threading.Lock() for _ in range(max(1, lock_stripes))]
+        self._handles = OrderedDict()   # path -> open file, least recently used first
+        self._handles_lock = threading.Lock()
+        self._state_lock = threading.Lock()   # guards _pending and _pending_bytes
+        self._pending = {}   # path -> buffered lines not yet written
+        self._pending_bytes = 0
+        self._closed = False
+        
+        self._stop = threading.Event()
+        self._flusher = None
+        if durability in ('none', 'group') and flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='user-log-flusher', daemon=True)
+            self._flusher.start()
+    
+    def _stripe(self, path):
+        return self._stripes[hash(path) % len(self._stripes)]
+    
+    def _get_handle(self, path, stripe):
+        """Return an open handle for path (caller holds path's stripe lock)"""
+        with self._handles_lock:
+            handle = self._handles.get(path)
+            if handle is not None:
+                self._handles.move_to_end(path)
+                return handle
+            
+            self._evict(stripe)
+            handle = open(path, 'ab')
+            self._handles[path] = handle
+            return handle
+    
+    def _evict(self, held_stripe):
+        """Close least recently used handles (caller holds _handles_lock)"""
+        for victim in list(self._handles):
+            if len(self._handles) < self.max_open_files:
+                return
+            victim_stripe = self._stripe(victim)
+            # Never block on another file's lock while holding _handles_lock
+            if victim_stripe is not held_stripe and not victim_stripe.acquire(blocking=False):
+                continue
+            try:
+                # Handles hold no buffered data (see _write), so closing loses nothing
+                self._handles.pop(victim).close()
+            finally:
+                if victim_stripe is not held_stripe:
+                    victim_stripe.release()
+    
+    def _drop_handle(self, path):
+        """Close path's handle if open (caller holds path's stripe lock)"""
+        with self._handles_lock:
+            handle = self._handles.pop(path, None)
+        if handle is not None:
+            handle.close()
+    
+    def _lock(self, path, stripe):
+        """
+        Open handle for path holding an exclusive flock (caller holds path's stripe lock)
+        If another process replaced the log while we waited for the lock, the
+        handle points at the old file; reopen and lock the new one instead.
+        """
+        while True:
+            handle = self._get_handle(path, stripe)
+            if fcntl is None:
+                return handle
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.path.samestat(os.fstat(handle.fileno()), os.stat(path)):
+                    return handle
+            except FileNotFoundError:
+                pass
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            self._drop_handle(path)
+    
+    @staticmethod
+    def _unlock(handle):
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    
+    def _take_pending(self, path):
+        """Remove and return path's buffered lines (caller holds path's stripe lock)"""
+        with self._state_lock:
+            lines = self._pending.pop(path, None)
+        return b''.join(lines) if lines else b''
+    
+    def _write(self, path, stripe, data, on_offset=None):
+        """
+        Write path's buffered lines followed by data under the log's flock
+        on_offset is called with the byte offset data lands at. The handle is
+        flushed before the lock is released, so it never buffers anything.
+        """
+        pending = self._take_pending(path)
+        handle = self._lock(path, stripe)
+        try:
+            if on_offset is not None:
+                on_offset(os.lseek(handle.fileno(), 0, os.SEEK_END) + len(pending))
+            handle.write(pending + data)
+            handle.flush()
+            if self.durability in ('fsync', 'group'):
+                os.fsync(handle.fileno())
+        finally:
+            self._unlock(handle)
+    
+    def append(self, path, line, on_offset=None):
+        """
+        Append one line to the log at path
+        on_offset, if given, is called with the byte offset the line lands at
+        while path's lock is still held, so nothing can be appended in between.
+        """
+        data = line.encode('utf-8')
+        stripe = self._stripe(path)
+        pending = 0
+        with stripe:
+            if on_offset is not None or self.durability in ('flush', 'fsync'):
+                self._write(path, stripe, data, on_offset)
+            else:
+                with self._state_lock:
+                    self._pending.setdefault(path, []).append(data)
+                    self._pending_bytes += len(data)
+                    pending = self._pending_bytes
+        
+        if pending >= self.flush_bytes:
+            self.flush()
+    
+    def reset(self, path, header='', on_reset=None):
+        """Truncate the log at path and write a header (on_reset runs under path's lock)"""
+        stripe = self._stripe(path)
+        with stripe:
+            self._take_pending(path)
+            handle = self._lock(path, stripe)
+            try:
+                os.ftruncate(handle.fileno(), 0)
+                handle.write(header.encode('utf-8'))
+                handle.flush()
+                if on_reset is not None:
+                    on_reset()
+            finally:
+                self._unlock(handle)
+    
+    def replace(self, path, source, prepare=None, on_replace=None):
+        """
+        Atomically replace the log at path with the file at source
+        prepare runs under path's lock with everything buffered for the current
+        log written out, just before the swap; on_replace runs under the lock
+        right after it. Other processes wait on the old file's flock and then
+        reopen the new one.
+        """
+        stripe = self._stripe(path)
+        with stripe:
+            pending = self._take_pending(path)
+            handle = self._lock(path, stripe)
+            try:
+                handle.write(pending)
+                handle.flush()
+                if prepare is not None:
+                    prepare()
+                os.replace(source, path)
+                if on_replace is not None:
+                    on_replace()
+            finally:
+                self._unlock(handle)
+                self._drop_handle(path)
+    
+    def flush(self, path=None):
+        """Write out one log's buffered lines (or every log's) according to the durability mode"""
+        with self._state_lock:
+            paths = [path] if path else list(self._pending)
+            if not path:
+                self._pending_bytes = 0
+        for p in paths:
+            stripe = self._stripe(p)
+            with stripe:
+                with self._state_lock:
+                    if p not in self._pending:
+                        continue
+                self._write(p, stripe, b'')
+    
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+    
+    def close(self):
+        """Write out buffered lines, close every open handle and stop the flusher thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        
+        self.flush()
+        for path in list(self._handles):
+            with self._stripe(path):
+                self._drop_handle(path)
+
+
+class TransactionLog:
+    """
+    Structured per-user transaction log (<user_id>.jsonl)
+    Each line is one JSON record carrying the transaction id and the time it
+    was logged. A sidecar <user_id>.idx holds 'YYYY-MM offset' lines giving the
+    byte offset of the first record logged in each month, so readers can seek
+    straight to a month instead of scanning the whole file.
+    """
+    
+    LOG_SUFFIX = '.jsonl'
+    INDEX_SUFFIX = '.idx'
+    LEGACY_SUFFIX = '.txt'
+    
+    def __init__(self, user_data_path, writer=None):
+        self.user_data_path = user_data_path
+        self.writer = writer or UserLogWriter()
+        self._last_month = {}
+        self._index_lock = threading.Lock()
+    
+    def path(self, user_id):
+        """Path to a user's log file"""
+        # Sanitize user_id to prevent path traversal
+        safe_user_id = str(int(user_id))
+        return os.path.join(self.user_data_path, f'{safe_user_id}{self.LOG_SUFFIX}')
+    
+    def index_path(self, user_id):
+        """Path to a user's month offset index"""
+        return self.path(user_id)[:-len(self.LOG_SUFFIX)] + self.INDEX_SUFFIX
+    
+    def create(self, user_id):
+        """Start an empty log (and index) for a new user"""
+        self.writer.reset(self.path(user_id), on_reset=lambda: self._reset_index(user_id))
+    
+    def _reset_index(self, user_id):
+        with self._index_lock:
+            with open(self.index_path(user_id), 'w') as f:
+                f.write('')
+            self._last_month.pop(self.path(user_id), None)
+    
+    def replace(self, user_id, records, keep_current=False):
+        """
+        Replace a user's log with records (restores, legacy conversion)
+        With keep_current the log as it is at the swap is carried over after the
+        records. The new log and index are written to temporary files next to
+        the old ones and swapped in together under the log's lock, so a failure
+        leaves the old log intact and no append can land in between.
+        """
+        path = self.path(user_id)
+        index = {}
+        log_fd, log_tmp = tempfile.mkstemp(dir=self.user_data_path, suffix=self.LOG_SUFFIX + '.tmp')
+        index_fd, index_tmp = tempfile.mkstemp(dir=self.user_data_path, suffix=self.INDEX_SUFFIX + '.tmp')
+        os.close(index_fd)
+        try:
+            with os.fdopen(log_fd, 'wb') as f:
+                for record in records:
+                    record = dict(record)
+                    record.setdefault('logged_at', datetime.now().isoformat(timespec='seconds'))
+                    index.setdefault(record['logged_at'][:7], f.tell())
+                    f.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            
+            def prepare():
+                if keep_current and os.path.exists(path):
+                    with open(log_tmp, 'ab') as f, open(path, 'rb') as current:
+                        base = f.tell()
+                        shutil.copyfileobj(current, f)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    for month, offset in sorted(self.read_index(user_id).items()):
+                        index.setdefault(month, base + offset)
+                with open(index_tmp, 'w') as f:
+                    f.writelines(f'{month} {offset}\n' for month, offset in index.items())
+            
+            def install_index():
+                with self._index_lock:
+                    os.replace(index_tmp, self.index_path(user_id))
+                    self._last_month[path] = max(index) if index else None
+            self.writer.replace(path, log_tmp, prepare=prepare, on_replace=install_index)
+        finally:
+            for tmp in (log_tmp, index_tmp):
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+    
+    def append(self, user_id, record):
+        """Append a record; stamps the log time and maintains the month index"""
+        record = dict(record)
+        record.setdefault('logged_at', datetime.now().isoformat(timespec='seconds'))
+        month = record['logged_at'][:7]
+        on_offset = None
+        if self._get_last_month(user_id) != month:
+            on_offset = lambda offset: self._add_index_entry(user_id, month, offset)
+        self.writer.append(self.path(user_id), json.dumps(record, separators=(',', ':')) + '\n', on_offset)
+    
+    def read_index(self, user_id):
+        """Load the month index as {month: offset} (earliest offset wins)"""
+        index = {}
+        try:
+            with open(self.index_path(user_id)) as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        month, offset = parts[0], int(parts[1])
+                        if month not in index or offset < index[month]:
+                            index[month] = offset
+        except FileNotFoundError:
+            pass
+        return index
+    
+    def _get_last_month(self, user_id):
+        path = self.path(user_id)
+        if path not in self._last_month:
+            index = self.read_index(user_id)
+            self._last_month[path] = max(index) if index else None
+        return self._last_month[path]
+    
+    def _add_index_entry(self, user_id, month, offset):
+        """Record where month starts (runs under the log's stripe lock, before the record is written)"""
+        with self._index_lock:
+            if self._last_month.get(self.path(user_id)) == month:
+                return
+            with open(self.index_path(user_id), 'a') as f:
+                f.write(f'{month} {offset}\n')
+            self._last_month[self.path(user_id)] = month
+    
+    def seek_offset(self, user_id, since):
+        """Byte offset of the first record that may have been logged on/after `since`"""
+        month = str(since)[:7]
+        index = self.read_index(user_id)
+        later = [offset for m, offset in index.items() if m >= month]
+        if later:
+            return min(later)
+        # Nothing logged in or after that month
+        return None if index else 0
+    
+    def read(self, user_id, since=None):
+        """Yield records, optionally only those logged on/after `since` (date or ISO string)"""
+        path = self.path(user_id)
+        if not os.path.exists(path):
+            return
+        self.writer.flush(path)
+        
+        since_key = None
+        offset = 0
+        if since:
+            since_key = since.isoformat() if hasattr(since, 'isoformat') else str(since)
+            offset = self.seek_offset(user_id, since_key)
+            if offset is None:
+                return
+        
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.strip() or line.startswith(b'#'):
+                    continue
+                record = json.loads(line)
+                if since_key and record.get('logged_at', '') < since_key:
+                    continue
+                yield record
+    
+    def convert_legacy(self, user_id):
+        """
+        Convert a legacy pipe-delimited <user_id>.txt log into the structured format
+        Legacy lines carry no id or log time, so the transaction date stands in
+        for the log time. The converted records go in front of the structured
+        log in one atomic replace, so records appended meanwhile are kept. The
+        .txt file is claimed by renaming it first and ends up as .txt.converted,
+        or back in place if the conversion fails.
+        Returns the number of records converted.
+        """
+        legacy_path = self.path(user_id)[:-len(self.LOG_SUFFIX)] + self.LEGACY_SUFFIX
+        claimed = legacy_path + '.converting'
+        try:
+            os.replace(legacy_path, claimed)
+        except FileNotFoundError:
+            return 0
+        try:
+            records = self._read_legacy(claimed)
+            # Existing structured records (if any) were logged after the legacy ones
+            self.replace(user_id, sorted(records, key=lambda r: r['logged_at']), keep_current=True)
+        except BaseException:
+            os.replace(claimed, legacy_path)
+            raise
+        
+        os.replace(claimed, legacy_path + '.converted')
+        return len(records)
+    
+    def _read_legacy(self, legacy_path):
+        """Records from a legacy pipe-delimited log"""
+        records = []
+        with open(legacy_path, encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if not line or line.startswith('#'):
+                    continue
+                parts = line.split(' | ', 4)
+                if len(parts) < 4:
+                    continue
+                date, amount, merchant, category = parts[:4]
+                try:
+                    amount = float(amount)
+                except ValueError:
+                    continue
+                records.append({
+                    'id': None,
+                    'date': date,
+                    'amount': amount,
+                    'merchant': merchant,
+                    'category': category,
+                    'notes': parts[4] if len(parts) > 4 else '',
+                    'logged_at': date
+                })
+        return records
+    
+    def convert_all_legacy(self):
+        """Convert every legacy .txt log in the user data directory"""
+        converted = 0
+        if not os.path.isdir(self.user_data_path):
+            return converted
+        for entry in os.scandir(self.user_data_path):
+            match = re.fullmatch(r'(\d+)\.txt', entry.name)
+            if match:
+                self.convert_legacy(int(match.group(1)))
+                converted += 1
+        return converted
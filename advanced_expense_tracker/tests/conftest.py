@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.auth_executor import AuthExecutor
+from services.backup import KdfParams
+from services.data_store import DataStore
+from services.registry import ServiceRegistry
+
+@pytest.fixture
+def make_store(tmp_path):
+    """DataStore factory over a temporary database and user directory (fast bcrypt)"""
+    stores = []
+    
+    def make(init=True, **kwargs):
+        user_data_path = tmp_path / 'users'
+        user_data_path.mkdir(exist_ok=True)
+        kwargs.setdefault('auth', AuthExecutor(rounds=4))
+        kwargs.setdefault('backup_kdf', KdfParams('pbkdf2_sha256', iterations=1000))
+        store = DataStore(str(tmp_path / 'app.db'), str(user_data_path), **kwargs)
+        if init:
+            store.init_db()
+        stores.append(store)
+        return store
+    
+    yield make
+    for store in stores:
+        store.shutdown()
+
+@pytest.fixture
+def data_store(make_store):
+    return make_store()
+
+@pytest.fixture
+def config(tmp_path):
+    """Application config over temporary paths with cheap bcrypt and backup KDF settings"""
+    user_data_path = tmp_path / 'users'
+    user_data_path.mkdir(exist_ok=True)
+    return {'DATABASE_PATH': str(tmp_path / 'app.db'), 'USER_DATA_PATH': str(user_data_path),
+            'BCRYPT_ROUNDS': 4, 'BACKUP_KDF': 'pbkdf2_sha256', 'BACKUP_KDF_ITERATIONS': 1000}
+
+@pytest.fixture
+def services(config):
+    registry = ServiceRegistry(config)
+    yield registry
+    registry.shutdown()
+
+@pytest.fixture
+def other_process(config, services):
+    """A second registry on the same database, like another worker or a CLI command"""
+    other = ServiceRegistry(config)
+    yield other
+    other.shutdown()
+
+@pytest.fixture
+def app(config, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(config['DATABASE_PATH']))
+    for key, value in config.items():
+        monkeypatch.setenv(key, str(value))
+    from app import create_app
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    yield flask_app
+    flask_app.extensions['services'].shutdown()
+
+@pytest.fixture
+def client(app):
+    """Test client signed in as a fresh user"""
+    client = app.test_client()
+    response = client.post('/signup', data={'username': 'tester', 'email': 'tester@example.com',
+                                            'password': 'password1', 'confirm_password': 'password1'})
+    assert response.status_code == 302
+    return client
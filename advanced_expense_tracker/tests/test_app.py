@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+def add(client, amount, merchant, date, category='Other'):
+    return client.post('/transactions/add', data={'amount': amount, 'merchant': merchant,
+                                                  'category': category, 'date': date})
+
+def test_transactions_page_lists_models_by_day(client):
+    add(client, -499, 'Netflix', '2025-09-05')
+    add(client, 5000, 'Salary', '2025-10-01 09:30:00')
+    
+    page = client.get('/transactions').get_data(as_text=True)
+    
+    assert 'Netflix' in page and 'Salary' in page
+    assert '2025-09-05' in page and '2025-10-01' in page
+    assert page.index('Salary') < page.index('Netflix')
+
+def flashes(client):
+    with client.session_transaction() as session:
+        return [message for _, message in session.get('_flashes', [])]
+
+@pytest.mark.parametrize('date', ['', 'yesterday', '2025-13-40'])
+def test_adding_a_transaction_with_a_bad_date_is_rejected(client, app, date):
+    response = add(client, -10, 'Amazon', date)
+    
+    assert response.status_code == 302
+    assert any('Invalid date' in message for message in flashes(client))
+    assert app.extensions['services'].data_store.get_transactions(1) == []
+
+def test_legacy_rows_without_a_day_do_not_break_reads(client, app):
+    add(client, -499, 'Netflix', '2025-09-05')
+    data_store = app.extensions['services'].data_store
+    with data_store.write() as cursor:
+        cursor.execute("UPDATE transactions SET date = 'garbage', day = NULL")
+    add(client, -120, 'Amazon', '2025-09-06')
+    
+    statement = b'Date,Amount,Description\n2025-09-06,-120,Amazon\n'
+    response = client.post('/reconcile/upload', data={'file': (io.BytesIO(statement), 's.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert len(data_store.get_ledger(1)) == 1
+    for path in ('/', '/transactions', '/export/columnar'):
+        assert client.get(path).status_code == 200
+
+def test_unreadable_statement_is_flashed(client):
+    response = client.post('/reconcile/upload', data={'file': (io.BytesIO(b'\xff\xfe\x00bad'), 's.csv')},
+                           content_type='multipart/form-data')
+    
+    assert response.status_code == 302
+    assert any('Could not read statement' in message for message in flashes(client))
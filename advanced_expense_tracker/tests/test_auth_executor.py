@@ -0,0 +1,65 @@
+import threading
+
+import bcrypt
+import pytest
+
+from services.auth_executor import AuthBusyError, AuthExecutor
+
+def stored_hash(data_store, email):
+    conn = data_store.get_connection()
+    try:
+        return conn.execute('SELECT password_hash FROM users WHERE email = ?', (email,)).fetchone()[0]
+    finally:
+        conn.close()
+
+def test_saturated_pool_sheds_instead_of_queueing(monkeypatch):
+    auth = AuthExecutor(workers=1, queue_depth=0, rounds=4)
+    started, release = threading.Event(), threading.Event()
+    real_hashpw = bcrypt.hashpw
+    
+    def slow_hashpw(password, salt):
+        started.set()
+        release.wait(5)
+        return real_hashpw(password, salt)
+    monkeypatch.setattr(bcrypt, 'hashpw', slow_hashpw)
+    
+    holder = threading.Thread(target=auth.hash_password, args=('first',))
+    holder.start()
+    try:
+        assert started.wait(5)
+        with pytest.raises(AuthBusyError):
+            auth.hash_password('second')
+        with pytest.raises(AuthBusyError):
+            auth.check_password('second', b'$2b$04$' + b'x' * 53)
+    finally:
+        release.set()
+        holder.join()
+    
+    # The slot is free again once the running hash finishes
+    assert auth.needs_rehash(auth.hash_password('third')) is False
+    assert auth.stats()['rejected'] == 2
+    auth.shutdown()
+
+def test_login_rehashes_at_the_configured_rounds(make_store):
+    make_store().create_user('rounds', 'rounds@example.com', 'password1')
+    stronger = make_store(init=False, auth=AuthExecutor(rounds=5))
+    assert stored_hash(stronger, 'rounds@example.com').startswith(b'$2b$04$')
+    
+    assert stronger.authenticate_user('rounds@example.com', 'wrong-password') is None
+    assert stored_hash(stronger, 'rounds@example.com').startswith(b'$2b$04$')
+    
+    assert stronger.authenticate_user('rounds@example.com', 'password1') is not None
+    rehashed = stored_hash(stronger, 'rounds@example.com')
+    assert rehashed.startswith(b'$2b$05$') and bcrypt.checkpw(b'password1', rehashed)
+    assert not stronger.auth.needs_rehash(rehashed)
+
+def test_busy_pool_keeps_the_old_hash(make_store, monkeypatch):
+    make_store().create_user('busy', 'busy@example.com', 'password1')
+    stronger = make_store(init=False, auth=AuthExecutor(rounds=5))
+    
+    def busy(password):
+        raise AuthBusyError('busy')
+    monkeypatch.setattr(stronger.auth, 'hash_password', busy)
+    
+    assert stronger.authenticate_user('busy@example.com', 'password1') is not None
+    assert stored_hash(stronger, 'busy@example.com').startswith(b'$2b$04$')
@@ -0,0 +1,178 @@
+import io
+import json
+import sqlite3
+import time
+
+import pytest
+
+from services.backup import MAGIC, BackupError, BackupWriter, KdfParams
+
+PASSPHRASE = 'correct horse'
+
+@pytest.fixture
+def data_store(services):
+    # Backups include the offers table, which the registry's OffersManager creates
+    return services.data_store
+
+@pytest.fixture
+def users(data_store):
+    alice = data_store.create_user('alice', 'alice@example.com', 'password1')
+    bob = data_store.create_user('bob', 'bob@example.com', 'password2')
+    return alice.id, bob.id
+
+def backup(data_store, user_id, incremental=False):
+    out = io.BytesIO()
+    data_store.backups.write_backup(user_id, PASSPHRASE, out, incremental=incremental)
+    out.seek(0)
+    return out
+
+def forge(data_store, user_id, records, kind='full'):
+    """A validly encrypted backup carrying arbitrary records"""
+    out = io.BytesIO()
+    fernet, kdf_header = data_store.backups._new_backup_fernet(PASSPHRASE)
+    header = {'user_id': user_id, 'kind': kind, 'since_transaction_id': None, 'last_transaction_id': 0,
+              'created_at': '2025-01-01T00:00:00', 'kdf': kdf_header}
+    writer = BackupWriter(out, fernet, header)
+    for table, row in records:
+        writer.write_record(table, row)
+    writer.close()
+    out.seek(0)
+    return out
+
+def log_ids(data_store, user_id):
+    return [r['id'] for r in data_store.get_log_records(user_id)]
+
+def test_full_restore_round_trip(data_store, users):
+    alice, _ = users
+    data_store.create_envelope(alice, 'Food', 200)
+    envelope_id = data_store.get_envelopes(alice)[0]['id']
+    data_store.add_transaction(alice, -12.5, 'Swiggy', 'Food & Dining', '2025-01-05', envelope_id=envelope_id)
+    data_store.add_transaction(alice, 1000, 'Salary', 'Income', '2025-02-01')
+    data_store.create_goal(alice, 'Bike', 500, 20, '2025-12-31')
+    saved = backup(data_store, alice)
+    
+    data_store.add_transaction(alice, -5, 'Uber', 'Transport', '2025-02-02')
+    counts = data_store.restore_encrypted_backup(alice, PASSPHRASE, saved)
+    
+    assert counts == {'log': 2, 'transactions': 2, 'envelopes': 1, 'goals': 1}
+    transactions = {t['merchant']: t for t in data_store.get_transactions(alice)}
+    assert set(transactions) == {'Swiggy', 'Salary'}
+    assert transactions['Swiggy']['amount_cents'] == -1250
+    assert transactions['Swiggy']['envelope_id'] == data_store.get_envelopes(alice)[0]['id']
+    assert sorted(log_ids(data_store, alice)) == sorted(t['id'] for t in transactions.values())
+    assert sorted(r['merchant'] for r in data_store.get_log_records(alice, since='2025-01-01')) == ['Salary', 'Swiggy']
+
+def test_incremental_restore_applies_on_top_of_full(data_store, users):
+    alice, _ = users
+    data_store.add_transaction(alice, -10, 'Amazon', 'Shopping', '2025-01-01')
+    full = backup(data_store, alice)
+    data_store.add_transaction(alice, -20, 'Netflix', 'Entertainment', '2025-01-02')
+    incremental = backup(data_store, alice, incremental=True)
+    
+    data_store.restore_encrypted_backup(alice, PASSPHRASE, full)
+    counts = data_store.restore_encrypted_backup(alice, PASSPHRASE, incremental)
+    
+    assert counts['transactions'] == 1
+    assert sorted(t['merchant'] for t in data_store.get_transactions(alice)) == ['Amazon', 'Netflix']
+    assert len(log_ids(data_store, alice)) == 2
+
+def test_restore_ignores_unknown_columns_and_foreign_ids(data_store, users, tmp_path):
+    alice, bob = users
+    data_store.add_transaction(bob, -99, 'Rent', 'Bills', '2025-01-01')
+    bob_transaction = data_store.get_transactions(bob)[0]
+    
+    data_store.restore_encrypted_backup(alice, PASSPHRASE, forge(data_store, alice, [
+        ('transactions', {
+            'id': bob_transaction['id'], 'user_id': bob, 'amount_cents': 1, 'merchant': 'Evil', 'category': 'Other',
+            'date': '2025-01-01',
+            'notes) VALUES (1, 1, 1, 1, 1); DROP TABLE users; --': 'x',
+        }),
+        ('users', {'id': bob, 'username': 'mallory', 'email': 'bob@example.com', 'password_hash': 'x'}),
+    ]))
+    
+    assert data_store.get_transactions(bob) == [bob_transaction]
+    restored = data_store.get_transactions(alice)
+    assert [t['merchant'] for t in restored] == ['Evil']
+    assert restored[0]['id'] != bob_transaction['id']
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    assert conn.execute('SELECT username FROM users ORDER BY id').fetchall() == [('alice',), ('bob',)]
+    conn.close()
+
+def test_failed_restore_keeps_rows_and_log(data_store, users):
+    alice, _ = users
+    data_store.add_transaction(alice, -10, 'Amazon', 'Shopping', '2025-01-01')
+    before_rows, before_log = data_store.get_transactions(alice), log_ids(data_store, alice)
+    
+    bad = forge(data_store, alice, [
+        ('log', {'id': 1, 'amount': 5, 'logged_at': '2025-01-01T00:00:00'}),
+        ('transactions', {'amount_cents': 1, 'merchant': 'A', 'category': 'B', 'date': 'not a date'}),
+    ])
+    with pytest.raises(BackupError):
+        data_store.restore_encrypted_backup(alice, PASSPHRASE, bad)
+    with pytest.raises(BackupError):
+        data_store.restore_encrypted_backup(alice, 'wrong passphrase', backup(data_store, alice))
+    
+    assert data_store.get_transactions(alice) == before_rows
+    assert log_ids(data_store, alice) == before_log
+
+def test_restore_rejects_another_users_backup(data_store, users):
+    alice, bob = users
+    with pytest.raises(BackupError):
+        data_store.restore_encrypted_backup(bob, PASSPHRASE, backup(data_store, alice))
+
+def with_kdf(saved, **kdf):
+    """Rewrite the plaintext header of a backup with different KDF settings"""
+    data = saved.getvalue()
+    prefix = len(MAGIC) + 1
+    length = int.from_bytes(data[prefix:prefix + 4], 'big')
+    header = json.loads(data[prefix + 4:prefix + 4 + length])
+    header['kdf'] = {k: v for k, v in header['kdf'].items() if k in ('salt', 'nonce')} | kdf
+    header_bytes = json.dumps(header).encode()
+    return io.BytesIO(data[:prefix] + len(header_bytes).to_bytes(4, 'big') + header_bytes
+                      + data[prefix + 4 + length:])
+
+@pytest.mark.parametrize('kdf', [
+    {'name': 'scrypt', 'n': 2 ** 30, 'r': 8, 'p': 1},
+    {'name': 'scrypt', 'n': 2 ** 14, 'r': 1024, 'p': 1},
+    {'name': 'scrypt', 'n': 2 ** 14, 'r': 8, 'p': 10 ** 6},
+    {'name': 'scrypt', 'n': 1000, 'r': 8, 'p': 1},
+    {'name': 'pbkdf2_sha256', 'iterations': 10 ** 12},
+    {'name': 'pbkdf2_sha256', 'iterations': '1000'},
+    {'name': 'pbkdf2_sha256', 'iterations': 1000, 'dklen': 10 ** 9},
+    {'name': 'argon2'},
+])
+def test_restore_rejects_unaffordable_kdf_settings(data_store, users, kdf):
+    alice, _ = users
+    started = time.perf_counter()
+    with pytest.raises(BackupError):
+        data_store.restore_encrypted_backup(alice, PASSPHRASE, with_kdf(backup(data_store, alice), **kdf))
+    assert time.perf_counter() - started < 1
+
+def test_restore_accepts_other_affordable_kdf_settings(data_store, users):
+    alice, _ = users
+    data_store.add_transaction(alice, -10, 'Amazon', 'Shopping', '2025-01-01')
+    data_store.backups.kdf = KdfParams('scrypt', n=2 ** 10, r=8, p=1)
+    saved = backup(data_store, alice)
+    data_store.backups.kdf = KdfParams('pbkdf2_sha256', iterations=1000)
+    
+    assert data_store.restore_encrypted_backup(alice, PASSPHRASE, saved)['transactions'] == 1
+
+@pytest.mark.parametrize('row', [{'date': None}, {'date': ''}, {'date': '2025-02-30'}, {'day': 'x'}])
+def test_restore_rejects_rows_without_a_valid_date(data_store, users, row):
+    alice, _ = users
+    record = dict({'amount_cents': 1, 'merchant': 'A', 'category': 'B'}, **row)
+    with pytest.raises(BackupError):
+        data_store.restore_encrypted_backup(alice, PASSPHRASE, forge(data_store, alice, [('transactions', record)]))
+
+def test_rejected_restore_does_not_leak_new_name_ids(data_store, users):
+    alice, _ = users
+    stream = forge(data_store, alice, [
+        ('transactions', {'amount_cents': -100, 'merchant': 'Unseen', 'category': 'Other', 'date': '2025-01-01'}),
+        ('transactions', {'amount_cents': -200, 'merchant': 'Also Unseen', 'category': 'Other', 'date': 'garbage'}),
+    ], kind='incr')
+    
+    with pytest.raises(BackupError):
+        data_store.backups.restore_backup(alice, PASSPHRASE, stream)
+    data_store.add_transaction(alice, -7, 'Next Shop', 'Other', '2025-09-03')
+    
+    assert [row['merchant'] for row in data_store.get_transactions(alice)] == ['Next Shop']
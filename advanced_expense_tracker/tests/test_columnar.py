@@ -0,0 +1,30 @@
+from services.columnar import ColumnarReader
+
+def test_columnar_export_reads_back_through_the_reader(data_store):
+    user_id = data_store.create_user('analyst', 'analyst@example.com', 'password1').id
+    envelope_id = data_store.create_envelope(user_id, 'Food', 3000)
+    data_store.add_transaction(user_id, -250.5, 'Swiggy', 'Food & Dining', '2025-03-02', envelope_id, 'Dinner')
+    data_store.add_transaction(user_id, 5000, 'Salary', 'Income', '2025-03-01')
+    data_store.add_transaction(user_id, -120, 'Swiggy', 'Food & Dining', '2025-03-04', notes='Lunch')
+    data_store.add_transaction(user_id, -99, 'Netflix', 'Entertainment', '2025-03-03')
+    data_store.add_transaction(user_id, -1, 'Legacy', 'Other', '2025-03-05')
+    with data_store.write() as cursor:
+        cursor.execute("UPDATE transactions SET notes = NULL WHERE amount_cents = -9900")
+        # A legacy row whose date never parsed has no place on the timeline
+        cursor.execute("UPDATE transactions SET date = 'garbage', day = NULL WHERE amount_cents = -100")
+    
+    reader = ColumnarReader(b''.join(data_store.iter_columnar_export(user_id, row_group_size=2)))
+    
+    assert reader.num_rows == 4
+    assert [group['rows'] for group in reader.row_groups] == [2, 2]
+    assert reader.dictionaries['merchant'] == ['Salary', 'Swiggy', 'Netflix']
+    assert list(reader.read_column('merchant', decode=False)) == [0, 1, 2, 1]
+    assert reader.read_column('category') == ['Income', 'Food & Dining', 'Entertainment', 'Food & Dining']
+    assert list(reader.read_column('amount_cents')) == [500000, -25050, -9900, -12000]
+    
+    rows = reader.to_rows()
+    assert [row['date'] for row in rows] == ['2025-03-01', '2025-03-02', '2025-03-03', '2025-03-04']
+    assert [row['envelope_id'] for row in rows] == [None, envelope_id, None, None]
+    # NULL notes come back as the empty string in the dictionary-encoded column
+    assert [row['notes'] for row in rows] == ['', 'Dinner', '', 'Lunch']
+    assert rows[1]['amount'] == -250.5
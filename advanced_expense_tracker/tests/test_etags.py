@@ -0,0 +1,57 @@
+from test_app import add
+
+def fresh_get(client, path, **kwargs):
+    """GET with no flashes pending, so the response is versioned"""
+    client.get(path)
+    return client.get(path, **kwargs)
+
+def test_matching_etag_gets_304(client):
+    first = fresh_get(client, '/')
+    etag = first.headers['ETag']
+    
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+    again = client.get('/', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == etag
+    assert again.get_data() == b''
+
+def test_write_changes_the_etag(client):
+    etag = fresh_get(client, '/').headers['ETag']
+    add(client, -499, 'Netflix', '2025-09-05')
+    
+    response = fresh_get(client, '/', headers={'If-None-Match': etag})
+    
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Netflix' in response.get_data(as_text=True)
+
+def test_page_with_pending_flashes_is_not_tagged(client):
+    fresh_get(client, '/')
+    add(client, -499, 'Netflix', '2025-09-05')   # flashes a confirmation
+    
+    response = client.get('/')
+    
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    # The flash was consumed; the next render is tagged and holds no stale message
+    assert client.get('/').headers['ETag']
+
+def test_etags_are_per_user(app):
+    etags = []
+    for name in ('alice', 'bob'):
+        client = app.test_client()
+        client.post('/signup', data={'username': name, 'email': f'{name}@example.com', 'password': 'password1',
+                                     'confirm_password': 'password1'})
+        etags.append(fresh_get(client, '/goals').headers['ETag'])
+    
+    assert etags[0] != etags[1]
+
+def test_api_reads_are_versioned(client):
+    response = client.get('/api/v1/goals')
+    etag = response.headers['ETag']
+    
+    assert response.status_code == 200
+    assert client.get('/api/v1/goals', headers={'If-None-Match': etag}).status_code == 304
+    add(client, -120, 'Amazon', '2025-09-06')
+    assert client.get('/api/v1/goals', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,66 @@
+import csv
+import gzip
+import io
+import os
+
+import pytest
+
+from test_app import add, flashes
+
+@pytest.fixture
+def ledger(client):
+    add(client, -499, 'Netflix', '2025-09-05', 'Entertainment')
+    add(client, 5000, 'Salary', '2025-10-01', 'Income')
+    add(client, -120, 'Amazon', '2025-10-15', 'Shopping')
+    return client
+
+def export(client, **args):
+    response = client.get('/export/csv', query_string=args)
+    assert response.status_code == 200
+    body = response.get_data()
+    if args.get('gzip') == '1':
+        body = gzip.decompress(body)
+    return list(csv.reader(io.StringIO(body.decode('utf-8'))))
+
+def test_csv_export_streams_every_transaction_newest_first(ledger):
+    rows = export(ledger)
+    
+    assert rows[0][:6] == ['id', 'user_id', 'amount', 'merchant', 'category', 'date']
+    assert [row[3] for row in rows[1:]] == ['Amazon', 'Salary', 'Netflix']
+    assert rows[3][2] == '-499.0'
+
+def test_csv_export_filters_by_date_range_and_columns(ledger):
+    rows = export(ledger, start='2025-10-01', end='2025-10-14', columns='date,merchant,amount_cents')
+    
+    assert rows == [['date', 'merchant', 'amount_cents'], ['2025-10-01', 'Salary', '500000']]
+
+def test_csv_export_can_be_gzipped(ledger):
+    response = ledger.get('/export/csv?gzip=1&columns=merchant')
+    
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz')
+    assert gzip.decompress(response.get_data()).decode().split() == ['merchant', 'Amazon', 'Salary', 'Netflix']
+
+def test_csv_export_of_an_empty_range_has_only_the_header(ledger):
+    assert export(ledger, start='2030-01-01', columns='id,merchant') == [['id', 'merchant']]
+
+@pytest.mark.parametrize('args, message', [
+    ({'columns': 'merchant,password_hash'}, 'Unknown export columns: password_hash'),
+    ({'start': '2025-13-01'}, 'Invalid date'),
+    ({'end': 'last week'}, 'Invalid date'),
+])
+def test_csv_export_rejects_bad_arguments(ledger, args, message):
+    response = ledger.get('/export/csv', query_string=args)
+    
+    assert response.status_code == 302 and response.location.endswith('/settings')
+    assert any(message in flashed for flashed in flashes(ledger))
+
+def test_csv_export_writes_no_files(ledger, app):
+    user_data_path = app.config['USER_DATA_PATH']
+    before = set(os.listdir(user_data_path))
+    
+    export(ledger)
+    export(ledger, gzip='1')
+    
+    assert set(os.listdir(user_data_path)) == before
+    assert not any(name.endswith('.csv') for name in os.listdir(user_data_path))
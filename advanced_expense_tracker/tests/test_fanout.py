@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from services.fanout import FanOut, FanOutPool, FanOutTimeout
+
+@pytest.fixture
+def pool():
+    pool = FanOutPool(workers=2, queue_depth=2, max_abandoned=1)
+    yield pool
+    pool.shutdown()
+
+def test_results_and_deduplication(pool):
+    fan = FanOut(pool, timeout=1)
+    calls = []
+    fan.submit('a', lambda: calls.append(1) or 42)
+    fan.submit('a', lambda: calls.append(2) or 0)
+    
+    assert fan.result('a') == 42
+    assert calls == [1]
+    assert not fan.partial
+
+def test_timed_out_task_is_abandoned_and_pool_sheds_until_it_finishes(pool):
+    release = threading.Event()
+    fan = FanOut(pool, timeout=0.05)
+    fan.submit('slow', release.wait)
+    
+    assert fan.result('slow', None) is None
+    with pytest.raises(FanOutTimeout):
+        fan.result('slow')
+    assert pool.stats()['abandoned'] == 1 and pool.stats()['abandoned_total'] == 1
+    
+    # While the abandoned task holds a worker, new work is shed: optional panels
+    # fall back at once, required ones run on the caller's thread
+    next_request = FanOut(pool, timeout=1)
+    started = time.monotonic()
+    assert next_request.submit('optional', time.sleep, 5) is None
+    assert next_request.result('optional', 'fallback') == 'fallback'
+    next_request.submit('required', threading.get_ident)
+    assert next_request.result('required') == threading.get_ident()
+    assert time.monotonic() - started < 1
+    assert pool.stats()['shed'] == 2
+    
+    release.set()
+    time.sleep(0.05)
+    assert pool.stats()['abandoned'] == 0
+    assert FanOut(pool).submit('again', int) is not None
+
+def test_queued_task_past_its_deadline_is_cancelled():
+    pool = FanOutPool(workers=1, queue_depth=4, max_abandoned=4)
+    release = threading.Event()
+    try:
+        fan = FanOut(pool, timeout=0.05)
+        fan.submit('blocker', release.wait)
+        fan.submit('queued', int)
+        
+        assert fan.result('queued', 'late') == 'late'
+        assert fan.result('blocker', 'late') == 'late'
+        release.set()
+        time.sleep(0.05)
+        stats = pool.stats()
+        assert stats['cancelled'] == 1 and stats['abandoned'] == 0 and stats['in_flight'] == 0
+    finally:
+        release.set()
+        pool.shutdown()
+
+def test_full_queue_sheds(pool):
+    release = threading.Event()
+    try:
+        fan = FanOut(pool, timeout=1)
+        futures = [fan.submit(n, release.wait) for n in range(5)]
+        assert futures[-1] is None and all(futures[:4])
+    finally:
+        release.set()
@@ -0,0 +1,43 @@
+def test_writes_from_another_process_are_not_served_stale(services, other_process):
+    data_store = services.data_store
+    user_id = data_store.create_user('ledger', 'ledger@example.com', 'password1').id
+    data_store.add_transaction(user_id, -10, 'Amazon', 'Shopping', '2025-09-01')
+    assert data_store.get_ledger(user_id).total_cents() == -1000
+    
+    other_process.data_store.add_transaction(user_id, -90, 'Swiggy', 'Food & Dining', '2025-09-02')
+    
+    ledger = data_store.get_ledger(user_id)
+    assert len(ledger) == 2 and ledger.total_cents() == -10000
+    assert ledger.merchant(1) == 'Swiggy'
+    assert data_store.ledgers.stats()['stale'] == 1
+    
+    transaction_id = ledger.ids[0]
+    other_process.data_store.delete_transaction(transaction_id, user_id)
+    assert list(data_store.get_ledger(user_id).ids) == [ledger.ids[1]]
+
+def test_own_writes_keep_the_cached_ledger(services):
+    data_store = services.data_store
+    user_id = data_store.create_user('ledger', 'ledger@example.com', 'password1').id
+    data_store.add_transaction(user_id, -10, 'Amazon', 'Shopping', '2025-09-01')
+    ledger = data_store.get_ledger(user_id)
+    misses = data_store.ledgers.stats()['misses']
+    
+    data_store.add_transaction(user_id, -20, 'Uber', 'Transportation', '2025-09-03')
+    data_store.create_envelope(user_id, 'Travel', 500)
+    
+    assert data_store.get_ledger(user_id) is ledger and len(ledger) == 2
+    assert ledger.version == data_store.get_data_version(user_id)[0]
+    assert data_store.ledgers.stats()['misses'] == misses
+
+def test_a_skipped_version_drops_the_ledger(services, other_process):
+    data_store = services.data_store
+    user_id = data_store.create_user('ledger', 'ledger@example.com', 'password1').id
+    data_store.add_transaction(user_id, -10, 'Amazon', 'Shopping', '2025-09-01')
+    data_store.get_ledger(user_id)
+    
+    other_process.data_store.create_goal(user_id, 'Trip', 1000, 0, '2026-01-01')
+    data_store.add_transaction(user_id, -20, 'Uber', 'Transportation', '2025-09-03')
+    
+    # The local insert can't be applied on top of a version it never saw
+    assert data_store.ledgers.stats()['users'] == 0
+    assert len(data_store.get_ledger(user_id)) == 2
@@ -0,0 +1,65 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.data_store import DataStore
+from services.link_tracker import LinkTracker
+from services.registry import ServiceRegistry
+
+@pytest.fixture
+def tracker(services):
+    user = services.data_store.create_user('clicker', 'clicker@example.com', 'password1')
+    tracking_id, _ = services.link_tracker.create_tracking_link(user.id, 'Amazon', 'Deal', 100,
+                                                                'https://www.amazon.in/deals')
+    return services.link_tracker, user.id, tracking_id
+
+def click(tracker, hours_ago):
+    link_tracker, user_id, tracking_id = tracker
+    link_tracker.record_click(tracking_id, user_id, '127.0.0.1', 'test', '', datetime.now() - timedelta(hours=hours_ago))
+
+def test_window_counts_come_from_hourly_buckets(tracker):
+    link_tracker, user_id, tracking_id = tracker
+    for hours_ago in (0, 2, 30, 24 * 10):
+        click(tracker, hours_ago)
+    
+    assert link_tracker.get_recent_click_stats(user_id, hours=24) == {'clicks': 2, 'accepted': 0}
+    assert link_tracker.get_recent_click_stats(user_id, hours=48)['clicks'] == 3
+    assert link_tracker.get_click_stats(user_id)['total_clicks'] == 4
+    with pytest.raises(ValueError):
+        link_tracker.get_recent_click_stats(user_id, hours=24 * 365)
+
+def test_accepts_land_in_the_window_even_after_compaction(tracker):
+    link_tracker, user_id, tracking_id = tracker
+    click(tracker, 0)
+    click(tracker, 50)
+    
+    assert link_tracker.compact_clicks(retention_days=1) == 1
+    link_tracker.mark_click_accepted(tracking_id, user_id)
+    
+    assert link_tracker.get_recent_click_stats(user_id, hours=24) == {'clicks': 1, 'accepted': 2}
+    assert link_tracker.get_click_stats(user_id)['accepted_clicks'] == 2
+
+def test_upgrade_backfills_windows_from_raw_clicks(config, tracker):
+    link_tracker, user_id, _ = tracker
+    click(tracker, 1)
+    click(tracker, 3)
+    conn = sqlite3.connect(config['DATABASE_PATH'])
+    conn.execute('DROP TABLE link_click_windows')
+    conn.execute('PRAGMA user_version = 4')
+    conn.commit()
+    conn.close()
+    
+    upgraded = ServiceRegistry(config)
+    try:
+        assert upgraded.link_tracker.get_recent_click_stats(user_id, hours=24)['clicks'] == 2
+        assert upgraded.db.user_version() == DataStore.SCHEMA_VERSION
+    finally:
+        upgraded.shutdown()
+
+def test_schema_ddl_is_skipped_once_current(services, monkeypatch):
+    def fail(self):
+        raise AssertionError('DDL ran on a current schema')
+    monkeypatch.setattr(LinkTracker, 'init_tables', fail)
+    
+    LinkTracker(services.data_store.db_path, db=services.db)
@@ -0,0 +1,111 @@
+import sqlite3
+
+import pytest
+
+from services.data_store import DataStore
+
+# Schema as it was before money moved to cents, dates gained `day` and names became ids
+LEGACY_SCHEMA = '''
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL, email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL, auto_detect_enabled INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, amount REAL NOT NULL,
+        merchant TEXT NOT NULL, category TEXT NOT NULL, date TEXT NOT NULL, envelope_id INTEGER, notes TEXT,
+        is_online_sale INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE envelopes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, name TEXT NOT NULL,
+        allocated REAL NOT NULL, spent REAL DEFAULT 0, is_pooled INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE goals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, name TEXT NOT NULL,
+        target REAL NOT NULL, current REAL DEFAULT 0, deadline TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE detected_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, amount REAL NOT NULL,
+        merchant TEXT NOT NULL, category TEXT NOT NULL, date TEXT NOT NULL, confidence TEXT NOT NULL,
+        is_online_sale INTEGER DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT INTO users (username, email, password_hash) VALUES ('a', 'a@example.com', 'x');
+    INSERT INTO transactions (user_id, amount, merchant, category, date) VALUES
+        (1, -12.34, 'Amazon ', 'Shopping', '2025-01-02'),
+        (1, 0.1, 'Salary', 'Income', '2025-01-03 10:00:00');
+    INSERT INTO envelopes (user_id, name, allocated, spent) VALUES (1, 'Food', 100.5, 20.25);
+    INSERT INTO goals (user_id, name, target, current) VALUES (1, 'Car', 1000, 0.07);
+'''
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'app.db')
+    conn.executescript(LEGACY_SCHEMA)
+    conn.close()
+    return tmp_path / 'app.db'
+
+def columns(path, table):
+    conn = sqlite3.connect(path)
+    names = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    conn.close()
+    return names
+
+def user_version(path):
+    conn = sqlite3.connect(path)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    conn.close()
+    return version
+
+def test_legacy_database_is_migrated(legacy_db, make_store):
+    store = make_store()
+    
+    assert user_version(legacy_db) == DataStore.SCHEMA_VERSION
+    assert store.schema_is_current()
+    assert {'amount_cents', 'day', 'merchant_id', 'category_id'} <= columns(legacy_db, 'transactions')
+    assert not {'amount', 'merchant', 'category'} & columns(legacy_db, 'transactions')
+    assert 'data_versions' in {row[0] for row in sqlite3.connect(legacy_db).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    
+    rows = {t['merchant']: t for t in store.get_transactions(1)}
+    assert rows['Amazon']['amount_cents'] == -1234
+    assert rows['Amazon']['day'] == 20090
+    assert rows['Salary']['amount_cents'] == 10
+    assert rows['Salary']['category'] == 'Income'
+    assert store.get_envelopes(1)[0]['allocated_cents'] == 10050
+    assert store.get_goals(1)[0]['current_cents'] == 7
+
+def test_migrations_are_idempotent(legacy_db, make_store):
+    make_store()
+    before = sqlite3.connect(legacy_db).execute('SELECT * FROM transactions ORDER BY id').fetchall()
+    
+    store = make_store(init=False)
+    store._run_migrations()
+    
+    assert sqlite3.connect(legacy_db).execute('SELECT * FROM transactions ORDER BY id').fetchall() == before
+
+def test_failed_migration_rolls_back_with_its_version(legacy_db, make_store, monkeypatch):
+    def half_done(self, cursor):
+        cursor.execute('ALTER TABLE transactions ADD COLUMN day INTEGER')
+        raise RuntimeError('crash in the middle of migration 2')
+    monkeypatch.setattr(DataStore, '_migrate_add_epoch_day', half_done)
+    
+    with pytest.raises(RuntimeError):
+        make_store()
+    
+    # Migration 1 committed on its own; migration 2 left nothing behind
+    assert user_version(legacy_db) == 1
+    assert 'amount_cents' in columns(legacy_db, 'transactions')
+    assert 'day' not in columns(legacy_db, 'transactions')
+    
+    monkeypatch.undo()
+    store = make_store()
+    assert user_version(legacy_db) == DataStore.SCHEMA_VERSION
+    assert {t['day'] for t in store.get_transactions(1)} == {20090, 20091}
+
+def test_new_database_starts_current(make_store, tmp_path):
+    store = make_store()
+    
+    assert user_version(tmp_path / 'app.db') == DataStore.SCHEMA_VERSION
+    assert store.get_categories()[:2] == list(DataStore.DEFAULT_CATEGORIES[:2])
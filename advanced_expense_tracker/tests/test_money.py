@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+import pytest
+
+from models.money import Money, to_cents
+
+@pytest.mark.parametrize('other', [Money(500), 5, 5.0, Decimal('5.00')])
+def test_equal_amounts_compare_and_hash_alike(other):
+    money = Money(500)
+    assert money == other and other == money
+    assert money <= other and money >= other
+    assert not (money < other or money > other)
+    assert hash(money) == hash(other)
+
+@pytest.mark.parametrize('smaller, larger', [(Money(-1), 0), (Money(499), 5), (Money(10), 0.11), (4.99, Money(500)),
+                                             (Money(1), Decimal('0.02')), (Money(1), Money(2))])
+def test_ordering_matches_equality(smaller, larger):
+    assert smaller < larger and smaller <= larger and larger > smaller and larger >= smaller
+    assert smaller != larger
+
+def test_comparisons_are_exact():
+    # 0.1 is not exactly ten cents, so Money(10) is neither equal to it nor ordered inconsistently
+    assert Money(10) != 0.1 and Money(10) < 0.1
+    assert to_cents(0.1) == 10
+
+def test_non_numbers_are_not_comparable():
+    assert Money(100) != '1.00'
+    with pytest.raises(TypeError):
+        Money(100) < '1.00'
+
+def test_usable_as_dict_key_with_numbers():
+    totals = {Money(200): 'a'}
+    assert totals[2] == 'a' and totals[Decimal('2.00')] == 'a'
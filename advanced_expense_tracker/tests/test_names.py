@@ -0,0 +1,35 @@
+import threading
+
+import pytest
+
+def test_new_names_are_cached_only_after_commit(data_store):
+    merchants = data_store.names.merchants
+    seen_elsewhere = []
+    
+    with data_store.write() as cursor:
+        name_id = merchants.get_id(cursor, 'Fresh Market')
+        assert merchants.get_id(cursor, 'Fresh Market') == name_id
+        # Another thread must not pick up an id that could still roll back
+        reader = threading.Thread(target=lambda: seen_elsewhere.append(merchants.name(name_id)))
+        reader.start()
+        reader.join()
+    
+    assert seen_elsewhere == [None]
+    assert merchants.name(name_id) == 'Fresh Market'
+
+def test_rolled_back_names_never_reach_the_cache(data_store):
+    user_id = data_store.create_user('names', 'names@example.com', 'password1').id
+    merchants = data_store.names.merchants
+    
+    with pytest.raises(ValueError):
+        with data_store.write() as cursor:
+            phantom_id = merchants.get_id(cursor, 'Phantom')
+            raise ValueError('row rejected')
+    assert merchants.name(phantom_id) is None
+    
+    # SQLite hands the rolled-back id to the next new name
+    data_store.add_transaction(user_id, -5, 'Real Shop', 'Other', '2025-09-01')
+    data_store.add_transaction(user_id, -6, 'Phantom', 'Other', '2025-09-02')
+    
+    merchants_by_amount = {row['amount_cents']: row['merchant'] for row in data_store.get_transactions(user_id)}
+    assert merchants_by_amount == {-500: 'Real Shop', -600: 'Phantom'}
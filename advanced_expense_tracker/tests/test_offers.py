@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.db import Database
+from services.offers import OffersManager
+
+@pytest.fixture
+def user_id(services):
+    return services.data_store.create_user('shopper', 'shopper@example.com', 'password1').id
+
+def write_legacy(path, offers):
+    with open(path, 'w') as f:
+        json.dump(offers, f)
+
+def test_legacy_json_is_imported_once(services, user_id, tmp_path):
+    offers_file = str(tmp_path / 'offers.json')
+    expired = (datetime.now() - timedelta(days=1)).isoformat()
+    write_legacy(offers_file, [
+        {'id': 1, 'user_id': user_id, 'merchant': 'Amazon', 'discount': 10, 'description': 'Sale', 'expiry': ''},
+        {'id': 1, 'user_id': user_id, 'merchant': 'Uber', 'discount': 5, 'description': 'Old', 'expiry': expired},
+    ])
+    version_before = services.data_store.get_data_version(user_id)[0]
+    
+    offers = OffersManager(services.data_store.db_path, offers_file=offers_file, db=services.db)
+    
+    assert [offer['merchant'] for offer in offers.get_offers(user_id)] == ['Amazon']
+    assert not os.path.exists(offers_file) and os.path.exists(offers_file + '.migrated')
+    assert services.data_store.get_data_version(user_id)[0] > version_before
+    assert offers.migrate_from_json() == 0
+    assert len(services.offers.get_offers(user_id)) == 1
+
+def test_failed_import_keeps_the_file_and_no_rows(services, user_id, tmp_path):
+    offers_file = str(tmp_path / 'offers.json')
+    write_legacy(offers_file, [{'user_id': user_id, 'merchant': 'Amazon', 'discount': 10},
+                               {'user_id': user_id, 'discount': 5}])
+    
+    with pytest.raises(KeyError):
+        OffersManager(services.data_store.db_path, offers_file=offers_file, db=services.db)
+    
+    assert os.path.exists(offers_file)
+    assert services.offers.get_offers(user_id) == []
+
+def test_concurrent_adds_get_distinct_ids(services, user_id):
+    # Two managers on separate connections, as in two worker processes
+    managers = [services.offers, OffersManager(services.data_store.db_path, offers_file=None,
+                                               db=Database(services.data_store.db_path))]
+    added = []
+    
+    def add(manager, n):
+        for i in range(25):
+            added.append(manager.add_offer(user_id, f'Shop {n}-{i}', 5, 'Deal'))
+    
+    threads = [threading.Thread(target=add, args=(managers[n % 2], n)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    ids = [offer['id'] for offer in added]
+    assert len(set(ids)) == 100
+    assert sorted(offer['id'] for offer in services.offers.get_offers(user_id)) == sorted(ids)
@@ -0,0 +1,136 @@
+import pytest
+
+from services import rate_limit
+from services.rate_limit import LoginRateLimiter, RateLimitedError
+
+HOUR = 3600
+START = 1000 * HOUR + 600   # ten minutes into an hourly window
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [START]
+    monkeypatch.setattr(rate_limit.time, 'time', lambda: now[0])
+    return now
+
+def limiter(**kwargs):
+    limits = dict(ip_burst=100, ip_per_minute=60, email_burst=100, email_per_minute=60,
+                  ip_per_hour=0, email_per_hour=0)
+    limits.update(kwargs)
+    return LoginRateLimiter(**limits)
+
+def test_token_bucket_admits_a_burst_then_rejects(clock):
+    login_limiter = limiter(ip_burst=3, ip_per_minute=60)
+    for _ in range(3):
+        login_limiter.acquire('10.0.0.1', 'a@example.com')
+    
+    with pytest.raises(RateLimitedError) as rejected:
+        login_limiter.acquire('10.0.0.1', 'b@example.com')
+    assert rejected.value.retry_after == 2
+    login_limiter.acquire('10.0.0.2', 'b@example.com')   # other addresses are unaffected
+    
+    clock[0] += 1
+    login_limiter.acquire('10.0.0.1', 'b@example.com')
+    assert login_limiter.stats()['admitted'] == 5
+    assert login_limiter.stats()['rejected_ip'] == 1
+
+def test_email_buckets_ignore_case_and_spacing(clock):
+    login_limiter = limiter(email_burst=2, email_per_minute=1)
+    login_limiter.acquire('10.0.0.1', 'Victim@Example.com')
+    login_limiter.acquire('10.0.0.2', ' victim@example.com ')
+    
+    with pytest.raises(RateLimitedError) as rejected:
+        login_limiter.acquire('10.0.0.3', 'VICTIM@example.com')
+    assert rejected.value.retry_after == 61
+    assert login_limiter.stats()['rejected_email'] == 1
+
+def test_sliding_window_caps_steady_attempts(clock):
+    login_limiter = limiter(ip_per_hour=5)
+    for _ in range(5):
+        login_limiter.acquire('10.0.0.1', 'a@example.com')
+        clock[0] += 60
+    
+    # The buckets have refilled; the hourly window has not
+    with pytest.raises(RateLimitedError) as rejected:
+        login_limiter.acquire('10.0.0.1', 'a@example.com')
+    window_end = START - 600 + HOUR
+    assert rejected.value.retry_after == window_end - clock[0] + 1
+    
+    clock[0] = window_end + 1
+    login_limiter.acquire('10.0.0.1', 'a@example.com')
+    # Most of the previous window still overlaps the last hour
+    with pytest.raises(RateLimitedError) as rejected:
+        login_limiter.acquire('10.0.0.1', 'a@example.com')
+    assert 700 < rejected.value.retry_after <= 721
+    
+    clock[0] += rejected.value.retry_after
+    login_limiter.acquire('10.0.0.1', 'a@example.com')
+
+def test_keys_are_bounded_least_recently_used_first(clock):
+    login_limiter = limiter(ip_burst=1, ip_per_minute=1, ip_per_hour=10, max_keys=2)
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+        login_limiter.acquire(ip, 'a@example.com')
+    
+    stats = login_limiter.stats()
+    assert stats['ip_keys'] == 2 and stats['ip_windows'] == 2
+    # The oldest address was forgotten, so it starts again with a full bucket
+    login_limiter.acquire('10.0.0.1', 'a@example.com')
+    with pytest.raises(RateLimitedError):
+        login_limiter.acquire('10.0.0.3', 'a@example.com')
+
+def test_limits_survive_a_restart_when_persisted(clock, tmp_path):
+    db_path = str(tmp_path / 'limits.db')
+    login_limiter = limiter(email_burst=2, email_per_minute=1, ip_per_hour=3, db_path=db_path)
+    for ip in ('10.0.0.1', '10.0.0.1', '10.0.0.2'):
+        login_limiter.acquire(ip, 'a@example.com' if ip == '10.0.0.1' else 'b@example.com')
+    login_limiter.flush()
+    
+    restarted = limiter(email_burst=2, email_per_minute=1, ip_per_hour=3, db_path=db_path)
+    restarted.warmup()
+    with pytest.raises(RateLimitedError, match='this account'):
+        restarted.acquire('10.0.0.3', 'a@example.com')
+    restarted.acquire('10.0.0.1', 'c@example.com')
+    with pytest.raises(RateLimitedError, match='this address'):
+        restarted.acquire('10.0.0.1', 'd@example.com')
+
+def test_shared_limiters_enforce_one_set_of_limits(clock, tmp_path):
+    db_path = str(tmp_path / 'limits.db')
+    workers = [limiter(ip_burst=3, ip_per_minute=60, email_per_hour=4, db_path=db_path, shared=True)
+               for _ in range(2)]
+    for n in range(3):
+        workers[n % 2].acquire('10.0.0.1', 'a@example.com')
+    
+    for worker in workers:
+        with pytest.raises(RateLimitedError, match='this address'):
+            worker.acquire('10.0.0.1', 'b@example.com')
+    
+    clock[0] += 60
+    workers[1].acquire('10.0.0.2', 'a@example.com')
+    with pytest.raises(RateLimitedError, match='this account'):
+        workers[0].acquire('10.0.0.3', 'a@example.com')
+    assert sum(worker.stats()['admitted'] for worker in workers) == 4
+
+def test_shared_limiter_prunes_rows_that_stopped_limiting(clock, tmp_path):
+    db_path = str(tmp_path / 'limits.db')
+    login_limiter = limiter(ip_per_hour=5, db_path=db_path, shared=True)
+    login_limiter.acquire('10.0.0.1', 'a@example.com')
+    
+    def rows():
+        conn = login_limiter.get_connection()
+        try:
+            return [conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                    for table in ('login_rate_limits', 'login_rate_windows')]
+        finally:
+            conn.close()
+    
+    login_limiter.flush()
+    assert rows() == [2, 2]
+    clock[0] += 60   # the buckets have refilled, the hourly counters still count
+    login_limiter.flush()
+    assert rows() == [0, 2]
+    clock[0] += 2 * HOUR
+    login_limiter.flush()
+    assert rows() == [0, 0]
+
+def test_shared_limiter_needs_a_database():
+    with pytest.raises(ValueError):
+        limiter(shared=True)
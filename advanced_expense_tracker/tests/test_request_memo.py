@@ -0,0 +1,43 @@
+import pytest
+from flask import g
+
+from services import request_memo
+
+def test_repeated_reads_in_a_request_hit_the_memo(app, monkeypatch):
+    data_store = app.extensions['services'].data_store
+    user_id = data_store.create_user('memo', 'memo@example.com', 'password1').id
+    data_store.add_transaction(user_id, -10, 'Amazon', 'Shopping', '2025-09-01')
+    selects = []
+    select_transactions = data_store._select_transactions
+    
+    def counting_select(*args):
+        selects.append(args[1:])
+        return select_transactions(*args)
+    monkeypatch.setattr(data_store, '_select_transactions', counting_select)
+    
+    with app.test_request_context('/'):
+        first = data_store.get_transactions(user_id)
+        assert data_store.get_transactions(user_id) is first
+        assert len(selects) == 1
+        
+        data_store.add_transaction(user_id, -90, 'Swiggy', 'Food & Dining', '2025-09-02')
+        
+        after = data_store.get_transactions(user_id)
+        assert len(selects) == 2 and len(after) == len(first) + 1
+        assert data_store.get_transactions(user_id) is after
+    
+    # Outside a request every read goes to the database
+    data_store.get_transactions(user_id)
+    data_store.get_transactions(user_id)
+    assert len(selects) == 4
+
+def test_failed_write_still_clears_the_memo(app):
+    @request_memo.invalidates
+    def failing_write(self):
+        raise ValueError('rejected')
+    
+    with app.test_request_context('/'):
+        g.setdefault('_read_memo', {})['key'] = 'value'
+        with pytest.raises(ValueError):
+            failing_write(None)
+        assert '_read_memo' not in g
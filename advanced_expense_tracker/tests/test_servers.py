@@ -0,0 +1,55 @@
+import asyncio
+import importlib
+import os
+import runpy
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_gunicorn_config_takes_the_worker_count_from_the_environment(monkeypatch):
+    monkeypatch.setenv('WEB_WORKERS', '4')
+    config = runpy.run_path(os.path.join(BASE_DIR, 'gunicorn.conf.py'))
+    assert config['workers'] == 4 and not config['preload_app']
+
+@pytest.fixture
+def asgi(app):
+    pytest.importorskip('aiosqlite')
+    pytest.importorskip('asgiref')
+    sys.modules.pop('asgi', None)
+    module = importlib.import_module('asgi')
+    yield module
+    module.flask_app.extensions['services'].shutdown()
+    sys.modules.pop('asgi', None)
+
+def scope_with_cookie(cookie):
+    return {'type': 'http', 'method': 'GET', 'path': '/api/v1/goals', 'query_string': b'',
+            'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode('latin-1'))], 'client': ('127.0.0.1', 5000)}
+
+def session_cookie(flask_app, data):
+    value = flask_app.session_interface.get_signing_serializer(flask_app).dumps(data)
+    return f"{flask_app.config['SESSION_COOKIE_NAME']}={value}"
+
+def test_asgi_auth_goes_through_user_loader(asgi):
+    flask_app = asgi.flask_app
+    user = flask_app.extensions['services'].data_store.create_user('asgi', 'asgi@example.com', 'password1')
+    
+    assert asgi.session_user_id(scope_with_cookie(session_cookie(flask_app, {'_user_id': str(user.id)}))) == user.id
+    # Validly signed, but the loader knows no such user
+    assert asgi.session_user_id(scope_with_cookie(session_cookie(flask_app, {'_user_id': '999999'}))) is None
+    assert asgi.session_user_id(scope_with_cookie('session=forged')) is None
+
+def test_asgi_answers_lifespan_and_shuts_services_down(asgi):
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+    
+    async def receive():
+        return messages.pop(0)
+    
+    async def send(message):
+        sent.append(message['type'])
+    
+    asyncio.run(asgi.app({'type': 'lifespan'}, receive, send))
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    assert asgi.flask_app.extensions['services']._is_shut_down
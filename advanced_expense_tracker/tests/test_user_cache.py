@@ -0,0 +1,21 @@
+def test_settings_changed_by_another_process_are_reloaded(services, other_process):
+    data_store = services.data_store
+    user_id = data_store.create_user('before', 'cached@example.com', 'password1').id
+    assert data_store.get_user_by_id(user_id).username == 'before'
+    assert data_store.get_user_by_id(user_id).username == 'before'
+    assert data_store.user_cache.stats()['hits'] == 1
+    
+    other_process.data_store.update_user_settings(user_id, 'after', True)
+    
+    user = data_store.get_user_by_id(user_id)
+    assert user.username == 'after' and user.auto_detect_enabled
+    assert data_store.user_cache.stats()['stale'] == 1
+
+def test_login_caches_the_user_at_its_current_version(services, other_process):
+    data_store = services.data_store
+    user_id = data_store.create_user('login', 'login@example.com', 'password1').id
+    other_process.data_store.add_transaction(user_id, -10, 'Amazon', 'Shopping', '2025-09-01')
+    
+    assert data_store.authenticate_user('login@example.com', 'password1').id == user_id
+    data_store.get_user_by_id(user_id)
+    assert data_store.user_cache.stats()['hits'] == 1
@@ -0,0 +1,174 @@
+import threading
+import time
+
+import pytest
+
+from services.user_log import TransactionLog, UserLogWriter
+
+MONTHS = ['2025-01', '2025-02', '2025-03']
+
+def record(i, month):
+    return {'id': i, 'amount_cents': -i, 'logged_at': f'{month}-{i % 28 + 1:02d}T10:00:00'}
+
+@pytest.fixture
+def logs(tmp_path):
+    opened = []
+    
+    def make(durability='group'):
+        log = TransactionLog(str(tmp_path), UserLogWriter(durability=durability, flush_interval=0,
+                                                          flush_bytes=1 << 20))
+        opened.append(log)
+        return log
+    
+    yield make
+    for log in opened:
+        log.writer.close()
+
+def by_month(records):
+    months = {}
+    for r in records:
+        months.setdefault(r['logged_at'][:7], set()).add(r['id'])
+    return months
+
+@pytest.mark.parametrize('durability', ['none', 'flush', 'group'])
+def test_concurrent_appends_are_all_found_by_month(logs, durability):
+    log = logs(durability)
+    log.create(1)
+    written = {}
+    
+    def append(thread):
+        for month in MONTHS:
+            for i in range(thread * 1000, thread * 1000 + 50):
+                log.append(1, record(i, month))
+                written.setdefault(month, set()).add(i)
+    
+    threads = [threading.Thread(target=append, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    
+    for n, month in enumerate(MONTHS):
+        found = by_month(log.read(1, since=f'{month}-01'))
+        for later in MONTHS[n:]:
+            assert found[later] == written[later]
+
+def test_index_entry_is_written_before_other_appends(logs, monkeypatch):
+    log = logs('flush')
+    log.create(1)
+    log.append(1, record(0, '2025-01'))
+    add_index_entry = log._add_index_entry
+    calls = []
+    
+    def slow_index_entry(user_id, month, offset):
+        calls.append(offset)
+        if len(calls) == 1:
+            time.sleep(0.05)   # the second append overtakes here unless this runs under the log's lock
+        add_index_entry(user_id, month, offset)
+    monkeypatch.setattr(log, '_add_index_entry', slow_index_entry)
+    
+    threads = [threading.Thread(target=log.append, args=(1, record(i, '2025-02'))) for i in (1, 2)]
+    for t in threads:
+        t.start()
+        time.sleep(0.01)
+    for t in threads:
+        t.join()
+    
+    assert by_month(log.read(1, since='2025-02-01')) == {'2025-02': {1, 2}}
+
+def test_index_offset_comes_from_the_file_not_a_stale_handle(logs):
+    # Two writers over the same file behave like two worker processes
+    first, second = logs('flush'), logs('flush')
+    first.create(1)
+    for i in range(3):
+        first.append(1, record(i, '2025-01'))
+    second.create(1)   # truncates under first's open handle
+    second.append(1, record(3, '2025-01'))
+    first.append(1, record(4, '2025-02'))
+    
+    assert by_month(first.read(1, since='2025-02-01')) == {'2025-02': {4}}
+    assert {r['id'] for r in first.read(1)} == {3, 4}
+
+def test_lines_buffered_while_another_process_replaces_the_log_land_in_the_new_one(logs):
+    buffered, restorer = logs('none'), logs('flush')
+    buffered.create(2)
+    buffered.append(2, record(1, '2025-01'))
+    buffered.append(2, record(2, '2025-01'))   # still in buffered's memory
+    
+    restorer.replace(2, [record(0, '2024-12')], keep_current=True)
+    buffered.writer.flush()
+    
+    assert [r['id'] for r in restorer.read(2)] == [0, 1, 2]
+    assert by_month(restorer.read(2, since='2025-01-01')) == {'2025-01': {1, 2}}
+
+def test_index_points_at_first_record_of_each_month(logs, tmp_path):
+    log = logs('none')
+    log.create(7)
+    for i, month in enumerate(['2025-01', '2025-01', '2025-02', '2025-03', '2025-03']):
+        log.append(7, record(i, month))
+    log.writer.flush()
+    
+    with open(log.path(7), 'rb') as f:
+        data = f.read()
+    for month, offset in log.read_index(7).items():
+        assert data[offset:].startswith(b'{') and month in data[offset:].split(b'\n', 1)[0].decode()
+        assert f'"logged_at":"{month}'.encode() not in data[:offset]
+
+def test_create_resets_the_index(logs):
+    log = logs()
+    log.create(3)
+    log.append(3, record(1, '2025-05'))
+    log.create(3)
+    log.append(3, record(2, '2025-05'))
+    
+    assert log.read_index(3) == {'2025-05': 0}
+    assert [r['id'] for r in log.read(3, since='2025-05-01')] == [2]
+
+def write_legacy(log, user_id, lines):
+    with open(log.path(user_id)[:-len(log.LOG_SUFFIX)] + log.LEGACY_SUFFIX, 'w') as f:
+        f.write('# Transactions for user\n' + ''.join(line + '\n' for line in lines))
+
+def test_convert_legacy_puts_old_records_in_front(logs):
+    log = logs()
+    log.create(4)
+    log.append(4, record(10, '2025-03'))
+    write_legacy(log, 4, ['2024-11-02 | -12.5 | Amazon | Shopping', '2024-10-01 | 500 | Salary | Income | Oct'])
+    
+    assert log.convert_legacy(4) == 2
+    
+    assert [r['merchant'] if r['id'] is None else r['id'] for r in log.read(4)] == ['Salary', 'Amazon', 10]
+    assert [r['id'] for r in log.read(4, since='2025-01-01')] == [10]
+    assert next(log.read(4, since='2024-11-01'))['date'] == '2024-11-02'
+    assert log.convert_legacy(4) == 0
+
+def test_replace_keeps_records_appended_while_it_is_built(logs):
+    log = logs()
+    log.create(5)
+    log.append(5, record(1, '2025-01'))
+    
+    def legacy_records():
+        yield record(0, '2024-12')
+        # Another request logs a transaction before the replacement is swapped in
+        log.append(5, record(2, '2025-02'))
+    
+    log.replace(5, legacy_records(), keep_current=True)
+    log.append(5, record(3, '2025-02'))
+    
+    assert [r['id'] for r in log.read(5)] == [0, 1, 2, 3]
+    assert by_month(log.read(5, since='2025-02-01')) == {'2025-02': {2, 3}}
+
+def test_failed_conversion_leaves_both_logs(logs, monkeypatch):
+    log = logs()
+    log.create(6)
+    log.append(6, record(1, '2025-01'))
+    write_legacy(log, 6, ['2024-11-02 | -12.5 | Amazon | Shopping'])
+    
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+    monkeypatch.setattr(log.writer, 'replace', fail)
+    
+    with pytest.raises(OSError):
+        log.convert_legacy(6)
+    assert [r['id'] for r in log.read(6)] == [1]
+    monkeypatch.undo()
+    assert log.convert_legacy(6) == 1